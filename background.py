@@ -0,0 +1,127 @@
+"""
+后台任务
+在工作线程中执行耗时操作, 进度和结果通过队列交回Tk线程, 支持取消
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+
+# Tk线程检查任务消息的间隔 (毫秒)
+POLL_INTERVAL_MS = 50
+
+
+class TaskCancelled(Exception):
+    """任务被用户取消"""
+
+
+class BackgroundTask:
+    """在工作线程中执行 func(task), 回调都在Tk线程中调用
+
+    func 中应定期调用 task.report(完成数, 总数, 说明) 报告进度,
+    并调用 task.check_cancelled() 响应取消.
+    """
+
+    def __init__(self, root, func, on_done=None, on_error=None, on_progress=None, name="background-task"):
+        self.root = root
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.name = name
+
+        self._messages = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll)
+        return self
+
+    def cancel(self):
+        """请求取消, 任务在下一次 check_cancelled() 时停止"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise TaskCancelled()
+
+    def report(self, done, total, text=""):
+        """报告进度 (工作线程中调用)"""
+        self._messages.put(("progress", (done, total, text)))
+
+    def _run(self):
+        try:
+            result = self.func(self)
+            self._messages.put(("done", result))
+        except BaseException as e:
+            self._messages.put(("error", e))
+
+    def _poll(self):
+        finished = False
+        while True:
+            try:
+                kind, payload = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                if self.on_progress is not None:
+                    self.on_progress(*payload)
+            elif kind == "done":
+                finished = True
+                if self.on_done is not None:
+                    self.on_done(payload)
+            else:
+                finished = True
+                if self.on_error is not None:
+                    self.on_error(payload)
+
+        if not finished:
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+
+
+class ProgressDialog:
+    """带进度条和取消按钮的进度窗口"""
+
+    def __init__(self, root, title, task=None):
+        self.task = task
+        self.window = tk.Toplevel(root)
+        self.window.title(title)
+        self.window.geometry("400x130")
+        self.window.resizable(False, False)
+        self.window.transient(root)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        frame = ttk.Frame(self.window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        self.label = ttk.Label(frame, text="准备中...")
+        self.label.pack(fill=tk.X, pady=5)
+        self.progress = ttk.Progressbar(frame, mode="determinate", maximum=100)
+        self.progress.pack(fill=tk.X, pady=5)
+        self.cancel_button = ttk.Button(frame, text="取消", command=self.cancel)
+        self.cancel_button.pack(pady=5)
+
+    def update(self, done, total, text=""):
+        if total:
+            self.progress.configure(value=done * 100.0 / total)
+        self.label.configure(text=text or f"{done} / {total}")
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.label.configure(text="正在取消...")
+            self.cancel_button.configure(state="disabled")
+
+    def close(self):
+        self.window.destroy()
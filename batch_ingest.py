@@ -0,0 +1,162 @@
+"""
+按文件夹批量添加记录
+按文件名规则 (默认与旧版上传图片的命名相同: 呼号_类型_...) 把文件夹中的图片按呼号和
+图片类型分组, 预览后在线程池中并行处理、存入图片库, 所有记录一次写入
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from core import IMAGE_KINDS, make_record
+from repository import image_refs
+
+
+# 默认的文件名规则 (不含扩展名): {callsign} 为呼号, {kind} 为 license/operator/screenshot,
+# * 为任意字符; "_*" 这样跟在分隔符后的 * 连同分隔符可以省略
+DEFAULT_PATTERN = "{callsign}_{kind}_*"
+
+# 参与匹配的图片扩展名
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
+
+_PLACEHOLDERS = {
+    "{callsign}": r"(?P<callsign>[^_\s]+?)",
+    "{kind}": "(?P<kind>" + "|".join(IMAGE_KINDS) + ")",
+}
+
+
+def compile_pattern(pattern):
+    """文件名规则 -> 正则表达式 (匹配不含扩展名的文件名, 不区分大小写)"""
+    if "{callsign}" not in pattern or "{kind}" not in pattern:
+        raise ValueError("文件名规则必须包含 {callsign} 和 {kind}")
+    parts = []
+    k = 0
+    while k < len(pattern):
+        placeholder = next((p for p in _PLACEHOLDERS if pattern.startswith(p, k)), None)
+        if placeholder is not None:
+            parts.append(_PLACEHOLDERS[placeholder])
+            k += len(placeholder)
+        elif pattern[k] == "*":
+            parts.append(".*")
+            k += 1
+        elif k + 1 < len(pattern) and pattern[k + 1] == "*":
+            # 分隔符加 *: 整体可选
+            parts.append(f"(?:{re.escape(pattern[k])}.*)?")
+            k += 2
+        else:
+            parts.append(re.escape(pattern[k]))
+            k += 1
+    return re.compile("".join(parts), re.IGNORECASE)
+
+
+class BatchGroup:
+    """同一呼号的一组图片, 对应一条新记录"""
+
+    def __init__(self, callsign):
+        self.callsign = callsign
+        self.images = {}        # {字段: 源文件}
+        self.duplicates = []    # 同一类型多出来、不使用的文件
+
+    def add(self, field, path):
+        # 同类型有多张时使用文件名排在最后的一张 (旧版命名以时间结尾, 即最新的)
+        previous = self.images.get(field)
+        if previous is None or os.path.basename(path) > os.path.basename(previous):
+            self.images[field] = path
+            path = previous
+        if path is not None:
+            self.duplicates.append(path)
+
+
+class BatchPlan:
+    """扫描结果: 按呼号分组的图片和不符合规则的文件"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.groups = []
+        self.unmatched = []
+
+    @property
+    def image_count(self):
+        return sum(len(group.images) for group in self.groups)
+
+
+def scan_folder(folder, pattern=DEFAULT_PATTERN, recursive=False):
+    """扫描文件夹中的图片并按呼号分组 (只读文件名, 不读内容)"""
+    regex = compile_pattern(pattern)
+    groups = {}
+    plan = BatchPlan(folder)
+    for dir_path, dir_names, file_names in os.walk(folder):
+        if not recursive:
+            dir_names[:] = []
+        dir_names.sort()
+        for name in sorted(file_names):
+            path = os.path.join(dir_path, name)
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            match = regex.fullmatch(stem)
+            if match is None:
+                plan.unmatched.append(path)
+                continue
+            callsign = match.group("callsign").upper()
+            group = groups.get(callsign)
+            if group is None:
+                group = groups[callsign] = BatchGroup(callsign)
+            group.add(IMAGE_KINDS[match.group("kind").lower()], path)
+    plan.groups = [groups[callsign] for callsign in sorted(groups)]
+    return plan
+
+
+def ingest_plan(core, plan, apply_time, reason="", task=None, workers=4, keep_original=None):
+    """并行处理并存入全部图片, 返回新记录 (尚未写入存储)
+
+    存入的图片都被固定, 写入记录之前不会被其他操作删除 (内容已在图片库中的图片可能正被
+    删除记录的操作释放); 调用方写入记录后或放弃时调用 finish_ingest().
+    出错或取消时解除固定, 并删除本次存入、且没有记录引用的图片.
+    """
+    # 先检查必填项, 不要处理完图片才发现无法创建记录
+    make_record("-", apply_time)
+    jobs = [(group, field, path) for group in plan.groups for field, path in group.images.items()]
+    stored = {}
+    futures = {}
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-ingest")
+    try:
+        futures = {
+            executor.submit(core.pipeline.ingest, path, keep_original, True): (group, field)
+            for group, field, path in jobs
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            group, field = futures[future]
+            stored.setdefault(group.callsign, {})[field] = future.result()
+            if task is not None:
+                task.report(done, len(jobs), f"已处理 {done} / {len(jobs)} 张图片")
+                task.check_cancelled()
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        _unpin_and_release(core, [
+            future.result() for future in futures if not future.cancelled() and future.exception() is None
+        ], True)
+        raise
+    executor.shutdown()
+
+    return [
+        make_record(group.callsign, apply_time, reason, stored.get(group.callsign, {}))
+        for group in plan.groups
+    ]
+
+
+def finish_ingest(core, records, saved):
+    """ingest_plan() 的记录写入存储后 (saved 为True) 或放弃时调用: 解除图片的固定,
+    放弃时删除没有记录引用的图片"""
+    _unpin_and_release(core, [path for record in records for path in image_refs(record)], not saved)
+
+
+def _unpin_and_release(core, paths, release):
+    # 每次存入固定一次, 同一图片存入了几次就解除几次; 全部解除之后再删除
+    for path in paths:
+        core.images.unpin(path)
+    if release:
+        for path in set(paths):
+            core.release_image(path)
@@ -0,0 +1,100 @@
+"""
+批量添加的预览窗口
+列出按呼号分组的图片和不符合文件名规则的文件, 填写申请时间和拒签原因后确认添加
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+import tkinter as tk
+from datetime import datetime
+from tkinter import messagebox, ttk
+
+from core import IMAGE_KINDS
+
+
+# 预览中最多列出的不符合规则的文件数
+MAX_UNMATCHED_SHOWN = 50
+
+
+class BatchPreviewDialog:
+    """批量添加预览, 确认后调用 on_confirm(申请时间, 拒签原因)"""
+
+    def __init__(self, root, plan, on_confirm):
+        self.plan = plan
+        self.on_confirm = on_confirm
+
+        self.window = tk.Toplevel(root)
+        self.window.title(f"批量添加 - {plan.folder}")
+        self.window.geometry("900x600")
+        self.window.transient(root)
+        self.window.grab_set()
+
+        frame = ttk.Frame(self.window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        summary = f"将添加 {len(plan.groups)} 条记录, 共 {plan.image_count} 张图片"
+        duplicates = sum(len(group.duplicates) for group in plan.groups)
+        if duplicates:
+            summary += f"; 同一呼号同类型多出的 {duplicates} 张图片不使用"
+        if plan.unmatched:
+            summary += f"; {len(plan.unmatched)} 个文件不符合文件名规则"
+        ttk.Label(frame, text=summary).pack(anchor=tk.W, pady=(0, 5))
+
+        columns = ("callsign",) + tuple(IMAGE_KINDS) + ("note",)
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+        for column, text, width in zip(
+            columns, ("呼号", "执照照片", "操作证照片", "申请截图", "说明"), (100, 200, 200, 200, 160)
+        ):
+            tree.heading(column, text=text)
+            tree.column(column, width=width, anchor=tk.W)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        for group in plan.groups:
+            names = [
+                os.path.basename(group.images[field]) if field in group.images else ""
+                for field in IMAGE_KINDS.values()
+            ]
+            note = f"另有 {len(group.duplicates)} 张同类图片" if group.duplicates else ""
+            tree.insert("", tk.END, values=(group.callsign, *names, note))
+
+        if plan.unmatched:
+            ttk.Label(frame, text="不符合文件名规则的文件:").pack(anchor=tk.W, pady=(5, 0))
+            unmatched = tk.Text(frame, height=4, state="normal")
+            shown = [os.path.relpath(path, plan.folder) for path in plan.unmatched[:MAX_UNMATCHED_SHOWN]]
+            if len(plan.unmatched) > MAX_UNMATCHED_SHOWN:
+                shown.append(f"... 共 {len(plan.unmatched)} 个")
+            unmatched.insert("1.0", "\n".join(shown))
+            unmatched.configure(state="disabled")
+            unmatched.pack(fill=tk.X)
+
+        input_frame = ttk.Frame(frame)
+        input_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Label(input_frame, text="申请时间:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.apply_time = ttk.Entry(input_frame, width=30)
+        self.apply_time.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M"))
+        self.apply_time.grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(input_frame, text="拒签原因:").grid(row=1, column=0, sticky=(tk.W, tk.N), padx=5, pady=5)
+        self.reason_text = tk.Text(input_frame, width=60, height=3)
+        self.reason_text.grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
+
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(pady=(10, 0))
+        confirm = ttk.Button(button_frame, text=f"添加 {len(plan.groups)} 条记录", command=self.confirm)
+        confirm.pack(side=tk.LEFT, padx=5)
+        if not plan.groups:
+            confirm.configure(state="disabled")
+        ttk.Button(button_frame, text="取消", command=self.window.destroy).pack(side=tk.LEFT, padx=5)
+
+    def confirm(self):
+        apply_time = self.apply_time.get().strip()
+        reason = self.reason_text.get("1.0", tk.END).strip()
+        if not apply_time:
+            messagebox.showwarning("警告", "申请时间不能为空!", parent=self.window)
+            return
+        self.window.destroy()
+        self.on_confirm(apply_time, reason)
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+性能基准测试
+生成 1千/1万/10万/100万 条合成记录 (真实格式的呼号、中文拒签原因、手机照片大小的
+JPEG和PNG截图), 测量加载、保存、刷新表格、查看图片解码、上传图片、导出和导入的耗时.
+结果输出为JSON, 用 --compare 比较两个版本的结果.
+
+用法:
+    python benchmark.py                                   # 全部规模, 两种存储
+    python benchmark.py --sizes 1k,10k --storage sqlite --output after.json
+    python benchmark.py --compare before.json after.json
+
+同样的 --seed 生成完全相同的数据. 需要Tk的测量 (刷新表格、创建PhotoImage) 在隐藏的
+主窗口中进行, 没有图形界面时跳过并记录在结果的 skipped 中.
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from config import DEFAULT_CONFIG
+from core import RejectionCore, make_record
+from image_viewer import IMAGE_SLOTS
+from thumbnail_cache import ThumbnailCache
+
+
+# 预设的数据规模
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+
+STORAGES = ("json", "sqlite")
+
+# 手机照片 (JPEG) 和手机截图 (PNG) 的尺寸
+PHOTO_SIZE = (4032, 3024)
+SCREENSHOT_SIZE = (1080, 2400)
+
+CALLSIGN_PREFIXES = ("BA", "BD", "BG", "BH", "BI", "BJ", "BY")
+
+REASONS = (
+    "资料不全",
+    "执照照片不清晰",
+    "操作证照片不清晰",
+    "操作证已过期",
+    "申请截图与呼号不符",
+    "呼号格式错误",
+    "重复申请",
+    "申请信息与操作证不一致",
+    "照片经过编辑",
+    "未提供申请截图",
+    "执照有效期已过",
+    "设台地址与执照不符",
+)
+
+REASON_DETAILS = (
+    "请重新上传",
+    "请补充材料后再次申请",
+    "详见邮件说明",
+    "请联系管理员",
+    "请核对后重新提交",
+    "",
+)
+
+# 合成记录的申请时间范围
+START_TIME = datetime(2023, 1, 1)
+TIME_SPAN_SECONDS = 3 * 365 * 24 * 3600
+
+# 比较结果时, 两次都短于此时间的项不判断快慢 (误差太大)
+MIN_COMPARE_SECONDS = 0.001
+
+# 各类图片被记录引用的比例
+IMAGE_RATIOS = {"license_image": 0.9, "operator_image": 0.8, "screenshot_image": 0.7}
+
+
+def parse_sizes(text):
+    """"1k,10k" 或 "1000,20000" -> [记录数]"""
+    sizes = []
+    for item in text.split(","):
+        item = item.strip().lower()
+        if item:
+            sizes.append(SIZES[item] if item in SIZES else int(item))
+    return sizes
+
+
+def size_label(size):
+    for label, count in SIZES.items():
+        if count == size:
+            return label
+    return str(size)
+
+
+# ----------------------------------------------------------------------
+# 合成数据
+# ----------------------------------------------------------------------
+def make_callsign(rng):
+    letters = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rng.choice((2, 3))))
+    return f"{rng.choice(CALLSIGN_PREFIXES)}{rng.randrange(10)}{letters}"
+
+
+def make_reason(rng):
+    reason = rng.choice(REASONS)
+    if rng.random() < 0.3:
+        reason += "，" + rng.choice(REASONS)
+    detail = rng.choice(REASON_DETAILS)
+    return f"{reason}。{detail}" if detail else reason
+
+
+def generate_records(size, image_pool, rng):
+    """生成size条记录, 图片从图片池中随机引用"""
+    records = []
+    for _ in range(size):
+        apply_time = START_TIME + timedelta(seconds=rng.randrange(TIME_SPAN_SECONDS))
+        create_time = apply_time + timedelta(seconds=rng.randrange(7 * 24 * 3600))
+        images = {
+            field: rng.choice(image_pool[field])
+            for field, ratio in IMAGE_RATIOS.items()
+            if rng.random() < ratio
+        }
+        records.append(make_record(
+            make_callsign(rng), apply_time.strftime("%Y-%m-%d %H:%M"), make_reason(rng),
+            images, create_time.strftime("%Y-%m-%d %H:%M:%S"),
+        ))
+    return records
+
+
+def make_photo(path, rng, size=PHOTO_SIZE):
+    """手机照片大小的JPEG: 渐变底色加噪点, 压缩后的大小与真实照片相近"""
+    from PIL import Image
+
+    width, height = size
+    base = Image.linear_gradient("L").resize(size)
+    channels = []
+    for k in range(3):
+        noise = Image.frombytes("L", (width // 4, height // 4), rng.randbytes(width * height // 16))
+        noise = noise.resize(size, Image.BILINEAR)
+        channels.append(Image.blend(base.rotate(90 * k, expand=False), noise, 0.5))
+    Image.merge("RGB", channels).save(path, "JPEG", quality=90)
+
+
+def make_screenshot(path, rng, size=SCREENSHOT_SIZE):
+    """手机截图大小的PNG: 色块和文字行"""
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    img = Image.new("RGB", size, (245, 245, 245))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, width, 180), fill=tuple(rng.randrange(256) for _ in range(3)))
+    y = 240
+    while y < height - 80:
+        line_width = rng.randrange(width // 3, width - 80)
+        draw.rectangle((40, y, 40 + line_width, y + 28), fill=(rng.randrange(40, 120),) * 3)
+        y += rng.randrange(50, 120)
+    img.save(path, "PNG")
+
+
+def generate_images(source_dir, photos, screenshots, rng):
+    """生成源图片文件 (相当于用户选择的照片), 返回 {字段: [源文件]} 和一张单独用于上传测试的照片"""
+    os.makedirs(source_dir, exist_ok=True)
+    pool = {"license_image": [], "operator_image": [], "screenshot_image": []}
+    for k in range(photos):
+        path = os.path.join(source_dir, f"photo_{k}.jpg")
+        make_photo(path, rng)
+        pool["license_image" if k % 2 == 0 else "operator_image"].append(path)
+    if not pool["operator_image"]:
+        pool["operator_image"] = list(pool["license_image"])
+    for k in range(screenshots):
+        path = os.path.join(source_dir, f"screenshot_{k}.png")
+        make_screenshot(path, rng)
+        pool["screenshot_image"].append(path)
+
+    upload = os.path.join(source_dir, "upload.jpg")
+    make_photo(upload, rng)
+    return pool, upload
+
+
+def dataset_config(dataset_dir, storage):
+    config = dict(DEFAULT_CONFIG)
+    config.update({
+        "storage": storage,
+        "data_file": os.path.join(dataset_dir, "rejection_data.json"),
+        "database_file": os.path.join(dataset_dir, "rejection_data.db"),
+        "image_dir": os.path.join(dataset_dir, "images"),
+        "thumbnail_dir": os.path.join(dataset_dir, ".thumbnails"),
+        "snapshot_dir": os.path.join(dataset_dir, "snapshots"),
+    })
+    return config
+
+
+def build_dataset(dataset_dir, storage, size, source_pool, seed):
+    """建立一份数据: 图片存入图片库, 记录一次写入"""
+    os.makedirs(dataset_dir, exist_ok=True)
+    config = dataset_config(dataset_dir, storage)
+    with RejectionCore(config) as core:
+        image_pool = {
+            field: [core.images.ingest(path) for path in paths]
+            for field, paths in source_pool.items()
+        }
+        core.add_records(generate_records(size, image_pool, random.Random(seed)))
+        core.store.compact()
+    return config
+
+
+# ----------------------------------------------------------------------
+# 计时
+# ----------------------------------------------------------------------
+def measure(func, repeat, setup=None, teardown=None):
+    """执行repeat次, 返回每次的秒数; setup 的返回值传给 func, 不计入耗时"""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        if setup is not None:
+            func(arg)
+        else:
+            func()
+        times.append(time.perf_counter() - start)
+        if teardown is not None:
+            teardown(arg)
+    return times
+
+
+class Benchmark:
+    """对一份数据依次测量各项操作"""
+
+    def __init__(self, args, tk_root, source_pool, upload_source):
+        self.args = args
+        self.tk_root = tk_root
+        self.source_pool = source_pool
+        self.upload_source = upload_source
+        self.results = []
+
+    def record(self, storage, size, operation, times, **extra):
+        result = {
+            "storage": storage,
+            "records": size,
+            "operation": operation,
+            "seconds": [round(t, 6) for t in times],
+            "min": round(min(times), 6),
+            "median": round(statistics.median(times), 6),
+        }
+        result.update(extra)
+        self.results.append(result)
+        print(f"  {operation:<28} 中位数 {result['median'] * 1000:10.1f} ms  最短 {result['min'] * 1000:10.1f} ms",
+              file=sys.stderr)
+
+    def run_dataset(self, storage, size, dataset_dir):
+        repeat = self.args.repeat
+        print(f"[{storage} {size_label(size)}] 生成数据...", file=sys.stderr)
+        start = time.perf_counter()
+        config = build_dataset(dataset_dir, storage, size, self.source_pool, self.args.seed)
+        self.record(storage, size, "generate", [time.perf_counter() - start])
+
+        # load_data: 每次都重新打开存储
+        def open_core():
+            return RejectionCore(config)
+
+        self.record(storage, size, "load_data", measure(
+            lambda core: core.store.load(), repeat, open_core, lambda core: core.close()
+        ))
+
+        core = RejectionCore(config).open()
+        try:
+            self.record(storage, size, "save_data", measure(core.store.compact, repeat))
+            if self.tk_root is not None:
+                self.bench_table(storage, size, core)
+            self.bench_view_images(storage, size, core, dataset_dir)
+            self.bench_upload(storage, size, core)
+            self.bench_export_import(storage, size, core, dataset_dir)
+        finally:
+            core.close()
+
+    def bench_table(self, storage, size, core):
+        """刷新表格: 与主窗口相同的虚拟表格, 在开头、中间和末尾各刷新一次"""
+        import tkinter as tk
+        from tkinter import ttk
+
+        from record_table import VirtualTable
+
+        frame = ttk.Frame(self.tk_root)
+        columns = ("呼号", "申请时间", "执照照片", "操作证照片", "申请截图", "拒签原因")
+        tree = ttk.Treeview(frame, columns=columns, show="tree headings", height=15)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL)
+        table = VirtualTable(tree, scrollbar, core.store)
+        tree.pack()
+        frame.pack()
+
+        def refresh():
+            for offset in (0, size // 2, size):
+                table.scroll_to(offset)
+                self.tk_root.update_idletasks()
+
+        try:
+            self.record(storage, size, "refresh_table", measure(refresh, self.args.repeat), positions=3)
+        finally:
+            frame.destroy()
+
+    def bench_view_images(self, storage, size, core, dataset_dir):
+        """查看图片: 一条记录的三张图片解码为缩略图 (无缓存 / 磁盘缓存 / 内存缓存)"""
+        record = next(
+            (r for r in core.store.page(0, 100) if all(r.get(field) for field, _ in IMAGE_SLOTS)), None
+        )
+        if record is None:
+            return
+        cache_dir = os.path.join(dataset_dir, ".bench_thumbnails")
+
+        def new_cache(clear):
+            if clear:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            return ThumbnailCache(cache_dir)
+
+        def decode(cache):
+            return [cache.get(record[field], slot_size) for field, slot_size in IMAGE_SLOTS]
+
+        repeat = self.args.repeat
+        self.record(storage, size, "view_images_decode_cold",
+                    measure(decode, repeat, lambda: new_cache(True)))
+        self.record(storage, size, "view_images_decode_disk_cache",
+                    measure(decode, repeat, lambda: new_cache(False)))
+        warm = new_cache(False)
+        decode(warm)
+        self.record(storage, size, "view_images_decode_memory_cache",
+                    measure(lambda: decode(warm), repeat))
+
+        if self.tk_root is not None:
+            from PIL import ImageTk
+
+            thumbnails = decode(warm)
+
+            def to_photos():
+                photos = [ImageTk.PhotoImage(img, master=self.tk_root) for img in thumbnails]
+                self.tk_root.update_idletasks()
+                return photos
+
+            self.record(storage, size, "view_images_photo", measure(to_photos, repeat))
+
+    def bench_upload(self, storage, size, core):
+        """上传图片: 一张新照片缩小、重新编码后存入图片库"""
+        uploaded = []
+
+        def upload():
+            uploaded.append(core.pipeline.ingest(self.upload_source))
+
+        def remove_uploaded(_):
+            core.release_image(uploaded.pop())
+
+        self.record(storage, size, "upload_image", measure(
+            lambda _: upload(), self.args.repeat, lambda: None, remove_uploaded,
+        ), bytes=os.path.getsize(self.upload_source))
+
+    def bench_export_import(self, storage, size, core, dataset_dir):
+        repeat = self.args.repeat
+        json_path = os.path.join(dataset_dir, "export.json")
+        archive_path = os.path.join(dataset_dir, "export.zip")
+
+        self.record(storage, size, "export_data_json",
+                    measure(lambda: core.export_file(json_path), repeat))
+        self.record(storage, size, "export_data_zip",
+                    measure(lambda: core.export_file(archive_path), repeat),
+                    bytes=os.path.getsize(archive_path))
+
+        # 导入JSON并替换全部记录 (内容与现有记录相同; 包括导入前的快照, 每次导入前删除全部快照
+        # (不计入耗时), 导入前的快照都从头写入)
+        def clear_snapshots():
+            shutil.rmtree(core.config["snapshot_dir"], ignore_errors=True)
+
+        self.record(storage, size, "import_data_json_replace", measure(
+            lambda _: core.import_file(json_path, "replace", False), repeat, clear_snapshots,
+        ))
+
+        # 把归档 (记录+图片) 合并导入到一份空数据中
+        target_dir = os.path.join(dataset_dir, "import_target")
+
+        def empty_target():
+            shutil.rmtree(target_dir, ignore_errors=True)
+            os.makedirs(target_dir)
+            return RejectionCore(dataset_config(target_dir, storage)).open()
+
+        self.record(storage, size, "import_data_zip_merge", measure(
+            lambda target: target.import_file(archive_path, "merge", True), repeat,
+            empty_target, lambda target: target.close(),
+        ))
+        shutil.rmtree(target_dir, ignore_errors=True)
+
+
+# ----------------------------------------------------------------------
+# 入口
+# ----------------------------------------------------------------------
+def open_hidden_root():
+    """隐藏的Tk主窗口, 没有图形界面时返回None"""
+    try:
+        import tkinter as tk
+
+        root = tk.Tk()
+    except Exception as e:
+        return None, str(e)
+    root.withdraw()
+    return root, None
+
+
+def environment_info(args):
+    from PIL import __version__ as pillow_version
+
+    from main import __version__ as app_version
+
+    return {
+        "app_version": app_version,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "pillow": pillow_version,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "photos": args.photos,
+        "screenshots": args.screenshots,
+    }
+
+
+def run(args):
+    sizes = parse_sizes(args.sizes)
+    storages = STORAGES if args.storage == "all" else (args.storage,)
+    report = environment_info(args)
+    report["skipped"] = []
+
+    tk_root, tk_error = open_hidden_root()
+    if tk_root is None:
+        report["skipped"].append(f"refresh_table, view_images_photo: 无法创建Tk窗口 ({tk_error})")
+
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="rejection_benchmark_"))
+    os.makedirs(work_dir, exist_ok=True)
+    # 配置中其余的相对路径 (图片指纹、原图目录等) 都在工作目录下
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        print("生成图片...", file=sys.stderr)
+        rng = random.Random(args.seed)
+        source_pool, upload_source = generate_images(
+            os.path.join(work_dir, "source_images"), args.photos, args.screenshots, rng
+        )
+        bench = Benchmark(args, tk_root, source_pool, upload_source)
+        for storage in storages:
+            for size in sizes:
+                dataset_dir = os.path.join(work_dir, f"{storage}_{size_label(size)}")
+                bench.run_dataset(storage, size, dataset_dir)
+                shutil.rmtree(dataset_dir, ignore_errors=True)
+        report["results"] = bench.results
+    finally:
+        os.chdir(cwd)
+        if tk_root is not None:
+            tk_root.destroy()
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}", file=sys.stderr)
+    return 0
+
+
+def compare(old_path, new_path, threshold):
+    """按中位数比较两次结果, 变慢超过threshold倍的项返回非0"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    def key(result):
+        return result["storage"], result["records"], result["operation"]
+
+    old_results = {key(result): result for result in old["results"]}
+    print(f"{old.get('app_version', '?')} -> {new.get('app_version', '?')}")
+    regressions = 0
+    for result in new["results"]:
+        before = old_results.get(key(result))
+        if before is None or result["operation"] == "generate":
+            continue
+        ratio = result["median"] / before["median"] if before["median"] else float("inf")
+        flag = ""
+        if ratio > threshold and result["median"] >= MIN_COMPARE_SECONDS:
+            flag = "  变慢"
+            regressions += 1
+        print(f"{result['storage']:<6} {size_label(result['records']):>5} {result['operation']:<32} "
+              f"{before['median'] * 1000:10.1f} -> {result['median'] * 1000:10.1f} ms  x{ratio:.2f}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="国服ID申请拒签管理 性能基准测试")
+    parser.add_argument("--sizes", default="1k,10k,100k,1m",
+                        help="记录数, 逗号分隔 (1k/10k/100k/1m 或数字), 默认全部")
+    parser.add_argument("--storage", choices=STORAGES + ("all",), default="all", help="存储类型 (默认两种都测)")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测量的次数 (默认 3)")
+    parser.add_argument("--seed", type=int, default=20251118, help="随机种子, 相同种子生成相同的数据")
+    parser.add_argument("--photos", type=int, default=6, help="生成的照片数 (默认 6)")
+    parser.add_argument("--screenshots", type=int, default=3, help="生成的截图数 (默认 3)")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果文件")
+    parser.add_argument("--work-dir", help="生成数据的目录 (默认临时目录, 结束后删除)")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="比较两次的结果文件")
+    parser.add_argument("--threshold", type=float, default=1.2, help="比较时视为变慢的倍数 (默认 1.2)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+内容寻址的图片存储
+图片按内容SHA256命名并分目录存放 (images/ab/ab12...ef.jpg), 相同内容只保存一份
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from repository import normalize_image_path
+
+
+# 复制文件时每次读取的字节数
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """内容寻址的图片存储
+
+    引用计数由记录存储维护 (image_ref_count), 删除记录后只有在没有任何
+    记录再引用某张图片时才真正删除文件. 旧版按 呼号_类型_时间戳 命名的
+    图片同样按引用计数处理.
+
+    上传时要求保留的原图放在 original_dir 中, 以处理后图片的哈希命名,
+    随处理后的图片一起删除.
+
+    已上传但还没有保存到记录中的图片用 pin() 固定, 固定期间 release() 不删除它;
+    pin_seconds 不为None时固定在这么多秒后自动失效 (服务器上的租约, 客户端可能不再解除).
+    """
+
+    def __init__(self, image_dir, store, original_dir=None, pin_seconds=None):
+        self.image_dir = image_dir
+        self.store = store
+        self.original_dir = original_dir
+        self.pin_seconds = pin_seconds
+        # 路径 -> [到期时间 (None为不过期)], 每次 pin() 一项
+        self._pins = {}
+        # 保护 _pins, 并使 存入/固定 与 检查引用/删除 不会交错
+        self._lock = threading.Lock()
+        os.makedirs(self.image_dir, exist_ok=True)
+
+    def blob_path(self, content_hash, ext):
+        """内容哈希 -> 存储路径 (统一使用 / 分隔)"""
+        return normalize_image_path(
+            os.path.join(self.image_dir, content_hash[:2], content_hash + ext.lower())
+        )
+
+    def ingest(self, src_path, pin=False):
+        """把文件存入图片库, 返回存储路径; 内容已存在时直接返回已有路径"""
+        return self.ingest_file(src_path, pin)[0]
+
+    def ingest_file(self, src_path, pin=False):
+        """把文件存入图片库, 返回 (存储路径, 是否新增了文件)"""
+        with open(src_path, 'rb') as src:
+            return self.ingest_fileobj(src, os.path.splitext(src_path)[1], pin)
+
+    def ingest_fileobj(self, src, ext, pin=False):
+        """把文件对象的内容存入图片库, 返回 (存储路径, 是否新增了文件)
+
+        pin 为True时同时固定图片 (见 pin()), 内容已存在时也不会在返回前被删除.
+        """
+        # 边复制边计算哈希, 源文件只读一遍
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.image_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+                dst.flush()
+                os.fsync(dst.fileno())
+
+            path = self.blob_path(digest.hexdigest(), ext)
+            with self._lock:
+                if pin:
+                    self._pin(path)
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                    return path, False
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                return path, True
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def store_original(self, path, src_path):
+        """为图片库中的 path 保留上传时的原图, 返回原图的保存路径"""
+        if not self.original_dir:
+            raise ValueError("没有设置原图目录")
+        content_hash = self.content_hash(path)
+        original = normalize_image_path(os.path.join(
+            self.original_dir, content_hash[:2], content_hash + os.path.splitext(src_path)[1].lower()
+        ))
+        if not os.path.exists(original):
+            os.makedirs(os.path.dirname(original), exist_ok=True)
+            tmp_path = original + ".tmp"
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, original)
+        return original
+
+    def original_paths(self, path):
+        """图片库中的 path 保留的原图 (可能没有)"""
+        if not self.original_dir:
+            return []
+        content_hash = self.content_hash(path)
+        dir_path = os.path.join(self.original_dir, content_hash[:2])
+        try:
+            names = os.listdir(dir_path)
+        except OSError:
+            return []
+        return [
+            normalize_image_path(os.path.join(dir_path, name)) for name in names
+            if os.path.splitext(name)[0] == content_hash
+        ]
+
+    @staticmethod
+    def file_hash(path):
+        """计算文件内容的SHA256"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def content_hash(path):
+        """从存储路径取出内容哈希"""
+        return os.path.splitext(os.path.basename(path))[0]
+
+    @classmethod
+    def is_content_addressed(cls, path):
+        """是否按内容哈希命名 (旧版按 呼号_类型_时间戳 命名)"""
+        content_hash = cls.content_hash(path)
+        return len(content_hash) == 64 and all(c in "0123456789abcdef" for c in content_hash)
+
+    def pin(self, path):
+        """固定一张还没有保存到记录中的图片, 每次 pin() 对应一次 unpin()"""
+        with self._lock:
+            self._pin(normalize_image_path(path))
+
+    def unpin(self, path):
+        """解除一次固定 (没有固定时不做任何事)"""
+        path = normalize_image_path(path)
+        with self._lock:
+            pins = self._pins.get(path)
+            if pins:
+                pins.pop(0)
+                if not pins:
+                    del self._pins[path]
+
+    def is_pinned(self, path):
+        with self._lock:
+            return self._pinned(normalize_image_path(path))
+
+    def _pin(self, path):
+        expires = None if self.pin_seconds is None else time.monotonic() + self.pin_seconds
+        self._pins.setdefault(path, []).append(expires)
+
+    def _pinned(self, path):
+        pins = self._pins.get(path)
+        if not pins:
+            return False
+        now = time.monotonic()
+        pins[:] = [expires for expires in pins if expires is None or expires > now]
+        if not pins:
+            del self._pins[path]
+            return False
+        return True
+
+    def release(self, path):
+        """记录删除后调用: 图片不再被任何记录引用、也没有被固定时删除文件, 返回是否删除"""
+        path = normalize_image_path(path)
+        if not path:
+            return False
+        with self._lock:
+            if self._pinned(path) or self.store.image_ref_count(path) > 0:
+                return False
+            if not os.path.exists(path):
+                return False
+            os.remove(path)
+            for original in self.original_paths(path):
+                os.remove(original)
+            return True
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+命令行工具
+不打开界面批量处理记录, 适合从表格导出的大量记录录入、定时导出和图片校验
+
+用法:
+    python cli.py add --callsign BH2XXX --apply-time "2025-11-18 10:00" --reason "资料不全"
+    python cli.py add --csv records.csv
+    python cli.py ingest 图片文件夹 --apply-time "2025-11-18 10:00" --reason "资料不全"
+    python cli.py import backup.zip --mode merge
+    python cli.py export backup.zip
+    python cli.py query BH2 资料 --from 2025-01-01 --to 2025-06-30
+    python cli.py verify
+    python cli.py similar BH2XXX --distance 6
+    python cli.py snapshot
+    python cli.py snapshot --list
+    python cli.py restore 20251118-100000
+    python cli.py --server http://127.0.0.1:8765 query BH2
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+from config import CONFIG_FILE, load_config
+from core import IMAGE_KINDS, RejectionCore, make_record
+from snapshots import format_size
+from repository import ID_FIELD
+from importer import IMPORT_MODES
+
+
+# CSV表头 -> 记录字段 (英文字段名或界面上的中文列名均可)
+CSV_COLUMNS = {
+    "callsign": "callsign",
+    "呼号": "callsign",
+    "apply_time": "apply_time",
+    "申请时间": "apply_time",
+    "rejection_reason": "rejection_reason",
+    "拒签原因": "rejection_reason",
+    "license_image": "license_image",
+    "执照照片": "license_image",
+    "operator_image": "operator_image",
+    "操作证照片": "operator_image",
+    "screenshot_image": "screenshot_image",
+    "申请截图": "screenshot_image",
+    "create_time": "create_time",
+    "创建时间": "create_time",
+}
+
+
+class ConsoleTask:
+    """在终端显示进度, 接口与 background.BackgroundTask 相同 (按 Ctrl+C 取消)"""
+
+    cancelled = False
+    reported = False
+
+    def check_cancelled(self):
+        pass
+
+    def report(self, done, total, text=""):
+        self.reported = True
+        print(f"\r{text or f'{done} / {total}'}", end="", file=sys.stderr, flush=True)
+
+    def finish(self):
+        if self.reported:
+            print(file=sys.stderr)
+
+
+# ----------------------------------------------------------------------
+# 子命令
+# ----------------------------------------------------------------------
+def cmd_add(core, args):
+    if args.csv:
+        records = read_csv_records(core, args.csv, args.keep_original or None)
+        core.add_records(records)
+        print(f"已添加 {len(records)} 条记录")
+        return 0
+
+    images = core.ingest_images({
+        IMAGE_KINDS[kind]: getattr(args, kind) for kind in IMAGE_KINDS
+    }, keep_original=args.keep_original or None)
+    try:
+        record = make_record(args.callsign, args.apply_time, args.reason, images)
+    except ValueError:
+        _release_all(core, images.values())
+        raise
+    index = core.add_record(record)
+    print(f"已添加记录 #{index + 1}: {record['callsign']}")
+    return 0
+
+
+def read_csv_records(core, csv_path, keep_original=None):
+    """读取CSV中的全部记录并存入引用的图片 (图片路径相对于CSV所在目录)
+
+    任何一行有误时不添加任何记录, 并删除本次新存入的图片.
+    """
+    base_dir = os.path.dirname(os.path.abspath(csv_path))
+    records = []
+    ingested = []
+    try:
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            unknown = [name for name in reader.fieldnames or [] if name.strip() not in CSV_COLUMNS]
+            if unknown:
+                raise ValueError(f"CSV中有无法识别的列: {', '.join(unknown)}")
+            for line, row in enumerate(reader, 2):
+                row = {CSV_COLUMNS[name.strip()]: (value or "").strip() for name, value in row.items() if name}
+                try:
+                    images = core.ingest_images(
+                        {field: row.get(field) for field in IMAGE_KINDS.values()}, base_dir, keep_original
+                    )
+                    ingested.extend(images.values())
+                    records.append(make_record(
+                        row.get("callsign"), row.get("apply_time"), row.get("rejection_reason"),
+                        images, row.get("create_time") or None,
+                    ))
+                except (ValueError, OSError) as e:
+                    raise ValueError(f"第 {line} 行: {e}") from e
+    except BaseException:
+        _release_all(core, ingested)
+        raise
+    return records
+
+
+def _release_all(core, paths):
+    for path in paths:
+        core.release_image(path)
+
+
+def cmd_ingest(core, args):
+    from batch_ingest import finish_ingest, ingest_plan, scan_folder
+
+    pattern = args.pattern or core.config["batch_filename_pattern"]
+    plan = scan_folder(args.folder, pattern, args.recursive)
+    for group in plan.groups:
+        kinds = ", ".join(kind for kind, field in IMAGE_KINDS.items() if field in group.images)
+        note = f" (另有 {len(group.duplicates)} 张同类图片不使用)" if group.duplicates else ""
+        print(f"{group.callsign}: {kinds}{note}")
+    for path in plan.unmatched:
+        print(f"不符合文件名规则: {path}")
+    print(f"共 {len(plan.groups)} 条记录, {plan.image_count} 张图片")
+    if args.dry_run or not plan.groups:
+        return 0
+
+    task = ConsoleTask()
+    try:
+        records = ingest_plan(
+            core, plan, args.apply_time, args.reason, task,
+            workers=core.config["batch_ingest_workers"], keep_original=args.keep_original or None,
+        )
+    finally:
+        task.finish()
+    try:
+        core.add_records(records)
+    except BaseException:
+        finish_ingest(core, records, saved=False)
+        raise
+    finish_ingest(core, records, saved=True)
+    print(f"已添加 {len(records)} 条记录")
+    return 0
+
+
+def cmd_import(core, args):
+    task = ConsoleTask()
+    try:
+        job, added, updated, removed = core.import_file(args.file, args.mode, not args.no_images, task)
+    finally:
+        task.finish()
+    print(f"新增 {added} 条, 更新 {updated} 条记录")
+    if job.deleted:
+        print(f"删除 {job.deleted} 条记录")
+    if job.skipped:
+        print(f"跳过已有或重复的记录 {job.skipped} 条")
+    if job.copied_images:
+        print(f"复制图片 {job.copied_images} 张")
+    if job.missing_images:
+        print(f"找不到的图片 {job.missing_images} 张")
+    if removed:
+        print(f"删除不再引用的图片 {len(removed)} 张")
+    if job.snapshot:
+        print(f"导入前的数据已保存为快照: {job.snapshot['id']}")
+    return 0
+
+
+def cmd_export(core, args):
+    task = ConsoleTask()
+    try:
+        count = core.export_file(args.file, task)
+    finally:
+        task.finish()
+    print(f"已导出 {count} 条记录到 {args.file}")
+    return 0
+
+
+def cmd_query(core, args):
+    results = core.query(" ".join(args.text), args.start, args.end)
+    if args.json:
+        json.dump([dict(record) for _, record in results], sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+    for position, record in results:
+        reason = record.get("rejection_reason", "").replace("\n", " ")
+        print(f"{position + 1}\t{record['callsign']}\t{record['apply_time']}\t{reason}")
+    print(f"共 {len(results)} 条记录", file=sys.stderr)
+    return 0
+
+
+def cmd_similar(core, args):
+    task = ConsoleTask()
+    try:
+        index = core.similarity_index(task)
+    finally:
+        task.finish()
+    max_distance = core.config["similar_max_distance"] if args.distance is None else args.distance
+    kinds = {field: kind for kind, field in IMAGE_KINDS.items()}
+    wanted = {callsign.strip().upper() for callsign in args.callsign}
+    records = list(core.store.iter_records())
+    position_of = {record[ID_FIELD]: position for position, record in enumerate(records)}
+    found = 0
+    for position, record in enumerate(records):
+        if wanted and record["callsign"].strip().upper() not in wanted:
+            continue
+        for match in index.find_similar(record[ID_FIELD], max_distance):
+            other_position = position_of[match.other_id]
+            if not wanted and other_position < position:
+                # 列出全部时每对只列一次
+                continue
+            other = records[other_position]
+            print(
+                f"{position + 1}\t{record['callsign']}\t{kinds[match.field]}\t"
+                f"{other_position + 1}\t{other['callsign']}\t{kinds[match.other_field]}\t{match.distance}"
+            )
+            found += 1
+    print(f"共 {found} 处相似图片 (差异不超过 {max_distance} 位)", file=sys.stderr)
+    return 0
+
+
+def cmd_snapshot(core, args):
+    if args.list:
+        manifests = core.list_snapshots()
+        for manifest in manifests:
+            print(
+                f"{manifest['id']}\t{manifest['created']}\t{manifest['reason']}\t"
+                f"{manifest['records']} 条记录\t{manifest['images']} 张图片\t"
+                f"新增 {format_size(manifest['new_bytes'])}"
+            )
+        print(f"共 {len(manifests)} 个快照", file=sys.stderr)
+        return 0
+    if args.prune:
+        removed = core.prune_snapshots()
+        print(f"删除旧快照 {len(removed)} 个" + (f": {', '.join(removed)}" if removed else ""))
+        return 0
+
+    task = ConsoleTask()
+    try:
+        manifest = core.create_snapshot(args.reason or "手动备份", task)
+    finally:
+        task.finish()
+    print(
+        f"已创建快照 {manifest['id']}: {manifest['records']} 条记录, {manifest['images']} 张图片, "
+        f"新增 {format_size(manifest['new_bytes'])}"
+    )
+    if manifest["missing_images"]:
+        print(f"找不到的图片 {manifest['missing_images']} 张")
+    return 0
+
+
+def cmd_restore(core, args):
+    task = ConsoleTask()
+    try:
+        before, count, missing = core.restore_snapshot(args.snapshot, task)
+    finally:
+        task.finish()
+    print(f"已恢复快照 {args.snapshot}: {count} 条记录")
+    if missing:
+        print(f"快照中也找不到的图片 {missing} 张")
+    if before is not None:
+        print(f"恢复前的数据已保存为快照: {before['id']}")
+    return 0
+
+
+def cmd_verify(core, args):
+    task = ConsoleTask()
+    try:
+        report = core.verify(task)
+    finally:
+        task.finish()
+    print(f"已校验 {report.checked} 张图片")
+    for position, callsign, path in report.missing:
+        print(f"缺少图片: 第 {position + 1} 条 ({callsign}) {path}")
+    for path in report.corrupt:
+        print(f"内容损坏: {path}")
+    for path in report.orphans:
+        print(f"没有记录引用: {path}")
+    if args.remove_orphans and report.orphans:
+        removed = sum(1 for path in report.orphans if core.release_image(path))
+        print(f"已删除 {removed} 张没有记录引用的图片")
+        report.orphans = []
+    if report.ok:
+        print("全部正常")
+    return 0 if report.ok else 1
+
+
+# ----------------------------------------------------------------------
+# 入口
+# ----------------------------------------------------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(description="国服ID申请拒签管理 命令行工具")
+    parser.add_argument("--config", default=CONFIG_FILE, help="配置文件 (默认 config.json)")
+    parser.add_argument("--server", help="连接 server.py 的地址 (如 http://127.0.0.1:8765), 覆盖配置中的 server_url")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="添加一条记录, 或从CSV批量添加")
+    add.add_argument("--csv", help="CSV文件 (表头为字段名或界面上的列名), 所有行一次写入")
+    add.add_argument("--callsign", help="呼号")
+    add.add_argument("--apply-time", help="申请时间")
+    add.add_argument("--reason", default="", help="拒签原因")
+    for kind in IMAGE_KINDS:
+        add.add_argument(f"--{kind}", help=f"{kind} 图片文件")
+    add.add_argument("--keep-original", action="store_true",
+                     help="另外保留原图 (图片默认缩小并重新编码, 见 config.json 中的 image_*)")
+    add.set_defaults(func=cmd_add)
+
+    ingest = commands.add_parser("ingest", help="按文件名把文件夹中的图片分组, 每个呼号添加一条记录")
+    ingest.add_argument("folder")
+    ingest.add_argument("--apply-time", help="申请时间 (所有记录相同)")
+    ingest.add_argument("--reason", default="", help="拒签原因")
+    ingest.add_argument("--pattern", help="文件名规则 (默认为 config.json 中的 batch_filename_pattern)")
+    ingest.add_argument("--recursive", action="store_true", help="包括子文件夹")
+    ingest.add_argument("--dry-run", action="store_true", help="只列出分组, 不添加")
+    ingest.add_argument("--keep-original", action="store_true", help="另外保留原图")
+    ingest.set_defaults(func=cmd_ingest)
+
+    imp = commands.add_parser("import", help="导入JSON数据文件或 zip/tar 归档")
+    imp.add_argument("file")
+    imp.add_argument("--mode", choices=[mode for mode, _ in IMPORT_MODES], default="merge",
+                     help="replace=替换全部, merge=合并 (默认), upsert=更新; 增量同步文件自动识别")
+    imp.add_argument("--no-images", action="store_true", help="不导入图片")
+    imp.set_defaults(func=cmd_import)
+
+    exp = commands.add_parser("export", help="导出为JSON (只有记录) 或 zip/tar 归档 (记录+图片)")
+    exp.add_argument("file")
+    exp.set_defaults(func=cmd_export)
+
+    query = commands.add_parser("query", help="查询记录 (呼号前缀或拒签原因, 申请时间范围)")
+    query.add_argument("text", nargs="*", help="查询词, 多个词需同时匹配")
+    query.add_argument("--from", dest="start", help="申请时间起 (含)")
+    query.add_argument("--to", dest="end", help="申请时间止 (含)")
+    query.add_argument("--json", action="store_true", help="以JSON输出完整记录")
+    query.set_defaults(func=cmd_query)
+
+    similar = commands.add_parser("similar", help="查找不同记录之间相同或相似的图片")
+    similar.add_argument("callsign", nargs="*", help="只查这些呼号的记录 (默认列出全部)")
+    similar.add_argument("--distance", type=int, help="视为相似的最大差异位数 (默认见 similar_max_distance)")
+    similar.set_defaults(func=cmd_similar)
+
+    snapshot = commands.add_parser("snapshot", help="创建备份快照 (只保存与已有快照不同的记录和图片)")
+    snapshot.add_argument("--reason", help="备注")
+    snapshot.add_argument("--list", action="store_true", help="列出全部快照")
+    snapshot.add_argument("--prune", action="store_true", help="只按保留策略删除旧快照")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    restore = commands.add_parser("restore", help="用快照替换全部记录 (恢复前自动为当前数据创建快照)")
+    restore.add_argument("snapshot", help="快照ID (见 snapshot --list)")
+    restore.set_defaults(func=cmd_restore)
+
+    verify = commands.add_parser("verify", help="校验图片是否缺失、损坏或没有记录引用")
+    verify.add_argument("--remove-orphans", action="store_true", help="删除没有记录引用的图片")
+    verify.set_defaults(func=cmd_verify)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "add" and not args.csv and not (args.callsign and args.apply_time):
+        parser.error("add 需要 --csv, 或者 --callsign 和 --apply-time")
+    if args.command == "ingest" and not args.dry_run and not args.apply_time:
+        parser.error("ingest 需要 --apply-time (或使用 --dry-run 预览)")
+
+    try:
+        config = load_config(args.config)
+        if args.server:
+            config["server_url"] = args.server
+        with RejectionCore(config) as core:
+            return args.func(core, args)
+    except KeyboardInterrupt:
+        print("\n已取消", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+配置
+默认配置可由程序目录下的 config.json 覆盖
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import json
+import os
+
+
+CONFIG_FILE = "config.json"
+
+DEFAULT_CONFIG = {
+    # 存储类型: "json" (rejection_data.json + 修改日志) 或 "sqlite"
+    "storage": "json",
+    "data_file": "rejection_data.json",
+    "database_file": "rejection_data.db",
+    # JSON存储: 修改在后台合并写入, 等待的毫秒数 (这段时间内的修改只写一次)
+    "write_delay_ms": 200,
+    "image_dir": "images",
+    # 上传图片的处理: 最长边像素, 输出格式 ("jpeg"/"webp"/"png", "original" 为不处理),
+    # 编码质量; 是否默认保留原图 (界面上可以逐次勾选) 及原图目录
+    "image_max_side": 2560,
+    "image_format": "jpeg",
+    "image_quality": 85,
+    "keep_original_images": False,
+    "original_image_dir": "images_original",
+    # 按文件夹批量添加: 文件名规则 (不含扩展名, 见 batch_ingest.py) 和并行处理图片的线程数
+    "batch_filename_pattern": "{callsign}_{kind}_*",
+    "batch_ingest_workers": 4,
+    # 多人共用: 填写 server.py 的地址 (如 "http://127.0.0.1:8765") 后记录和图片都保存在服务器上,
+    # 本地的数据文件和图片目录不再使用; 请求超时秒数, 检查其他操作员修改的间隔秒数,
+    # 从服务器下载的图片的缓存目录
+    "server_url": "",
+    "server_timeout_seconds": 30,
+    "server_poll_seconds": 5,
+    "remote_image_cache": ".remote_images",
+    # server.py: 监听地址和端口, 只读连接池的大小 (可以同时处理的读取请求数)
+    "server_host": "127.0.0.1",
+    "server_port": 8765,
+    "server_readers": 4,
+    # 查找相似图片: 图片哈希的缓存文件, 视为相似的最大汉明距离 (0~64, 越小越严格)
+    "image_hash_file": "image_hashes.json",
+    "similar_max_distance": 8,
+    # 缩略图缓存目录, 磁盘占用上限 (MB), 内存中保留的缩略图数
+    "thumbnail_dir": ".thumbnails",
+    "thumbnail_cache_mb": 200,
+    "thumbnail_memory_items": 64,
+    # 备份快照目录; 距上一个快照超过这么多小时时, 启动后自动创建一个 (0为不自动创建);
+    # 保留策略: 最新的几个, 以及最近几天/几周/几个月中每天/每周/每月最新的一个;
+    # 图片是否用硬链接保存 (同一磁盘上不额外占用空间)
+    "snapshot_dir": "snapshots",
+    "snapshot_interval_hours": 24,
+    "snapshot_keep_last": 5,
+    "snapshot_keep_daily": 7,
+    "snapshot_keep_weekly": 4,
+    "snapshot_keep_monthly": 6,
+    "snapshot_link_images": False,
+    # 增量同步状态 (本站ID和各站点的水位)
+    "sync_state_file": "sync_state.json",
+    # 性能日志 (滚动保存, 单个文件的上限KB和保留的旧文件个数) 和 cProfile 分析结果目录
+    "perf_log_file": "perf.log",
+    "perf_log_max_kb": 1024,
+    "perf_log_backups": 3,
+    "profile_dir": "profiles",
+}
+
+
+def load_config(path=CONFIG_FILE):
+    """读取配置文件, 未设置的项使用默认值"""
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        except Exception as e:
+            print(f"读取配置文件失败: {e}")
+    return config
@@ -0,0 +1,355 @@
+"""
+核心功能 (不依赖界面)
+记录和图片的增删、导入导出、查询和校验, 供图形界面和命令行 (cli.py) 共用
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from blob_store import BlobStore
+from config import load_config
+from image_pipeline import ImagePipeline
+from perf_monitor import LOGGER_NAME
+from record_model import json_default
+from repository import ID_FIELD, IMAGE_FIELDS, image_refs, normalize_image_path, open_repository
+from similarity import ImageHashes
+from snapshots import SnapshotStore
+
+
+# 与性能日志共用: 图形界面中写入日志文件, 命令行中没有日志文件时警告输出到 stderr
+logger = logging.getLogger(LOGGER_NAME)
+
+# 图片字段的简称 (界面上传按钮和命令行参数使用)
+IMAGE_KINDS = {
+    "license": "license_image",
+    "operator": "operator_image",
+    "screenshot": "screenshot_image",
+}
+
+
+def make_record(callsign, apply_time, reason="", images=None, create_time=None):
+    """组装一条新记录, images 为 {字段: 图片库中的路径}"""
+    callsign = (callsign or "").strip()
+    apply_time = (apply_time or "").strip()
+    if not callsign:
+        raise ValueError("呼号不能为空!")
+    if not apply_time:
+        raise ValueError("申请时间不能为空!")
+    images = images or {}
+    return {
+        "callsign": callsign,
+        "apply_time": apply_time,
+        "license_image": images.get("license_image", ""),
+        "operator_image": images.get("operator_image", ""),
+        "screenshot_image": images.get("screenshot_image", ""),
+        "rejection_reason": (reason or "").strip(),
+        "create_time": create_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+class VerifyReport:
+    """图片完整性校验结果"""
+
+    def __init__(self):
+        self.checked = 0
+        self.missing = []       # [(记录位置, 呼号, 图片路径)]
+        self.corrupt = []       # [图片路径] 内容与文件名中的哈希不符
+        self.orphans = []       # [图片路径] 没有记录引用的图片
+
+    @property
+    def ok(self):
+        return not (self.missing or self.corrupt or self.orphans)
+
+
+class RejectionCore:
+    """拒签记录的存储和图片库
+
+    所有修改都经过存储, 批量操作一次写入 (extend / update_many),
+    不会每条记录保存一次.
+    """
+
+    def __init__(self, config=None):
+        self.config = config if config is not None else load_config()
+        self.image_dir = self.config["image_dir"]
+        # 服务器模式: 记录和图片都在 server.py 上, 本地只缓存查看过的图片
+        self.remote = bool(self.config.get("server_url"))
+        self.store = open_repository(self.config)
+        if self.remote:
+            from remote_store import RemoteBlobStore
+
+            self.images = RemoteBlobStore(self.store.client, self.config["remote_image_cache"])
+        else:
+            self.images = BlobStore(self.image_dir, self.store, self.config["original_image_dir"])
+        self.image_hashes = ImageHashes(self.config["image_hash_file"])
+        self.pipeline = ImagePipeline.from_config(self.images, self.config, self.image_hashes)
+        # 备份快照只针对本机的数据 (服务器模式下在服务器上备份)
+        self.snapshots = None
+        if not self.remote:
+            self.snapshots = SnapshotStore(
+                self.config["snapshot_dir"], self.image_dir, self.config["snapshot_link_images"]
+            )
+
+    def open(self):
+        self.store.load()
+        return self
+
+    def close(self):
+        try:
+            self.image_hashes.save()
+        except OSError as e:
+            logger.error("save image hashes failed: %s", e)
+        self.store.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # 增删
+    # ------------------------------------------------------------------
+    def ingest_images(self, image_files, base_dir=None, keep_original=None):
+        """把 {字段: 源文件} 规范化后存入图片库, 返回 {字段: 图片库中的路径}"""
+        stored = {}
+        for field, src in image_files.items():
+            if not src:
+                continue
+            if base_dir and not os.path.isabs(src):
+                src = os.path.join(base_dir, src)
+            stored[field] = self.pipeline.ingest(src, keep_original)
+        return stored
+
+    def add_record(self, record):
+        """追加一条记录, 返回它的位置"""
+        self.store.append(record)
+        return self.store.count() - 1
+
+    def add_records(self, records):
+        """批量追加 (一次写入), 返回追加的条数"""
+        records = list(records)
+        self.store.extend(records)
+        return len(records)
+
+    def delete_record(self, record_id):
+        """按ID删除记录, 返回 (被删除的记录, 因此删除的图片)"""
+        record = self.store.delete_by_id(record_id)
+        return record, self._release_images(image_refs(record))
+
+    def update_record(self, record_id, fields):
+        """按ID修改记录, 只写入与原值不同的字段
+
+        返回 (实际修改的字段, 因替换而不再被引用、已删除的图片).
+        """
+        old = self.store.get_by_id(record_id)
+        if old is None:
+            raise KeyError(f"记录不存在或已被删除: {record_id}")
+        changed = {
+            field: value for field, value in fields.items()
+            if (old.get(field) or "") != (value or "")
+        }
+        if not changed:
+            return changed, []
+        self.store.update_by_id(record_id, changed)
+        replaced = [
+            normalize_image_path(old[field])
+            for field in IMAGE_FIELDS
+            if field in changed and old.get(field)
+        ]
+        return changed, self._release_images(replaced)
+
+    def _release_images(self, paths):
+        removed = []
+        for path in paths:
+            try:
+                if self.images.release(path):
+                    removed.append(path)
+            except OSError as e:
+                logger.warning("release image %s failed: %s", path, e)
+        return removed
+
+    def release_image(self, path):
+        """没有记录引用时删除图片, 返回是否删除"""
+        return self.images.release(path)
+
+    @property
+    def image_resolver(self):
+        """图片路径 -> 本机上可以读取的文件; 本地存储时为None (路径就是文件)"""
+        return self.images.local_path if self.remote else None
+
+    # ------------------------------------------------------------------
+    # 导入导出
+    # ------------------------------------------------------------------
+    def import_file(self, import_path, mode="merge", import_images=True, task=None):
+        """导入数据文件或归档, 返回 (ImportJob, 新增数, 覆盖数, 删除的图片)
+
+        增量同步归档总是按记录ID应用 (忽略mode), 并导入其中的图片.
+        """
+        # 导入导出用到的 zipfile/tarfile 等模块较大, 用到时才导入
+        from importer import ImportJob, read_delta_info
+
+        if read_delta_info(import_path) is not None:
+            mode, import_images = "sync", True
+        job = ImportJob(
+            self.store, self.images, import_path, mode, import_images, backup=self.snapshot_before_import
+        ).prepare(task)
+        added, updated, removed = job.apply()
+        return job, added, updated, removed
+
+    def export_file(self, export_path, task=None):
+        """导出: .zip/.tar 为带图片的归档, 其他为JSON记录列表; 返回导出的记录数"""
+        from exporter import export_archive, is_archive_path
+
+        if is_archive_path(export_path):
+            return export_archive(self.store, export_path, task, resolve=self.image_resolver)[0]
+        records = list(self.store.iter_records())
+        with open(export_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2, default=json_default)
+        return len(records)
+
+    # ------------------------------------------------------------------
+    # 查询和校验
+    # ------------------------------------------------------------------
+    def query(self, text=None, start=None, end=None):
+        """查询记录, 返回 [(位置, 记录)]
+
+        text 按搜索框的规则匹配 (呼号前缀或拒签原因), start/end 为申请时间范围.
+        """
+        if start or end:
+            results = self.store.find_by_apply_time(start or "", end or "\uffff")
+        else:
+            results = list(enumerate(self.store.iter_records()))
+        if text:
+            from search_index import SearchIndex
+
+            index = SearchIndex()
+            index.build(record for _, record in results)
+            wanted = set(index.search(text))
+            results = [(position, record) for position, record in results if record[ID_FIELD] in wanted]
+        return results
+
+    # ------------------------------------------------------------------
+    # 备份快照
+    # ------------------------------------------------------------------
+    def _require_snapshots(self):
+        if self.snapshots is None:
+            raise ValueError("记录保存在服务器上, 请在服务器上备份和恢复")
+        return self.snapshots
+
+    def list_snapshots(self):
+        """全部快照的清单, 按创建时间从旧到新"""
+        return self._require_snapshots().list()
+
+    def create_snapshot(self, reason="手动备份", task=None):
+        """为当前的记录和图片创建快照, 再按保留策略清理旧快照; 返回新快照的清单"""
+        manifest = self._require_snapshots().create(self.store, reason, task)
+        try:
+            self.prune_snapshots()
+        except OSError as e:
+            logger.warning("prune snapshots failed: %s", e)
+        return manifest
+
+    def snapshot_before_import(self, task=None):
+        """导入 (替换/更新) 之前的备份, 服务器模式下不备份"""
+        if self.snapshots is None:
+            return None
+        return self.create_snapshot("导入前", task)
+
+    def prune_snapshots(self):
+        """按配置的保留策略删除旧快照, 返回删除的快照ID"""
+        return self._require_snapshots().prune(
+            self.config["snapshot_keep_last"],
+            self.config["snapshot_keep_daily"],
+            self.config["snapshot_keep_weekly"],
+            self.config["snapshot_keep_monthly"],
+        )
+
+    def snapshot_due(self):
+        """距上一个快照是否已超过 snapshot_interval_hours (有记录时才需要)"""
+        hours = self.config["snapshot_interval_hours"]
+        if self.snapshots is None or not hours or not self.store.count():
+            return False
+        latest = self.snapshots.latest()
+        if latest is None:
+            return True
+        created = datetime.strptime(latest["created"], "%Y-%m-%d %H:%M:%S")
+        return datetime.now() - created >= timedelta(hours=hours)
+
+    def prepare_restore(self, snapshot_id, task=None):
+        """读出快照中的记录并放回图库中缺少的图片 (耗时, 可以在工作线程中调用)
+
+        返回 (记录列表, 快照中也找不到的图片数). 记录还没有写入存储, 见 apply_restore().
+        """
+        snapshots = self._require_snapshots()
+        records = snapshots.load_records(snapshot_id, task)
+        _, missing = snapshots.restore_images(snapshot_id, records, task)
+        return records, missing
+
+    def apply_restore(self, records):
+        """用快照中的记录替换全部记录, 返回不再被引用而删除的图片"""
+        old_paths = {path for record in self.store.iter_records() for path in image_refs(record)}
+        self.store.replace_all(records)
+        return self._release_images(sorted(old_paths))
+
+    def restore_snapshot(self, snapshot_id, task=None):
+        """恢复快照 (恢复前先为当前数据创建一个快照), 返回 (恢复前的快照, 记录数, 找不到的图片数)"""
+        # 先读出要恢复的快照, 创建新快照时的清理不会影响它
+        records, missing = self.prepare_restore(snapshot_id, task)
+        before = self.create_snapshot("恢复前", task) if self.store.count() else None
+        self.apply_restore(records)
+        return before, len(records), missing
+
+    def similarity_index(self, task=None):
+        """建立相似图片索引, 并补算还没有哈希的图片"""
+        from similarity import SimilarityIndex
+
+        index = SimilarityIndex(self.image_hashes, resolve=self.image_resolver)
+        index.build(self.store.iter_records())
+        index.compute_missing(task)
+        return index
+
+    def verify(self, task=None, workers=4):
+        """校验图片: 记录引用的图片是否存在、内容是否与哈希文件名一致, 以及孤立的图片"""
+        if self.remote:
+            raise ValueError("记录保存在服务器上, 请在服务器上校验图片")
+        report = VerifyReport()
+        referenced = set()
+        for position, record in enumerate(self.store.iter_records()):
+            for field in IMAGE_FIELDS:
+                path = normalize_image_path(record.get(field))
+                if not path:
+                    continue
+                if os.path.isfile(path):
+                    referenced.add(path)
+                else:
+                    report.missing.append((position, record["callsign"], path))
+
+        paths = sorted(referenced)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify") as executor:
+            results = zip(paths, executor.map(self._check_blob, paths))
+            for done, (path, ok) in enumerate(results, 1):
+                if not ok:
+                    report.corrupt.append(path)
+                if task is not None:
+                    task.report(done, len(paths), f"已校验 {done} / {len(paths)} 张图片")
+        report.checked = len(paths)
+
+        for dir_path, _, file_names in os.walk(self.image_dir):
+            for name in file_names:
+                path = normalize_image_path(os.path.join(dir_path, name))
+                if path not in referenced and not name.endswith(".tmp") \
+                        and self.store.image_ref_count(path) == 0:
+                    report.orphans.append(path)
+        report.orphans.sort()
+        return report
+
+    def _check_blob(self, path):
+        """按内容寻址存储的图片校验哈希; 旧版命名的图片只要能读取即可"""
+        if not BlobStore.is_content_addressed(path):
+            return os.access(path, os.R_OK)
+        return BlobStore.file_hash(path) == BlobStore.content_hash(path)
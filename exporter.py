@@ -0,0 +1,389 @@
+"""
+归档导出
+把记录和被引用的图片流式写入一个 zip 或 tar 归档, 附带带校验和的清单 (manifest.json).
+各条目在线程池中并行读取/压缩, 已压缩的图片 (JPEG/PNG等) 直接存储不再压缩.
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import hashlib
+import io
+import json
+import os
+import struct
+import tarfile
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from repository import IMAGE_FIELDS, normalize_image_path
+
+
+RECORDS_ENTRY = "records.json"
+MANIFEST_ENTRY = "manifest.json"
+# 增量同步归档 (sync.py) 额外带的条目
+DELTA_ENTRY = "delta.json"
+TOMBSTONES_ENTRY = "tombstones.json"
+MANIFEST_VERSION = 1
+
+# 本身已经压缩过的格式, 再压缩只浪费CPU
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".zip", ".gz"}
+
+# records.json 按块并行压缩, 每块的大致字节数
+RECORDS_CHUNK_SIZE = 1024 * 1024
+
+# 同时在内存中等待写出的条目数上限
+MAX_PENDING_ENTRIES = 16
+
+COMPRESS_LEVEL = 6
+
+
+def is_archive_path(path):
+    return os.path.splitext(path)[1].lower() in (".zip", ".tar")
+
+
+# ----------------------------------------------------------------------
+# 条目准备 (工作线程)
+# ----------------------------------------------------------------------
+class PreparedEntry:
+    """已经读入 (并按需压缩) 的一个归档条目
+
+    内容为内存中的 chunks, 或 (较大的 records.json) 已写好的临时文件 spool.
+    """
+
+    def __init__(self, name, chunks, size, crc, sha256, compressed, spool=None):
+        self.name = name
+        self.chunks = chunks
+        self.size = size
+        self.crc = crc
+        self.sha256 = sha256
+        self.compressed = compressed
+        self.spool = spool
+
+    @property
+    def compressed_size(self):
+        if self.spool is not None:
+            return self.spool.seek(0, os.SEEK_END)
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def iter_chunks(self):
+        """按顺序产出 (压缩后的) 内容"""
+        if self.spool is None:
+            return iter(self.chunks)
+        self.spool.seek(0)
+        return iter(lambda: self.spool.read(RECORDS_CHUNK_SIZE), b"")
+
+    def open(self):
+        """内容的文件对象 (只用于不压缩的条目)"""
+        if self.spool is None:
+            return io.BytesIO(b"".join(self.chunks))
+        self.spool.seek(0)
+        return self.spool
+
+
+def deflate_chunk(data, final):
+    """把一块数据压缩为原始deflate流; 非最后一块以同步刷新结束, 各块可直接拼接"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def prepare_file_entry(name, path, compress):
+    """读取图片文件, 计算CRC和SHA256, 需要时压缩"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    crc = zlib.crc32(data)
+    sha256 = hashlib.sha256(data).hexdigest()
+    if compress and os.path.splitext(path)[1].lower() not in STORED_EXTENSIONS:
+        return PreparedEntry(name, [deflate_chunk(data, True)], len(data), crc, sha256, True)
+    return PreparedEntry(name, [data], len(data), crc, sha256, False)
+
+
+# ----------------------------------------------------------------------
+# ZIP写入 (支持ZIP64)
+# ----------------------------------------------------------------------
+class ZipStreamWriter:
+    """按顺序写出已准备好的条目的ZIP写入器
+
+    zipfile 模块只能在写入时自己压缩, 无法利用并行压缩好的数据,
+    所以这里直接写ZIP结构. 条目数或大小超出限制时自动使用ZIP64.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        self.central = []
+
+    def _write(self, data):
+        self.f.write(data)
+        self.offset += len(data)
+
+    def add(self, entry):
+        name = entry.name.encode('utf-8')
+        method = 8 if entry.compressed else 0
+        csize = entry.compressed_size
+        dos_time, dos_date = self._dos_datetime()
+        header_offset = self.offset
+
+        zip64 = entry.size >= 0xFFFFFFFF or csize >= 0xFFFFFFFF
+        extra = struct.pack("<HHQQ", 0x0001, 16, entry.size, csize) if zip64 else b""
+        self._write(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if zip64 else 20, 0x0800, method,
+            dos_time, dos_date, entry.crc,
+            0xFFFFFFFF if zip64 else csize, 0xFFFFFFFF if zip64 else entry.size,
+            len(name), len(extra),
+        ) + name + extra)
+        for chunk in entry.iter_chunks():
+            self._write(chunk)
+
+        self.central.append((name, method, dos_time, dos_date, entry.crc, csize, entry.size, header_offset))
+
+    def close(self):
+        cd_offset = self.offset
+        for name, method, dos_time, dos_date, crc, csize, size, header_offset in self.central:
+            values = []
+            if size >= 0xFFFFFFFF:
+                values.append(size)
+            if csize >= 0xFFFFFFFF:
+                values.append(csize)
+            if header_offset >= 0xFFFFFFFF:
+                values.append(header_offset)
+            extra = (
+                struct.pack("<HH", 0x0001, 8 * len(values)) + struct.pack(f"<{len(values)}Q", *values)
+                if values else b""
+            )
+            version = 45 if values else 20
+            self._write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, version, version, 0x0800, method,
+                dos_time, dos_date, crc,
+                min(csize, 0xFFFFFFFF), min(size, 0xFFFFFFFF),
+                len(name), len(extra), 0, 0, 0, 0, min(header_offset, 0xFFFFFFFF),
+            ) + name + extra)
+
+        cd_size = self.offset - cd_offset
+        count = len(self.central)
+        if count >= 0xFFFF or cd_offset >= 0xFFFFFFFF or cd_size >= 0xFFFFFFFF:
+            zip64_eocd_offset = self.offset
+            self._write(struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset
+            ))
+            self._write(struct.pack("<IIQI", 0x07064B50, 0, zip64_eocd_offset, 1))
+        self._write(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0,
+            min(count, 0xFFFF), min(count, 0xFFFF),
+            min(cd_size, 0xFFFFFFFF), min(cd_offset, 0xFFFFFFFF), 0,
+        ))
+
+    @staticmethod
+    def _dos_datetime():
+        t = time.localtime()
+        dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+        return dos_time, dos_date
+
+
+class TarStreamWriter:
+    """按顺序写出已准备好的条目的TAR写入器 (不压缩)"""
+
+    def __init__(self, f):
+        self.tar = tarfile.open(fileobj=f, mode="w", format=tarfile.PAX_FORMAT)
+
+    def add(self, entry):
+        info = tarfile.TarInfo(entry.name)
+        info.size = entry.size
+        info.mtime = int(time.time())
+        self.tar.addfile(info, entry.open())
+
+    def close(self):
+        self.tar.close()
+
+
+# ----------------------------------------------------------------------
+# 导出
+# ----------------------------------------------------------------------
+def _archive_name(path, external_names):
+    """记录中的图片路径 -> 归档中的条目名"""
+    path = normalize_image_path(path)
+    if os.path.isabs(path) or path.startswith("../") or ":" in path:
+        # 图片目录之外的文件统一放到 images/external/ 下
+        if path not in external_names:
+            base = os.path.basename(path)
+            external_names[path] = f"images/external/{len(external_names)}_{base}"
+        return external_names[path]
+    return path
+
+
+def _iter_record_chunks(records, chunk_size):
+    """把记录序列化为JSON数组, 按大约chunk_size字节分块产出"""
+    parts = [b"["]
+    size = 1
+    first = True
+    for record in records:
+        item = json.dumps(record, ensure_ascii=False).encode('utf-8')
+        parts.append(item if first else b"," + item)
+        size += len(item) + 1
+        first = False
+        if size >= chunk_size:
+            yield b"".join(parts)
+            parts, size = [], 0
+    parts.append(b"]")
+    yield b"".join(parts)
+
+
+def _spool_records(records, spool, executor, compress, task=None):
+    """把记录序列化为 records.json 写入临时文件 spool, 返回 (大小, CRC, SHA256)
+
+    各块在线程池中并行压缩, 同时在内存中的块数不超过 MAX_PENDING_ENTRIES.
+    """
+    crc, sha256, size = 0, hashlib.sha256(), 0
+    pending = deque()
+
+    def add(chunk, final):
+        nonlocal crc, size
+        if task is not None:
+            task.check_cancelled()
+        crc = zlib.crc32(chunk, crc)
+        sha256.update(chunk)
+        size += len(chunk)
+        if not compress:
+            spool.write(chunk)
+            return
+        pending.append(executor.submit(deflate_chunk, chunk, final))
+        while len(pending) > MAX_PENDING_ENTRIES:
+            spool.write(pending.popleft().result())
+
+    try:
+        # 最后一块要以结束标记压缩, 所以晚一块处理
+        chunks = _iter_record_chunks(records, RECORDS_CHUNK_SIZE)
+        previous = next(chunks)
+        for chunk in chunks:
+            add(previous, False)
+            previous = chunk
+        add(previous, True)
+        while pending:
+            spool.write(pending.popleft().result())
+    finally:
+        for future in pending:
+            future.cancel()
+    return size, crc, sha256.hexdigest()
+
+
+def _json_entry(name, value, compress):
+    """把一个小的JSON值准备为归档条目"""
+    data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+    return PreparedEntry(
+        name, [deflate_chunk(data, True) if compress else data], len(data),
+        zlib.crc32(data), hashlib.sha256(data).hexdigest(), compress,
+    )
+
+
+def export_archive(store, export_path, task=None, workers=4, records=None, extra_entries=None, resolve=None):
+    """导出为 zip/tar 归档, 返回 (记录数, 图片数, 写入的字节数)
+
+    逐条改写记录中的图片路径并收集被引用的图片, 同时把 records.json 分块并行压缩到
+    临时文件 (内存中只有有限的几块); 然后图片在线程池中读取/校验/压缩,
+    写入线程按顺序写出, 最后写 manifest.json. 失败或取消时不留下 .part 文件.
+    records 不为None时只导出这些记录 (增量导出); extra_entries 为
+    {条目名: 可序列化为JSON的值}, 写在 records.json 之后并记入清单.
+    resolve 把记录中的图片路径换成本机上的文件 (服务器模式下先下载), 找不到时返回None.
+    """
+    fmt = "zip" if export_path.lower().endswith(".zip") else "tar"
+    compress = fmt == "zip"
+
+    source = store.iter_records() if records is None else records
+    images = {}
+    external_names = {}
+    missing = 0
+    record_count = 0
+
+    def rewritten():
+        """逐条把记录中的路径改为归档内路径, 同时收集被引用的图片 (去重)"""
+        nonlocal missing, record_count
+        for record in source:
+            record = dict(record)
+            for field in IMAGE_FIELDS:
+                path = normalize_image_path(record.get(field))
+                if not path:
+                    continue
+                source_path = resolve(path) if resolve is not None else path
+                if source_path and os.path.isfile(source_path):
+                    name = _archive_name(path, external_names)
+                    images[name] = source_path
+                    record[field] = name
+                else:
+                    missing += 1
+            record_count += 1
+            yield record
+
+    extra_entries = extra_entries or {}
+    manifest_files = {}
+    tmp_path = export_path + ".part"
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as executor, \
+                open(tmp_path, 'wb') as f, tempfile.TemporaryFile() as spool:
+            writer = ZipStreamWriter(f) if fmt == "zip" else TarStreamWriter(f)
+
+            # records.json: 先压缩到临时文件, 大小和CRC确定后再写入归档
+            size, crc, sha256 = _spool_records(rewritten(), spool, executor, compress, task)
+            entry = PreparedEntry(RECORDS_ENTRY, [], size, crc, sha256, compress, spool=spool)
+            writer.add(entry)
+            manifest_files[RECORDS_ENTRY] = {"size": entry.size, "sha256": entry.sha256}
+            spool.truncate(0)
+
+            for name, value in extra_entries.items():
+                entry = _json_entry(name, value, compress)
+                writer.add(entry)
+                manifest_files[name] = {"size": entry.size, "sha256": entry.sha256}
+
+            # 图片: 限制同时在内存中的条目数, 按提交顺序写出
+            total_entries = len(images) + len(extra_entries) + 1
+            pending = deque()
+            names = iter(sorted(images))
+            done = 1 + len(extra_entries)
+
+            def submit_next():
+                name = next(names, None)
+                if name is not None:
+                    pending.append(executor.submit(prepare_file_entry, name, images[name], compress))
+
+            for _ in range(MAX_PENDING_ENTRIES):
+                submit_next()
+            while pending:
+                if task is not None and task.cancelled:
+                    for future in pending:
+                        future.cancel()
+                    task.check_cancelled()
+                entry = pending.popleft().result()
+                submit_next()
+                writer.add(entry)
+                manifest_files[entry.name] = {"size": entry.size, "sha256": entry.sha256}
+                done += 1
+                if task is not None:
+                    task.report(done, total_entries, f"已写入 {done} / {total_entries} 个文件")
+
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "record_count": record_count,
+                "missing_images": missing,
+                "files": manifest_files,
+            }
+            data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+            writer.add(PreparedEntry(
+                MANIFEST_ENTRY, [data], len(data), zlib.crc32(data),
+                hashlib.sha256(data).hexdigest(), False,
+            ))
+            writer.close()
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        # 取消、磁盘已满、图片无法读取等: 不留下不完整的归档
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, export_path)
+    return record_count, len(images), os.path.getsize(export_path)
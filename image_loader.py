@@ -0,0 +1,116 @@
+"""
+后台图片加载
+在线程池中解码缩略图, 通过队列把结果交回Tk线程; 不再需要的加载可以取消
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from blob_store import BlobStore
+
+
+# Tk线程检查加载结果的间隔 (毫秒)
+POLL_INTERVAL_MS = 30
+
+
+class LoadBatch:
+    """一组加载请求 (例如一个查看窗口里的三张图片)"""
+
+    def __init__(self):
+        self.cancelled = False
+        self.futures = []
+
+    def cancel(self):
+        """取消尚未开始的解码, 已在进行中的解码完成后结果会被丢弃"""
+        self.cancelled = True
+        for future in self.futures:
+            future.cancel()
+
+
+class ImageLoader:
+    """缩略图加载器
+
+    工作线程只负责解码得到PIL图片, PhotoImage 的创建和界面更新
+    都在Tk线程的回调中进行 (Tk不是线程安全的).
+    """
+
+    def __init__(self, root, thumbnails, workers=3, monitor=None, resolve=None):
+        self.root = root
+        self.thumbnails = thumbnails
+        self.monitor = monitor
+        # 服务器模式下把图片路径换成本地缓存中的文件 (在工作线程中下载)
+        self.resolve = resolve
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-loader")
+        self._results = queue.Queue()
+        self._futures = set()
+        self._polling = False
+
+    def load(self, requests, callback):
+        """加载一组图片
+
+        requests 为 [(key, 路径, 尺寸)], 每张图片完成后在Tk线程中调用
+        callback(key, PIL图片或None, 异常或None). 返回可以取消的 LoadBatch.
+        """
+        batch = LoadBatch()
+        for key, path, size in requests:
+            future = self._executor.submit(self._decode, batch, key, path, size, callback)
+            batch.futures.append(future)
+            self._futures.add(future)
+        self._start_polling()
+        return batch
+
+    def available(self, path):
+        """图片是否可以加载; 服务器上的图片要加载时才知道"""
+        return self.resolve is not None or os.path.exists(path)
+
+    def _decode(self, batch, key, path, size, callback):
+        if batch.cancelled:
+            return
+        try:
+            # 按内容哈希命名的图片直接以文件名为缩略图的键, 不必读出内容计算
+            content_hash = BlobStore.content_hash(path) if BlobStore.is_content_addressed(path) else None
+            if self.resolve is not None:
+                local = self.resolve(path)
+                if local is None:
+                    raise FileNotFoundError(f"服务器上没有这张图片: {path}")
+                path = local
+            with self._measure(path):
+                img = self.thumbnails.get(path, size, content_hash)
+            self._results.put((batch, callback, (key, img, None)))
+        except Exception as e:
+            self._results.put((batch, callback, (key, None, e)))
+
+    def _measure(self, path):
+        """解码计时 (没有 PerfMonitor 时不计时)"""
+        if self.monitor is None:
+            return nullcontext()
+        return self.monitor.operation("view", records=1, nbytes=os.path.getsize(path))
+
+    def _start_polling(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def _poll(self):
+        while True:
+            try:
+                batch, callback, args = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if not batch.cancelled:
+                callback(*args)
+
+        # 被取消的任务不会产生结果, 以future是否结束判断是否还需要轮询
+        self._futures = {future for future in self._futures if not future.done()}
+        if self._futures or not self._results.empty():
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
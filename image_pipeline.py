@@ -0,0 +1,171 @@
+"""
+上传图片的规范化处理
+手机照片 (上千万像素)、未压缩的BMP、动图等原样保存会占用大量磁盘, 之后每次查看都要
+解码大图, 导出也更大. 上传时先按EXIF方向摆正, 缩小到不超过设定的边长, 去掉EXIF等
+元数据 (拍摄位置等) 后重新编码, 再存入图片库; 只有明确要求时才另外保留原图
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import io
+import logging
+import math
+import os
+
+from perf_monitor import LOGGER_NAME
+
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# 输出格式 -> (Pillow格式名, 扩展名); "original" 表示不处理, 按原文件保存
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "png": ("PNG", ".png"),
+}
+KEEP_FORMAT = "original"
+
+# JPEG没有透明通道, 透明部分铺成白色
+BACKGROUND = (255, 255, 255)
+
+# 这些格式的原文件若已经足够小 (且没有需要去掉的EXIF), 直接保存原文件
+COMPACT_SOURCE_FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+def normalize_image(src_path, max_side, fmt="jpeg", quality=85):
+    """读取图片并规范化, 返回 (编码后的字节, 扩展名)
+
+    不是Pillow能读取的图片, 或原文件比处理结果还小且无需处理时返回None (按原样保存).
+    """
+    from PIL import Image, ImageOps
+
+    pil_format, ext = OUTPUT_FORMATS[fmt]
+    try:
+        img = Image.open(src_path)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    with img:
+        source_format = img.format
+        animated = getattr(img, "is_animated", False)
+        has_exif = bool(img.getexif())
+        too_large = bool(max_side) and max(img.size) > max_side
+        if too_large:
+            # JPEG可以直接以1/2~1/8的比例解码, 大照片不必先解码出全尺寸
+            scale = max_side / max(img.size)
+            img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        if animated:
+            # 动图只保留第一帧
+            img.seek(0)
+        try:
+            image = ImageOps.exif_transpose(img)
+        except (OSError, SyntaxError):
+            return None
+        icc_profile = img.info.get("icc_profile")
+
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    image = _convert_mode(image, pil_format)
+
+    # 不传 exif, 保存的文件中就没有EXIF; 保留色彩配置, 否则部分照片颜色会偏
+    options = {"icc_profile": icc_profile} if icc_profile else {}
+    if pil_format == "JPEG":
+        options.update(quality=quality, optimize=True)
+    elif pil_format == "WEBP":
+        options.update(quality=quality, method=4)
+    else:
+        options.update(optimize=True)
+    out = io.BytesIO()
+    image.save(out, pil_format, **options)
+    data = out.getvalue()
+    if source_format in COMPACT_SOURCE_FORMATS and not (animated or has_exif or too_large) \
+            and len(data) >= os.path.getsize(src_path):
+        return None
+    return data, ext
+
+
+def _convert_mode(image, pil_format):
+    """转换为输出格式支持的颜色模式"""
+    from PIL import Image
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+    if pil_format == "JPEG":
+        if has_alpha:
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, BACKGROUND)
+            background.paste(image, mask=image.getchannel("A"))
+            return background
+        return image if image.mode in ("RGB", "L") else image.convert("RGB")
+    if has_alpha:
+        return image if image.mode == "RGBA" else image.convert("RGBA")
+    return image if image.mode in ("RGB", "L") else image.convert("RGB")
+
+
+class ImagePipeline:
+    """上传图片先规范化再存入图片库
+
+    ingest() 比较耗时 (解码和重新编码大图), 界面中应在后台线程中调用.
+    给出 hashes (similarity.ImageHashes) 时同时计算存入的图片的相似哈希.
+    """
+
+    def __init__(self, blobs, max_side=2560, fmt="jpeg", quality=85, keep_original=False, hashes=None):
+        if fmt != KEEP_FORMAT and fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的图片格式: {fmt}")
+        self.blobs = blobs
+        self.max_side = max_side
+        self.fmt = fmt
+        self.quality = quality
+        self.keep_original = keep_original
+        self.hashes = hashes
+
+    @classmethod
+    def from_config(cls, blobs, config, hashes=None):
+        return cls(
+            blobs,
+            max_side=config["image_max_side"],
+            fmt=config["image_format"],
+            quality=config["image_quality"],
+            keep_original=config["keep_original_images"],
+            hashes=hashes,
+        )
+
+    def ingest(self, src_path, keep_original=None, pin=False):
+        """处理并存入图片库, 返回存储路径
+
+        keep_original 为None时按配置决定是否另外保留原图. 不处理的格式设置或
+        无法识别的文件按原样保存. pin 为True时固定存入的图片 (见 BlobStore.pin),
+        保存到记录后由调用方 unpin().
+        """
+        if keep_original is None:
+            keep_original = self.keep_original
+        result = None
+        if self.fmt != KEEP_FORMAT:
+            result = normalize_image(src_path, self.max_side, self.fmt, self.quality)
+        if result is None:
+            path = self.blobs.ingest(src_path, pin)
+            self._hash(path, src_path)
+            return path
+
+        data, ext = result
+        path, _ = self.blobs.ingest_fileobj(io.BytesIO(data), ext, pin)
+        self._hash(path, io.BytesIO(data))
+        if keep_original:
+            try:
+                self.blobs.store_original(path, src_path)
+            except BaseException:
+                if pin:
+                    self.blobs.unpin(path)
+                raise
+        return path
+
+    def _hash(self, path, source):
+        """趁图片还在手边计算相似哈希, 不必之后再读一遍"""
+        if self.hashes is None or self.hashes.get(path) is not None:
+            return
+        try:
+            self.hashes.compute(path, source)
+        except Exception as e:
+            # 哈希只用于查找相似图片, 算不出来不影响上传
+            logger.warning("image hash %s failed: %s", path, e)
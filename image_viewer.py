@@ -0,0 +1,122 @@
+"""
+图片查看窗口
+窗口立即打开并显示占位文字, 三张图片在后台并行解码后再填入
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+from repository import normalize_image_path
+
+
+# (记录字段, 缩略图尺寸)
+IMAGE_SLOTS = (
+    ("license_image", (360, 250)),
+    ("operator_image", (360, 250)),
+    ("screenshot_image", (760, 250)),
+)
+
+
+class ImageViewer:
+    """图片查看窗口
+
+    同一时间只保留一个窗口; 窗口打开时切换选中的记录会直接在窗口中
+    显示新记录, 并取消上一条记录还没完成的解码.
+    """
+
+    def __init__(self, root, loader):
+        self.root = root
+        self.loader = loader
+        self.window = None
+        self.frames = {}
+        self.batch = None
+        self.record = None
+
+    def is_open(self):
+        return self.window is not None and self.window.winfo_exists()
+
+    def show(self, record):
+        """显示一条记录的图片"""
+        if not self.is_open():
+            self._create_window()
+        elif record == self.record:
+            return
+        self.record = record
+        self.window.title(f"呼号: {record['callsign']} - 图片查看")
+
+        if self.batch is not None:
+            self.batch.cancel()
+
+        requests = []
+        for key, size in IMAGE_SLOTS:
+            path = normalize_image_path(record.get(key))
+            if path and self.loader.available(path):
+                self._set_text(key, "加载中...")
+                requests.append((key, path, size))
+            else:
+                self._set_text(key, "未上传图片")
+
+        self.batch = self.loader.load(requests, self._on_loaded)
+
+    def _create_window(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.geometry("800x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        # 主框架
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        # 上部框架 - 倒品字形上面两个图片(执照和操作证)
+        top_frame = ttk.Frame(main_frame)
+        top_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+
+        # 左侧 - 执照照片
+        left_frame = ttk.LabelFrame(top_frame, text="执照照片", padding="5")
+        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+
+        # 右侧 - 操作证照片
+        right_frame = ttk.LabelFrame(top_frame, text="操作证照片", padding="5")
+        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
+
+        # 下部框架 - 倒品字形下面的长条(申请截图)
+        bottom_frame = ttk.LabelFrame(main_frame, text="申请截图", padding="5")
+        bottom_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.frames = {}
+        for (key, _), frame in zip(IMAGE_SLOTS, (left_frame, right_frame, bottom_frame)):
+            label = ttk.Label(frame, font=("Microsoft YaHei", 10), anchor=tk.CENTER)
+            label.pack(expand=True)
+            self.frames[key] = label
+
+    def _set_text(self, key, text):
+        label = self.frames[key]
+        label.configure(image="", text=text)
+        label.image = None
+
+    def _on_loaded(self, key, img, error):
+        """解码完成 (在Tk线程中调用)"""
+        if not self.is_open():
+            return
+        if error is not None:
+            self._set_text(key, f"无法加载图片\n{str(error)}")
+            return
+        # Pillow 在第一次显示图片时才导入, 不拖慢程序启动
+        from PIL import ImageTk
+
+        photo = ImageTk.PhotoImage(img)
+        label = self.frames[key]
+        label.configure(image=photo, text="")
+        label.image = photo
+
+    def close(self):
+        """关闭窗口并取消未完成的解码"""
+        if self.batch is not None:
+            self.batch.cancel()
+            self.batch = None
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+        self.record = None
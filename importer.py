@@ -0,0 +1,455 @@
+"""
+流式导入
+逐条解析导入文件中的记录, 只复制被导入记录实际引用的图片,
+支持 替换全部 / 合并 / 更新 三种方式 (以 呼号+申请时间 识别同一条记录),
+以及增量同步归档 (sync.py 导出, 以记录ID识别)
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+import tarfile
+import zipfile
+
+from exporter import DELTA_ENTRY, MANIFEST_ENTRY, RECORDS_ENTRY, TOMBSTONES_ENTRY, is_archive_path
+from repository import ID_FIELD, IMAGE_FIELDS, META_FIELDS, image_refs, normalize_image_path
+
+
+# 导入方式
+IMPORT_MODES = (
+    ("replace", "替换全部记录"),
+    ("merge", "合并 (已有的记录保持不变)"),
+    ("upsert", "更新 (已有的记录用导入的覆盖)"),
+)
+
+# 每次从导入文件读取的字节数
+READ_CHUNK_SIZE = 256 * 1024
+
+
+def record_key(record):
+    """识别同一条记录的键: 呼号 + 申请时间"""
+    return (record.get("callsign", "").strip(), record.get("apply_time", "").strip())
+
+
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """逐个解析JSON数组中的元素, 不把整个文件读入内存
+
+    f 为二进制文件对象, 产出 (元素, 已读取的字节数).
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buf = ""
+    pos = 0
+    bytes_read = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, bytes_read, eof
+        chunk = f.read(chunk_size)
+        bytes_read += len(chunk)
+        eof = not chunk
+        buf = buf[pos:] + text_decoder.decode(chunk, final=eof)
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("数据格式不正确!")
+    pos += 1
+
+    expect_value = True
+    first = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError("数据文件不完整")
+        char = buf[pos]
+        if char == "]" and (first or not expect_value):
+            return
+        if not expect_value:
+            if char != ",":
+                raise ValueError(f"数据格式不正确 (位置 {bytes_read})")
+            pos += 1
+            expect_value = True
+            continue
+
+        # 元素可能被读取块截断, 解析失败或恰好停在块末尾时读入更多再试
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                if end < len(buf) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+        pos = end
+        first = False
+        expect_value = False
+        yield value, bytes_read
+
+
+def resolve_source_image(path, source_dir):
+    """导入文件中的图片路径 -> 源文件实际位置 (不存在时返回None)"""
+    path = normalize_image_path(path)
+    candidate = path if os.path.isabs(path) else os.path.join(source_dir, path)
+    return candidate if os.path.isfile(candidate) else None
+
+
+def source_has_images(import_path):
+    """导入文件旁边是否有图片目录 (归档则看其中是否有图片)"""
+    if is_archive_path(import_path):
+        source = open_import_source(import_path)
+        try:
+            return source.has_images()
+        finally:
+            source.close()
+    source_images_dir = os.path.join(os.path.dirname(import_path), "images")
+    return os.path.isdir(source_images_dir) and bool(os.listdir(source_images_dir))
+
+
+def read_delta_info(import_path):
+    """增量同步归档的 delta.json 内容, 不是增量归档时返回None"""
+    if not is_archive_path(import_path):
+        return None
+    source = open_import_source(import_path)
+    try:
+        return source.read_json(DELTA_ENTRY)
+    finally:
+        source.close()
+
+
+def open_import_source(import_path):
+    """按文件类型打开导入源"""
+    if is_archive_path(import_path):
+        return ArchiveSource(import_path)
+    return DirectorySource(import_path)
+
+
+class HashingReader:
+    """读取时顺便计算SHA256的文件包装"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        return data
+
+
+class DirectorySource:
+    """JSON数据文件 + 旁边的 images 目录"""
+
+    manifest = None
+
+    def __init__(self, import_path):
+        self.import_path = import_path
+        self.source_dir = os.path.dirname(os.path.abspath(import_path))
+
+    def size(self):
+        return os.path.getsize(self.import_path)
+
+    def open_records(self):
+        return open(self.import_path, 'rb')
+
+    def open_image(self, path):
+        src = resolve_source_image(path, self.source_dir)
+        return open(src, 'rb') if src else None
+
+    def read_json(self, name):
+        return None
+
+    def close(self):
+        pass
+
+
+class ArchiveSource:
+    """exporter 导出的 zip/tar 归档"""
+
+    def __init__(self, import_path):
+        self.is_zip = import_path.lower().endswith(".zip")
+        if self.is_zip:
+            self.archive = zipfile.ZipFile(import_path)
+            self.members = {info.filename: info for info in self.archive.infolist()}
+        else:
+            self.archive = tarfile.open(import_path)
+            self.members = {member.name: member for member in self.archive.getmembers()}
+        if RECORDS_ENTRY not in self.members:
+            self.close()
+            raise ValueError(f"归档中没有 {RECORDS_ENTRY}")
+
+        self.manifest = None
+        if MANIFEST_ENTRY in self.members:
+            with self._open(MANIFEST_ENTRY) as f:
+                self.manifest = json.load(f)
+
+    def _open(self, name):
+        member = self.members[name]
+        return self.archive.open(member) if self.is_zip else self.archive.extractfile(member)
+
+    def has_images(self):
+        return any(name.startswith("images/") for name in self.members)
+
+    def size(self):
+        member = self.members[RECORDS_ENTRY]
+        return member.file_size if self.is_zip else member.size
+
+    def open_records(self):
+        return self._open(RECORDS_ENTRY)
+
+    def open_image(self, path):
+        name = normalize_image_path(path)
+        return self._open(name) if name in self.members else None
+
+    def read_json(self, name):
+        """读取并校验归档中的一个小JSON条目, 不存在时返回None"""
+        if name not in self.members:
+            return None
+        with self._open(name) as f:
+            data = f.read()
+        expected = self.expected_sha256(name)
+        if expected and expected != hashlib.sha256(data).hexdigest():
+            raise ValueError(f"{name} 校验失败, 归档可能已损坏")
+        return json.loads(data.decode('utf-8'))
+
+    def expected_sha256(self, name):
+        if self.manifest is None:
+            return None
+        entry = self.manifest.get("files", {}).get(name)
+        return entry["sha256"] if entry else None
+
+    def close(self):
+        self.archive.close()
+
+
+class ImportJob:
+    """一次导入: prepare() 在工作线程中解析并复制图片, apply() 在Tk线程中写入存储
+
+    mode 为 "sync" 时导入增量同步归档: 按记录ID应用修改和删除, 不做备份
+    (增量可以重复导入, 耗时只取决于增量大小). 替换和更新之前调用 backup(task)
+    保存当前数据 (见 RejectionCore.snapshot_before_import), 返回的快照清单记在 snapshot 中.
+    """
+
+    def __init__(self, store, images, import_path, mode="replace", import_images=True, backup=None):
+        self.store = store
+        self.images = images
+        self.import_path = import_path
+        self.mode = mode
+        self.import_images = import_images
+        self.backup = backup
+
+        self.records = []
+        self.tombstones = []
+        self.delta = None
+        self.deleted = 0
+        self.skipped = 0
+        self.copied_images = 0
+        self.missing_images = 0
+        self.snapshot = None
+        self._created_blobs = []
+        self._pinned = []          # 本次存入时固定的图片 (每存入一次一项)
+        self._copied = {}          # 导入文件中的图片路径 -> 图片库中的路径 (None 为找不到)
+
+    # ------------------------------------------------------------------
+    # 工作线程
+    # ------------------------------------------------------------------
+    def prepare(self, task=None):
+        """解析导入文件并复制引用的图片"""
+        try:
+            self._prepare(task)
+        except BaseException:
+            self.discard()
+            raise
+        return self
+
+    def _prepare(self, task):
+        source = open_import_source(self.import_path)
+        try:
+            existing_keys = set()
+            if self.mode == "merge":
+                existing_keys = {record_key(record) for record in self.store.iter_records()}
+            if self.backup is not None and self.mode not in ("merge", "sync") and self.store.count():
+                self.snapshot = self.backup(task)
+
+            self._read_records(source, existing_keys, task)
+            if self.mode == "sync":
+                self.delta = source.read_json(DELTA_ENTRY)
+                self.tombstones = source.read_json(TOMBSTONES_ENTRY) or []
+                if self.delta is None:
+                    raise ValueError("不是增量同步文件")
+        finally:
+            source.close()
+
+    def _read_records(self, source, existing_keys, task):
+        total_bytes = source.size()
+        seen = {}
+
+        with source.open_records() as raw:
+            f = HashingReader(raw)
+            for number, (record, bytes_read) in enumerate(iter_json_array(f), 1):
+                if task is not None:
+                    task.check_cancelled()
+                if not isinstance(record, dict) or "callsign" not in record or "apply_time" not in record:
+                    raise ValueError(f"第 {number} 条记录格式不正确!")
+                if self.mode == "sync" and not record.get(ID_FIELD):
+                    raise ValueError(f"第 {number} 条记录没有ID!")
+
+                key = record_key(record)
+                if self.mode == "merge" and key in existing_keys:
+                    self.skipped += 1
+                    continue
+                if self.mode in ("merge", "upsert") and key in seen:
+                    # 导入文件内重复的记录: 合并时保留第一条, 更新时以最后一条为准
+                    # (增量中的重复由 apply_changes 按ID和修改时间处理)
+                    self.skipped += 1
+                    if self.mode == "merge":
+                        continue
+                    self.records[seen[key]] = None
+
+                if self.import_images:
+                    record = self._copy_images(record, source)
+                seen[key] = len(self.records)
+                self.records.append(record)
+
+                if task is not None and number % 100 == 0:
+                    task.report(bytes_read, total_bytes, f"已读取 {number} 条记录")
+
+            # 读完剩余内容 (数组之后的空白) 再校验
+            while f.read(READ_CHUNK_SIZE):
+                pass
+            if source.manifest is not None:
+                expected = source.expected_sha256(RECORDS_ENTRY)
+                if expected and expected != f.sha256.hexdigest():
+                    raise ValueError(f"{RECORDS_ENTRY} 校验失败, 归档可能已损坏")
+
+        self.records = [record for record in self.records if record is not None]
+
+    def _copy_images(self, record, source):
+        """把记录引用的图片复制到图片库, 并改写为新的路径
+
+        许多记录引用同一张图片时只复制 (并计算哈希) 一次.
+        """
+        record = dict(record)
+        for field in IMAGE_FIELDS:
+            if not record.get(field):
+                continue
+            name = record[field]
+            if name not in self._copied:
+                self._copied[name] = self._copy_image(name, source)
+            path = self._copied[name]
+            if path is None:
+                self.missing_images += 1
+            else:
+                record[field] = path
+        return record
+
+    def _copy_image(self, name, source):
+        """复制导入文件中的一张图片, 返回图片库中的路径, 找不到时返回None
+
+        图片固定到 apply() 写入记录之后 (或 discard() 时), 图片库中已有的图片在此期间
+        不会因为其他记录被删除而删掉.
+        """
+        src = source.open_image(name)
+        if src is None:
+            return None
+        with src:
+            path, created = self.images.ingest_fileobj(src, os.path.splitext(name)[1], True)
+        if source.manifest is not None:
+            expected = source.expected_sha256(normalize_image_path(name))
+            if expected and expected != self.images.content_hash(path):
+                self.images.unpin(path)
+                if created:
+                    self.images.release(path)
+                raise ValueError(f"图片 {name} 校验失败, 归档可能已损坏")
+        self._pinned.append(path)
+        if created:
+            self._created_blobs.append(path)
+            self.copied_images += 1
+        return path
+
+    def discard(self):
+        """解除本次存入的图片的固定, 并删除本次新复制且没有被引用的图片
+
+        导入取消或失败时调用; apply() 写入记录后也会调用.
+        """
+        pinned, self._pinned = self._pinned, []
+        for path in pinned:
+            self.images.unpin(path)
+        for path in self._created_blobs:
+            self.images.release(path)
+        self._created_blobs = []
+
+    # ------------------------------------------------------------------
+    # Tk线程
+    # ------------------------------------------------------------------
+    def apply(self):
+        """把准备好的记录写入存储, 返回 (新增数, 覆盖数, 不再被引用而删除的图片)
+
+        写入失败时同样解除图片的固定并删除本次新复制的图片.
+        """
+        try:
+            added, updated, old_paths = self._apply()
+        finally:
+            # 导入文件内被后面的记录覆盖掉的图片此时没有引用, 一并清理
+            self.discard()
+        removed = [path for path in old_paths if self.images.release(path)]
+        return added, updated, removed
+
+    def _apply(self):
+        added, updated, old_paths = 0, 0, set()
+
+        if self.mode == "sync":
+            added, updated, self.deleted, replaced = self.store.apply_changes(self.records, self.tombstones)
+            for record in replaced:
+                old_paths.update(image_refs(record))
+        elif self.mode == "replace":
+            # 在写入时才取当前记录引用的图片, 包括导入期间新增或修改的记录
+            for record in self.store.iter_records():
+                old_paths.update(image_refs(record))
+            self.store.replace_all(self.records)
+            added = len(self.records)
+        elif self.mode == "merge":
+            self.store.extend(self.records)
+            added = len(self.records)
+        else:
+            positions = {}
+            for index, record in enumerate(self.store.iter_records()):
+                positions[record_key(record)] = (index, record)
+            updates, new_records = [], []
+            for record in self.records:
+                existing = positions.get(record_key(record))
+                if existing is None:
+                    new_records.append(record)
+                    continue
+                index, old = existing
+                # 覆盖内容, 但保留本地记录的ID; 只写入与原值不同的字段 (与 core.update_record 相同),
+                # 内容没有变化的记录不产生修改, 下次增量同步不会再次发送
+                changed = {
+                    key: value for key, value in record.items()
+                    if key not in META_FIELDS and (old.get(key) or "") != (value or "")
+                }
+                if not changed:
+                    self.skipped += 1
+                    continue
+                old_paths.update(
+                    normalize_image_path(old[field]) for field in IMAGE_FIELDS if field in changed and old.get(field)
+                )
+                updates.append((index, changed))
+            if updates:
+                self.store.update_many(updates)
+            self.store.extend(new_records)
+            added, updated = len(new_records), len(updates)
+        return added, updated, old_paths
@@ -0,0 +1,686 @@
+"""
+日志式数据存储
+快照文件 + 追加日志, 单条增删改只追加一行, 日志过大时在后台压缩为新快照
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from perf_monitor import LOGGER_NAME
+from record_list import RecordList
+from record_model import compact_record, json_default, json_object_hook
+from repository import (
+    ID_FIELD, LEGACY_MODIFIED, META_FIELDS, MODIFIED_FIELD, REV_FIELD, RecordRepository,
+    image_refs, modified_stamp, plan_changes, stamp_new_record, stamp_update,
+)
+
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# 日志文件后缀 (rejection_data.json -> rejection_data.json.journal)
+JOURNAL_SUFFIX = ".journal"
+
+# 墓碑文件后缀 (rejection_data.json -> rejection_data.json.tombstones)
+TOMBSTONE_SUFFIX = ".tombstones"
+
+# 日志累计多少条操作后触发后台压缩
+DEFAULT_COMPACT_THRESHOLD = 2000
+
+# 后台写入失败后重试的间隔 (秒)
+WRITE_RETRY_SECONDS = 5
+
+
+def fsync_dir(dir_path):
+    """同步目录项, 保证rename落盘 (Windows不支持打开目录, 直接跳过)"""
+    try:
+        fd = os.open(dir_path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data):
+    """原子写文件: 写临时文件 -> fsync -> rename"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(path))
+
+
+def encode_snapshot(records):
+    """序列化快照 (不使用indent, 以便走C加速的编码器)"""
+    return json.dumps(records, ensure_ascii=False, default=json_default).encode('utf-8')
+
+
+def _encode_op(op):
+    return (json.dumps(op, ensure_ascii=False, default=json_default) + "\n").encode('utf-8')
+
+
+def _without_rev(record):
+    """其他站点的修改序号对本站没有意义"""
+    return {key: value for key, value in record.items() if key != REV_FIELD}
+
+
+def read_records(data_file):
+    """只读地读出JSON数据文件中的记录 (重放未压缩的日志), 不修改任何文件
+
+    返回记录列表; 旧记录保持原样, 不补全ID等元数据.
+    """
+    records = JournalStore(data_file)._read_state(repair=False)[0]
+    return [dict(record) for record in records]
+
+
+class JournalStore(RecordRepository):
+    """快照 + 追加日志的记录存储
+
+    快照仍是原来的 rejection_data.json (记录列表), 之后的每次修改以一行JSON
+    追加到 rejection_data.json.journal. 日志中的 checkpoint 行记录了它所对应
+    快照的SHA256, 加载时据此判断哪些操作已经包含在快照中, 因此在压缩过程
+    任意位置崩溃都不会丢失或重复应用操作.
+
+    删除记录留下的墓碑追加到 rejection_data.json.tombstones, 在写日志之前
+    落盘; 加载时丢弃ID仍存在的墓碑, 因此两次写入之间崩溃也能保持一致.
+
+    内存中的记录是只读的 CompactRecord (见 record_model), 修改总是替换整条记录.
+
+    write_delay (秒) 不为None时, 修改立即在内存中生效, 由后台写入线程等待
+    write_delay 后把这段时间内的所有修改一次追加到日志 (只fsync一次);
+    flush() 等待写完, 写入失败时保留未写入的修改并记在 write_error 中.
+    日志文件只在持有 _io_lock 时读写, 需要同时持有两把锁时先取 _io_lock.
+    """
+
+    def __init__(self, data_file, compact_threshold=DEFAULT_COMPACT_THRESHOLD, write_delay=None):
+        super().__init__()
+        self.data_file = data_file
+        self.journal_file = data_file + JOURNAL_SUFFIX
+        self.tombstone_file = data_file + TOMBSTONE_SUFFIX
+        self.compact_threshold = compact_threshold
+        # 记录列表, 按位置和按ID都能快速访问
+        self.records = RecordList()
+        self.tombstones = {}
+        self._image_refs = Counter()
+        self._rev = 0
+
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+        self._journal = None
+        self._seq = 0
+        self._ops_since_snapshot = 0
+        self._compact_thread = None
+        # 每安装一次快照或重新加载加一, 后台压缩据此判断期间是否已被整体替换
+        self._generation = 0
+
+        # 已在内存中生效、尚未写入的日志行和墓碑
+        self.write_delay = write_delay
+        self._pending_lines = []
+        self._pending_tombstones = []
+        self._writer = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    # ------------------------------------------------------------------
+    # 加载
+    # ------------------------------------------------------------------
+    def load(self):
+        """加载快照并重放日志"""
+        with self._io_lock, self._lock:
+            self._close_journal()
+
+            records, replayed, base_seq, last_seq, snapshot_sha = self._read_state()
+            self.records = records
+            self.tombstones = self._read_tombstones()
+            self._rebuild_image_refs()
+            self._seq = last_seq
+            self._ops_since_snapshot = replayed
+            self._generation += 1
+
+            if base_seq is None:
+                # 没有日志或日志已过期, 以当前快照为基准重新开始
+                self._reset_journal(self._seq, snapshot_sha)
+            else:
+                self._open_journal()
+
+            if self._rebuild_ids():
+                # 旧数据补全了ID等元数据, 写出新快照
+                self._write_snapshot()
+
+        if self._ops_since_snapshot >= self.compact_threshold:
+            self.compact_async()
+
+    def _read_state(self, repair=True):
+        """读出快照并重放日志, 返回 (记录列表, 重放的操作数, 基准序号, 最后序号, 快照SHA)
+
+        repair 为False时不截掉日志末尾的残行, 不修改任何文件.
+        """
+        snapshot_bytes = b""
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'rb') as f:
+                snapshot_bytes = f.read()
+        records = []
+        if snapshot_bytes.strip():
+            # 解析时逐条转为紧凑记录, 不会同时保留整份字典列表
+            records = json.loads(snapshot_bytes.decode('utf-8'), object_hook=json_object_hook)
+        if not isinstance(records, list):
+            raise ValueError("数据文件格式不正确")
+        snapshot_sha = hashlib.sha256(snapshot_bytes).hexdigest()
+
+        ops, base_seq, last_seq = self._read_journal(snapshot_sha, repair)
+        for op in ops:
+            self._apply(records, op)
+        return records, len(ops), base_seq, last_seq, snapshot_sha
+
+    def _read_journal(self, snapshot_sha, repair=True):
+        """读取日志, 返回 (需要重放的操作, 基准序号, 最后序号)"""
+        if not os.path.exists(self.journal_file):
+            return [], None, 0
+
+        entries = []
+        valid_end = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(json.loads(line.decode('utf-8')))
+                except (ValueError, UnicodeDecodeError):
+                    break
+                valid_end += len(line)
+            torn = f.seek(0, os.SEEK_END) != valid_end
+
+        if torn and repair:
+            # 崩溃时最后一行可能只写了一半, 截掉它, 否则后续追加会接在残行后面
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_end)
+                f.flush()
+                os.fsync(f.fileno())
+
+        # 找到与当前快照匹配的最后一个checkpoint
+        base_seq = None
+        for entry in entries:
+            if entry.get("op") == "checkpoint" and entry.get("sha") == snapshot_sha:
+                base_seq = entry["seq"]
+        if base_seq is None:
+            logger.warning("journal does not match %s, ignored", self.data_file)
+            return [], None, 0
+
+        last_seq = base_seq
+        ops = []
+        for entry in entries:
+            seq = entry.get("seq", 0)
+            last_seq = max(last_seq, seq)
+            if entry.get("op") != "checkpoint" and seq > base_seq:
+                ops.append(entry)
+        return ops, base_seq, last_seq
+
+    def _read_tombstones(self):
+        """读取墓碑文件 (同一ID以最后一行为准, 忽略崩溃留下的残行)"""
+        tombstones = {}
+        if not os.path.exists(self.tombstone_file):
+            return tombstones
+        with open(self.tombstone_file, 'rb') as f:
+            for line in f:
+                try:
+                    tombstone = json.loads(line.decode('utf-8'))
+                except (ValueError, UnicodeDecodeError):
+                    continue
+                tombstones[tombstone[ID_FIELD]] = tombstone
+        return tombstones
+
+    def _rebuild_ids(self):
+        """重建ID索引和修改序号, 给缺少元数据的记录补上; 返回是否修改了记录"""
+        records = list(self.records)
+        seen = set()
+        self._rev = max(
+            [record.get(REV_FIELD) or 0 for record in records]
+            + [tombstone[REV_FIELD] for tombstone in self.tombstones.values()]
+            + [0]
+        )
+        changed = False
+        for index, record in enumerate(records):
+            if record.get(ID_FIELD) in seen or any(not record.get(key) for key in META_FIELDS):
+                self._rev += 1
+                record = {key: value for key, value in record.items() if key != REV_FIELD}
+                record.setdefault(MODIFIED_FIELD, LEGACY_MODIFIED)
+                record = compact_record(stamp_new_record(record, self._rev, seen.__contains__))
+                records[index] = record
+                changed = True
+            seen.add(record[ID_FIELD])
+        self.records = RecordList(records)
+
+        # 写墓碑后、写日志前崩溃时, 墓碑对应的记录仍然存在
+        for record_id in [key for key in self.tombstones if key in seen]:
+            del self.tombstones[record_id]
+        return changed
+
+    @staticmethod
+    def _apply(records, op):
+        """把一条日志操作应用到记录列表"""
+        kind = op["op"]
+        if kind == "add":
+            records.append(compact_record(op["record"]))
+        elif kind == "delete":
+            del records[op["index"]]
+        elif kind == "update":
+            # 用新记录替换而不是原地修改, 压缩线程只需浅拷贝列表
+            records[op["index"]] = records[op["index"]].replace(op["fields"])
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+    def count(self):
+        return len(self.records)
+
+    def get(self, index):
+        return self.records[index]
+
+    def page(self, offset, limit):
+        return self.records[offset:offset + limit]
+
+    def iter_records(self):
+        with self._lock:
+            return iter(list(self.records))
+
+    def image_ref_count(self, path):
+        return self._image_refs[path]
+
+    def get_by_id(self, record_id):
+        with self._lock:
+            return self.records.by_id(record_id)
+
+    def index_of_id(self, record_id):
+        with self._lock:
+            return self.records.index_of_id(record_id)
+
+    def get_tombstone(self, record_id):
+        return self.tombstones.get(record_id)
+
+    def max_rev(self):
+        return self._rev
+
+    def changes_since(self, rev):
+        with self._lock:
+            records = [record for record in self.records if record[REV_FIELD] > rev]
+            tombstones = [
+                tombstone for tombstone in self.tombstones.values() if tombstone[REV_FIELD] > rev
+            ]
+        return records, tombstones
+
+    def _rebuild_image_refs(self):
+        self._image_refs = Counter(
+            path for record in self.records for path in image_refs(record)
+        )
+
+    # ------------------------------------------------------------------
+    # 修改
+    # ------------------------------------------------------------------
+    def append(self, record):
+        """追加一条记录"""
+        self._commit({"op": "add", "record": record})
+
+    def delete(self, index):
+        """删除指定位置的记录, 返回被删除的记录"""
+        return self._commit({"op": "delete", "index": index})[0]
+
+    def update(self, index, fields):
+        """更新指定位置记录的部分字段"""
+        self._commit({"op": "update", "index": index, "fields": fields})
+
+    def delete_by_id(self, record_id):
+        # 在提交的锁内才把ID换成位置
+        return self._commit({"op": "delete", ID_FIELD: record_id})[0]
+
+    def update_by_id(self, record_id, fields):
+        self._commit({"op": "update", ID_FIELD: record_id, "fields": fields})
+
+    def extend(self, records):
+        """批量追加, 所有操作一次写入日志"""
+        self._commit_many([{"op": "add", "record": record} for record in records])
+
+    def update_many(self, updates):
+        """批量更新, 所有操作一次写入日志"""
+        self._commit_many(
+            [{"op": "update", "index": index, "fields": fields} for index, fields in updates]
+        )
+
+    def replace_all(self, records):
+        """整体替换所有记录 (导入), 直接写新快照; 不再存在的记录留下墓碑"""
+        with self._io_lock, self._lock:
+            self._flush_locked()
+            new_records = RecordList()
+            for record in records:
+                self._rev += 1
+                new_records.append(compact_record(stamp_new_record(record, self._rev, new_records.has_id)))
+
+            deleted = modified_stamp()
+            tombstones = []
+            for record_id in self.records.ids():
+                if not new_records.has_id(record_id):
+                    self._rev += 1
+                    tombstones.append({ID_FIELD: record_id, "deleted": deleted, REV_FIELD: self._rev})
+            self._append_tombstones(tombstones)
+            for tombstone in tombstones:
+                self.tombstones[tombstone[ID_FIELD]] = tombstone
+            for record_id in new_records.ids():
+                self.tombstones.pop(record_id, None)
+
+            self.records = new_records
+            self._rebuild_image_refs()
+            self._write_snapshot()
+            self._notify(None, list(new_records))
+
+    def apply_changes(self, records, tombstones):
+        """应用其他站点的增量, 所有操作一次写入日志"""
+        with self._lock:
+            adds, updates, deletes, remembered = plan_changes(self, records, tombstones)
+            ops = [
+                {"op": "update", ID_FIELD: old[ID_FIELD], "fields": _without_rev(new)}
+                for old, new in updates
+            ]
+            ops += [
+                {"op": "delete", ID_FIELD: old[ID_FIELD], "deleted": tombstone["deleted"]}
+                for old, tombstone in deletes
+            ]
+            ops += [{"op": "add", "record": _without_rev(record)} for record in adds]
+            self._commit_many(ops, remembered)
+
+        replaced = [old for old, _ in updates] + [old for old, _ in deletes]
+        return len(adds), len(updates), len(deletes), replaced
+
+    def _commit(self, op):
+        return self._commit_many([op])
+
+    def _commit_many(self, ops, tombstones=()):
+        """应用一组操作, 并把它们一次追加到日志 (只fsync一次), 返回被删除或替换的记录
+
+        tombstones 为只需记下的其他站点的删除 (本地没有对应记录).
+        删除和更新可以用 id 代替 index 指定记录, 记录不存在时抛出 KeyError.
+        """
+        if not ops and not tombstones:
+            return []
+        with self._lock:
+            lines = []
+            new_tombstones = []
+            removed, added = [], []
+            for op in ops:
+                if ID_FIELD in op:
+                    op = dict(op)
+                    op["index"] = self._index_of_existing(op.pop(ID_FIELD))
+                self._seq += 1
+                self._rev += 1
+                op = {**op, "seq": self._seq}
+                # 元数据在写日志之前补全, 重放时得到完全相同的记录
+                if op["op"] == "add":
+                    op["record"] = stamp_new_record(op["record"], self._rev, self.records.has_id)
+                elif op["op"] == "update":
+                    op["fields"] = stamp_update(op["fields"], self._rev)
+                deleted = op.pop("deleted", None)
+
+                before = self.records[op["index"]] if "index" in op else None
+                self._apply(self.records, op)
+                # 维护图片引用计数和ID索引
+                if before is not None:
+                    self._image_refs.subtract(image_refs(before))
+                    removed.append(before)
+                if op["op"] == "add":
+                    record = self.records[-1]
+                    added.append(record)
+                    self._image_refs.update(image_refs(record))
+                elif op["op"] == "update":
+                    after = self.records[op["index"]]
+                    added.append(after)
+                    self._image_refs.update(image_refs(after))
+                elif op["op"] == "delete":
+                    new_tombstones.append({
+                        ID_FIELD: before[ID_FIELD],
+                        "deleted": deleted or modified_stamp(),
+                        REV_FIELD: self._rev,
+                    })
+                lines.append(_encode_op(op))
+
+            for tombstone in tombstones:
+                self._rev += 1
+                new_tombstones.append({**tombstone, REV_FIELD: self._rev})
+            for tombstone in new_tombstones:
+                self.tombstones[tombstone[ID_FIELD]] = tombstone
+            for record in added:
+                self.tombstones.pop(record[ID_FIELD], None)
+
+            self._pending_tombstones.extend(new_tombstones)
+            self._pending_lines.extend(lines)
+            self._ops_since_snapshot += len(lines)
+            need_compact = self._ops_since_snapshot >= self.compact_threshold
+            self._notify(removed, added)
+
+        if self.write_delay is None:
+            self.flush()
+        else:
+            self._schedule_write()
+        if need_compact:
+            self.compact_async()
+        return removed
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def pending_writes(self):
+        with self._lock:
+            return len(self._pending_lines) + len(self._pending_tombstones)
+
+    def flush(self):
+        """把尚未写入的修改追加到日志并fsync; 失败时抛出异常, 修改保留待重试"""
+        with self._io_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        """调用方持有 _io_lock"""
+        with self._lock:
+            tombstones, lines = self._pending_tombstones, self._pending_lines
+            if not tombstones and not lines:
+                return
+            self._pending_tombstones, self._pending_lines = [], []
+
+        try:
+            # 墓碑先落盘: 之后崩溃时加载会丢弃仍有记录的墓碑 (重试时重复写入墓碑无妨)
+            self._append_tombstones(tombstones)
+            if lines:
+                self._append_journal(lines)
+        except Exception as e:
+            with self._lock:
+                self._pending_tombstones[:0] = tombstones
+                self._pending_lines[:0] = lines
+                self.write_error = e
+            raise
+        self.write_error = None
+
+    def _append_journal(self, lines):
+        """追加日志行; 失败时截掉写了一部分的内容, 重试时不会重复"""
+        size = self._journal.tell()
+        try:
+            self._journal.write(b"".join(lines))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except Exception:
+            self._close_journal(ignore_errors=True)
+            try:
+                os.truncate(self.journal_file, size)
+                self._open_journal()
+            except OSError:
+                pass
+            raise
+
+    def _schedule_write(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="journal-writer", daemon=True)
+            self._writer.start()
+        self._wakeup.set()
+
+    def _write_loop(self):
+        """写入线程: 有修改后等待 write_delay, 把期间的修改合并为一次写入"""
+        while not self._stopping.is_set():
+            self._wakeup.wait()
+            self._stopping.wait(self.write_delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("journal write failed: %s", e)
+                if not self._stopping.wait(WRITE_RETRY_SECONDS):
+                    self._wakeup.set()
+
+    def _append_tombstones(self, tombstones):
+        if not tombstones:
+            return
+        with open(self.tombstone_file, 'ab') as f:
+            f.write(b"".join(_encode_op(tombstone) for tombstone in tombstones))
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ------------------------------------------------------------------
+    # 压缩
+    # ------------------------------------------------------------------
+    def compact_async(self):
+        """在后台线程中把日志压缩为新快照"""
+        with self._lock:
+            if self._compact_thread is not None and self._compact_thread.is_alive():
+                return
+            self._compact_thread = threading.Thread(
+                target=self._compact, name="journal-compact"
+            )
+            self._compact_thread.start()
+
+    def compact(self):
+        """同步压缩 (等待正在进行的后台压缩完成后再压缩一次)"""
+        self.wait()
+        with self._io_lock, self._lock:
+            self._write_snapshot()
+
+    def wait(self):
+        """等待后台压缩结束"""
+        thread = self._compact_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _compact(self):
+        try:
+            # 只在取得基准 (记录副本、序号、日志位置) 和安装快照时持有锁;
+            # 耗时的序列化和写盘期间修改和 flush() 照常进行, 新的日志行追加在 offset 之后
+            with self._io_lock:
+                self._flush_locked()
+                with self._lock:
+                    records = list(self.records)
+                    seq = self._seq
+                    offset = self._journal.tell()
+                    generation = self._generation
+
+            payload = encode_snapshot(records)
+            snapshot_sha = hashlib.sha256(payload).hexdigest()
+            tmp_path = self.data_file + ".compact.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._io_lock, self._lock:
+                if generation != self._generation:
+                    # 期间发生了整体替换 (导入) 或重新加载, 这份快照已经过时, 日志位置也不再有效
+                    os.remove(tmp_path)
+                    return
+                self._install_snapshot(tmp_path, seq, snapshot_sha, offset)
+        except Exception as e:
+            logger.error("journal compaction failed: %s", e)
+
+    def _write_snapshot(self):
+        """在锁内写出当前全部记录的快照 (调用方持有两把锁)"""
+        self._flush_locked()
+        payload = encode_snapshot(list(self.records))
+        snapshot_sha = hashlib.sha256(payload).hexdigest()
+        tmp_path = self.data_file + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._install_snapshot(tmp_path, self._seq, snapshot_sha, None)
+
+    def _install_snapshot(self, tmp_path, seq, snapshot_sha, offset):
+        """安装已落盘的临时快照, 并把日志截断为快照之后的操作
+
+        顺序: 先在旧日志追加checkpoint, 再rename快照, 最后重写日志.
+        任一步骤之间崩溃, 加载时都能通过checkpoint的SHA找到正确的重放起点.
+        """
+        tail = b""
+        if offset is not None:
+            self._journal.flush()
+            with open(self.journal_file, 'rb') as f:
+                f.seek(offset)
+                tail = f.read()
+
+        checkpoint = _encode_op({"op": "checkpoint", "seq": seq, "sha": snapshot_sha})
+        self._journal.write(checkpoint)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+        os.replace(tmp_path, self.data_file)
+        fsync_dir(os.path.dirname(self.data_file))
+
+        self._close_journal()
+        atomic_write(self.journal_file, checkpoint + tail)
+        self._open_journal()
+        self._ops_since_snapshot = tail.count(b"\n")
+        self._generation += 1
+
+        # 顺便去掉墓碑文件中被覆盖和已失效的行
+        if self.tombstones or os.path.exists(self.tombstone_file):
+            atomic_write(
+                self.tombstone_file,
+                b"".join(_encode_op(tombstone) for tombstone in self.tombstones.values()),
+            )
+
+    # ------------------------------------------------------------------
+    # 日志文件
+    # ------------------------------------------------------------------
+    def _reset_journal(self, seq, snapshot_sha):
+        self._close_journal()
+        atomic_write(
+            self.journal_file,
+            _encode_op({"op": "checkpoint", "seq": seq, "sha": snapshot_sha}),
+        )
+        self._open_journal()
+        self._ops_since_snapshot = 0
+
+    def _open_journal(self):
+        self._journal = open(self.journal_file, 'ab')
+
+    def _close_journal(self, ignore_errors=False):
+        if self._journal is not None:
+            journal, self._journal = self._journal, None
+            try:
+                journal.close()
+            except OSError:
+                if not ignore_errors:
+                    raise
+
+    def close(self):
+        """写完尚未写入的修改, 等待后台压缩并关闭日志; 写入失败时抛出异常"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        self.flush()
+        self.wait()
+        with self._io_lock, self._lock:
+            self._close_journal()
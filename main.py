@@ -6,16 +6,39 @@ Copyright (c) 2025 BH2VLF. All rights reserved.
 """
 __version__ = "0.03"
 
+import time
+
+# 启动计时从导入模块之前开始
+_STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
-import json
 import os
-import shutil
-from PIL import Image, ImageTk
-import base64
-from io import BytesIO
-import re
+
+from background import BackgroundTask, ProgressDialog, TaskCancelled
+from config import load_config
+from core import IMAGE_KINDS, RejectionCore, make_record
+from image_loader import ImageLoader
+from image_viewer import ImageViewer
+from perf_monitor import PerfMonitor, file_size
+from perf_panel import PerfPanel
+from record_table import VirtualTable
+from rejection_stats import RejectionStats
+from stats_dashboard import StatsDashboard
+from startup_timer import StartupTimer
+from thumbnail_cache import ThumbnailCache
+from repository import ID_FIELD
+from search_index import SearchIndex, SearchResults
+from similarity import SimilarityIndex
+from snapshots import format_size
+
+# Pillow 以及导入导出用到的 zipfile/tarfile 等在第一次用到时才导入
+
+_IMPORTED = time.perf_counter()
+
+# 检查修改是否已写入磁盘的间隔 (毫秒)
+SAVE_STATUS_INTERVAL_MS = 300
 
 
 def increment_version(version_str):
@@ -31,28 +54,115 @@ def increment_version(version_str):
 class RejectionManagementSystem:
     """拒签管理系统主类"""
     
-    def __init__(self, root):
+    def __init__(self, root, timer=None):
         self.root = root
         self.root.title(f"国服ID申请拒签管理 v{__version__}")
         self.root.geometry("1400x700")
+        self.timer = timer if timer is not None else StartupTimer(enabled=False)
         
-        # 数据存储
-        self.data_file = "rejection_data.json"
-        self.image_dir = "images"
-        self.records = []
+        # 数据存储 (此时只打开, 记录在窗口显示后于后台加载)
+        self.config = load_config()
+        self.data_file = self.config["data_file"]
+        self.image_dir = self.config["image_dir"]
+        self.core = RejectionCore(self.config)
+        self.store = self.core.store
+        self.images = self.core.images
+        self.perf = PerfMonitor(
+            self.config["perf_log_file"],
+            max_bytes=self.config["perf_log_max_kb"] * 1024,
+            backups=self.config["perf_log_backups"],
+            profile_dir=self.config["profile_dir"],
+        )
+        self.thumbnails = ThumbnailCache(
+            self.config["thumbnail_dir"],
+            max_bytes=self.config["thumbnail_cache_mb"] * 1024 * 1024,
+            memory_items=self.config["thumbnail_memory_items"],
+        )
+        self.image_loader = ImageLoader(
+            self.root, self.thumbnails, monitor=self.perf, resolve=self.core.image_resolver
+        )
+        self.viewer = ImageViewer(self.root, self.image_loader)
+        self._sync_state = None
+        self._pending_uploads = 0
+        # 已上传、固定在图片库中 (还没有保存到记录) 的图片, 每次固定一项
+        self._upload_pins = []
+        # 正在修改的记录ID (输入框中是这条记录的内容), None 表示新增
+        self._editing = None
+        self._server_error = None
+        self.loaded = False
+        self._load_warning = None
+        self._mapped = False
         
         # 创建图片目录
         if not os.path.exists(self.image_dir):
             os.makedirs(self.image_dir)
         
-        # 加载数据
-        self.load_data()
+        # 搜索索引和统计计数 (加载完成后建立, 之后跟随存储的修改增量更新)
+        self.search_index = SearchIndex()
+        self._search_job = None
+        self.stats = RejectionStats()
+        self.dashboard = StatsDashboard(self.root, self.stats)
+        
+        # 相似图片索引 (没有哈希的图片在加载和导入后于后台补算)
+        self.similarity = SimilarityIndex(self.core.image_hashes, resolve=self.core.image_resolver)
+        self._hashing = False
+        self._rehash = False
+        
+        # 备份与恢复窗口 (打开时为 SnapshotDialog)
+        self.snapshot_dialog = None
         
-        # 初始化UI
+        # 性能面板 (开发者用, 按F12打开)
+        self.perf_panel = PerfPanel(self.root, self.perf)
+        self.root.bind("<F12>", lambda e: self.perf_panel.show())
+        
+        # 初始化UI, 加载完成前表格为空
         self.setup_ui()
+        self.root.bind("<Map>", self._on_first_map)
+        
+        # 关闭窗口时写完未写入的修改并等待后台压缩完成
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self._shown_write_error = None
+        self.root.after(SAVE_STATUS_INTERVAL_MS, self._poll_save_status)
         
-        # 显示现有数据
-        self.refresh_table()
+        # 加载数据
+        self.start_loading()
+    
+    def _on_first_map(self, event):
+        """记录窗口第一次显示的时间"""
+        if event.widget is self.root and not self._mapped:
+            self._mapped = True
+            self.timer.mark("窗口显示")
+    
+    @property
+    def sync_state(self):
+        """站点同步状态 (第一次用到时才读取)"""
+        if self._sync_state is None:
+            from sync import SyncState
+            
+            self._sync_state = SyncState(self.config["sync_state_file"]).load()
+        return self._sync_state
+    
+    def on_close(self):
+        """关闭窗口"""
+        try:
+            self.store.flush()
+        except Exception as e:
+            if not messagebox.askyesno(
+                "保存失败", f"有修改未能写入磁盘:\n{str(e)}\n\n仍然退出? (未写入的修改将丢失)"
+            ):
+                return
+        self.viewer.close()
+        self.dashboard.close()
+        self.perf_panel.close()
+        self.image_loader.shutdown()
+        self.thumbnails.close()
+        try:
+            self.core.close()
+        except Exception as e:
+            self.perf.logger.error("close store failed: %s", e)
+            messagebox.showerror("关闭失败", f"关闭数据存储时发生错误:\n{str(e)}")
+        self.perf.close()
+        self.root.destroy()
     
     def setup_ui(self):
         """设置用户界面"""
@@ -80,6 +190,7 @@ class RejectionManagementSystem:
         
         # 输入框架
         input_frame = ttk.LabelFrame(main_frame, text="新增记录", padding="10")
+        self.input_frame = input_frame
         input_frame.grid(row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=10)
         
         # 呼号
@@ -132,13 +243,32 @@ class RejectionManagementSystem:
         button_frame = ttk.Frame(input_frame)
         button_frame.grid(row=5, column=0, columnspan=4, pady=10)
         
-        ttk.Button(button_frame, text="添加记录", command=self.add_record).pack(side=tk.LEFT, padx=5)
+        self.add_button = ttk.Button(button_frame, text="添加记录", command=self.add_record)
+        self.add_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="按文件夹批量添加", command=self.batch_add).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="清空输入", command=self.clear_inputs).pack(side=tk.LEFT, padx=5)
+        self.keep_original = tk.BooleanVar(value=self.config["keep_original_images"])
+        ttk.Checkbutton(button_frame, text="上传时保留原图", variable=self.keep_original).pack(side=tk.LEFT, padx=5)
+        self.save_status = ttk.Label(button_frame, text="", foreground="gray")
+        self.save_status.pack(side=tk.LEFT, padx=10)
         
         # 表格框架
         table_frame = ttk.LabelFrame(main_frame, text="拒签记录列表", padding="10")
         table_frame.grid(row=2, column=0, columnspan=4, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
         
+        # 搜索框
+        search_frame = ttk.Frame(table_frame)
+        search_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+        ttk.Label(search_frame, text="搜索 (呼号前缀或拒签原因):").pack(side=tk.LEFT, padx=5)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=40)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        search_entry.bind("<KeyRelease>", self.schedule_search)
+        search_entry.bind("<Return>", lambda e: self.apply_search())
+        ttk.Button(search_frame, text="清除", command=self.clear_search).pack(side=tk.LEFT, padx=5)
+        self.search_status = ttk.Label(search_frame, text="正在加载数据...", foreground="gray")
+        self.search_status.pack(side=tk.LEFT, padx=10)
+        
         # 创建Treeview
         columns = ("呼号", "申请时间", "执照照片", "操作证照片", "申请截图", "拒签原因")
         self.tree = ttk.Treeview(table_frame, columns=columns, show="tree headings", height=15)
@@ -156,22 +286,28 @@ class RejectionManagementSystem:
                 self.tree.column(col, width=250, anchor=tk.W)
             self.tree.heading(col, text=col)
         
-        # 滚动条
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # 滚动条 (由虚拟表格按记录位置维护)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL)
+        self.table = VirtualTable(self.tree, scrollbar, self.store)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
         
-        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
         
         # 操作按钮
         action_frame = ttk.Frame(main_frame)
         action_frame.grid(row=3, column=0, columnspan=4, pady=10)
         
         ttk.Button(action_frame, text="查看图片", command=self.view_images).pack(side=tk.LEFT, padx=5)
+        ttk.Button(action_frame, text="查找相似", command=self.find_similar).pack(side=tk.LEFT, padx=5)
+        ttk.Button(action_frame, text="修改记录", command=self.edit_record).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="删除记录", command=self.delete_record).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="刷新列表", command=self.refresh_table).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="导出数据", command=self.export_data).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="导入数据", command=self.import_data).pack(side=tk.LEFT, padx=5)
+        ttk.Button(action_frame, text="增量导出", command=self.export_delta_data).pack(side=tk.LEFT, padx=5)
+        ttk.Button(action_frame, text="备份与恢复", command=self.show_snapshots).pack(side=tk.LEFT, padx=5)
+        ttk.Button(action_frame, text="统计", command=self.show_stats).pack(side=tk.LEFT, padx=5)
         
         # 版权信息（放在窗口底部）
         copyright_label = ttk.Label(
@@ -188,10 +324,12 @@ class RejectionManagementSystem:
         main_frame.columnconfigure(0, weight=1)
         main_frame.rowconfigure(2, weight=1)
         table_frame.columnconfigure(0, weight=1)
-        table_frame.rowconfigure(0, weight=1)
+        table_frame.rowconfigure(1, weight=1)
     
     def upload_image(self, image_type):
         """上传图片"""
+        if not self.require_loaded():
+            return
         callsign = self.callsign_entry.get().strip()
         if not callsign:
             messagebox.showwarning("警告", "请先填写呼号!")
@@ -202,65 +340,224 @@ class RejectionManagementSystem:
             filetypes=[("图片文件", "*.jpg *.jpeg *.png *.bmp *.gif"), ("所有文件", "*.*")]
         )
         
-        if file_path:
-            # 获取文件扩展名
-            ext = os.path.splitext(file_path)[1]
-            # 创建新文件名 (呼号_类型_时间戳.扩展名)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            new_filename = f"{callsign}_{image_type}_{timestamp}{ext}"
-            new_path = os.path.join(self.image_dir, new_filename)
-            
-            # 复制文件
-            shutil.copy2(file_path, new_path)
-            
-            # 更新对应的路径变量
-            if image_type == "license":
-                self.license_path.set(new_path)
-            elif image_type == "operator":
-                self.operator_path.set(new_path)
-            elif image_type == "screenshot":
-                self.screenshot_path.set(new_path)
-            
+        if not file_path:
+            return
+        keep_original = self.keep_original.get()
+        
+        def run(task):
+            # 缩小、重新编码后存入图片库 (按内容哈希命名, 相同图片只保存一份)
+            with self.perf.operation("upload", records=1, nbytes=file_size(file_path)):
+                return self.core.pipeline.ingest(file_path, keep_original, pin=True)
+        
+        def on_done(new_path):
+            self._pending_uploads -= 1
+            self._upload_pins.append(new_path)
+            # 更新对应的路径变量, 替换掉的图片若没有记录引用则删除
+            path_var = self._image_path_vars()[image_type]
+            old_path = path_var.get()
+            path_var.set(new_path)
+            self._discard_unsaved_image(old_path)
             messagebox.showinfo("成功", f"{image_type}照片上传成功!")
+        
+        def on_error(e):
+            self._pending_uploads -= 1
+            messagebox.showerror("错误", f"上传图片失败: {str(e)}")
+        
+        self._pending_uploads += 1
+        BackgroundTask(self.root, run, on_done=on_done, on_error=on_error, name="upload").start()
+    
+    def _image_path_vars(self):
+        return {
+            "license": self.license_path,
+            "operator": self.operator_path,
+            "screenshot": self.screenshot_path,
+        }
+    
+    def _unpin_unused_uploads(self):
+        """解除已不在输入框中的上传图片的固定 (已保存到记录的由引用计数保护)"""
+        in_use = [var.get() for var in self._image_path_vars().values()]
+        pins = self._upload_pins
+        self._upload_pins = [path for path in pins if path in in_use]
+        for path in pins:
+            if path not in in_use:
+                self.images.unpin(path)
+    
+    def _discard_unsaved_image(self, path):
+        """删除已上传但没有保存到任何记录的图片"""
+        self._unpin_unused_uploads()
+        if not path or path in [var.get() for var in self._image_path_vars().values()]:
+            return
+        if self.core.release_image(path):
+            self.thumbnails.invalidate(path)
     
     def add_record(self):
-        """添加记录"""
+        """添加记录 (修改记录时保存修改)"""
+        if not self.require_loaded():
+            return
+        if self._editing is not None:
+            self.save_edit()
+            return
         callsign = self.callsign_entry.get().strip()
         apply_time = self.datetime_entry.get().strip()
         license_img = self.license_path.get()
         operator_img = self.operator_path.get()
         screenshot_img = self.screenshot_path.get()
         reason = self.reason_text.get("1.0", tk.END).strip()
-        
-        # 验证必填项
-        if not callsign:
-            messagebox.showwarning("警告", "呼号不能为空!")
+        if self._pending_uploads:
+            messagebox.showwarning("警告", "图片还在处理中, 请稍候再添加!")
             return
         
-        if not apply_time:
-            messagebox.showwarning("警告", "申请时间不能为空!")
+        # 创建记录 (同时验证必填项)
+        try:
+            record = make_record(callsign, apply_time, reason, {
+                "license_image": license_img,
+                "operator_image": operator_img,
+                "screenshot_image": screenshot_img,
+            })
+        except ValueError as e:
+            messagebox.showwarning("警告", str(e))
             return
         
-        # 创建记录
-        record = {
-            "callsign": callsign,
-            "apply_time": apply_time,
-            "license_image": license_img,
-            "operator_image": operator_img,
-            "screenshot_image": screenshot_img,
-            "rejection_reason": reason,
-            "create_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        try:
+            with self.perf.operation("add", records=1):
+                index = self.core.add_record(record)
+        except Exception as e:
+            messagebox.showerror("错误", f"添加记录失败: {str(e)}")
+            return
+        if self.is_searching() or self.core.remote:
+            # 服务器模式下同时取回了其他操作员的修改, 整体刷新
+            self.refresh_table()
+        else:
+            self.table.row_inserted(index)
+        self.clear_inputs(discard_images=False)
         
-        self.records.append(record)
-        self.save_data()
-        self.refresh_table()
+        messagebox.showinfo("成功", "记录添加成功!")
+    
+    def edit_record(self):
+        """把选中的记录填入输入框修改, 点击"保存修改"写回"""
+        if not self.require_loaded():
+            return
+        record = self.table.selected_record()
+        if record is None:
+            messagebox.showwarning("警告", "请先选择一条记录!")
+            return
         self.clear_inputs()
+        self.callsign_entry.insert(0, record.get("callsign", ""))
+        self.datetime_entry.delete(0, tk.END)
+        self.datetime_entry.insert(0, record.get("apply_time", ""))
+        for kind, var in self._image_path_vars().items():
+            var.set(record.get(IMAGE_KINDS[kind]) or "")
+        self.reason_text.insert("1.0", record.get("rejection_reason", ""))
+        self._set_editing(record)
+    
+    def _set_editing(self, record):
+        self._editing = None if record is None else record[ID_FIELD]
+        if record is None:
+            self.input_frame.configure(text="新增记录")
+            self.add_button.configure(text="添加记录")
+        else:
+            self.input_frame.configure(text=f"修改记录 - {record['callsign']}")
+            self.add_button.configure(text="保存修改")
+    
+    def save_edit(self):
+        """把输入框的内容写回正在修改的记录 (只写入改变的字段)"""
+        if self._pending_uploads:
+            messagebox.showwarning("警告", "图片还在处理中, 请稍候再保存!")
+            return
+        try:
+            fields = make_record(
+                self.callsign_entry.get(),
+                self.datetime_entry.get(),
+                self.reason_text.get("1.0", tk.END),
+                {IMAGE_KINDS[kind]: var.get() for kind, var in self._image_path_vars().items()},
+            )
+        except ValueError as e:
+            messagebox.showwarning("警告", str(e))
+            return
+        # 创建时间保持不变
+        del fields["create_time"]
         
-        messagebox.showinfo("成功", "记录添加成功!")
+        record_id = self._editing
+        try:
+            with self.perf.operation("edit", records=1):
+                changed, removed = self.core.update_record(record_id, fields)
+        except Exception as e:
+            # 记录可能已被删除, 或在服务器上已被其他操作员修改
+            self.refresh_table()
+            messagebox.showerror("错误", f"修改记录失败: {str(e)}")
+            return
+        self.thumbnails.invalidate(*removed)
+        if self.is_searching() or self.core.remote:
+            self.refresh_table()
+        elif changed:
+            self.table.record_updated(self.store.get_by_id(record_id))
+        self.clear_inputs(discard_images=False)
+        
+        messagebox.showinfo("成功", "记录修改成功!" if changed else "记录没有改变")
+    
+    def batch_add(self):
+        """选择文件夹, 按文件名把图片分组为记录, 预览确认后一次添加"""
+        if not self.require_loaded():
+            return
+        from batch_ingest import scan_folder
+        from batch_preview import BatchPreviewDialog
+        
+        folder = filedialog.askdirectory(title="选择图片文件夹")
+        if not folder:
+            return
+        try:
+            plan = scan_folder(folder, self.config["batch_filename_pattern"])
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"扫描文件夹失败: {str(e)}")
+            return
+        if not plan.groups:
+            messagebox.showinfo(
+                "批量添加",
+                f"没有符合文件名规则的图片 ({self.config['batch_filename_pattern']}.jpg 等)"
+            )
+            return
+        BatchPreviewDialog(self.root, plan, lambda apply_time, reason: self._ingest_batch(plan, apply_time, reason))
+    
+    def _ingest_batch(self, plan, apply_time, reason):
+        """后台并行处理图片, 完成后在界面线程中一次写入所有记录"""
+        from batch_ingest import finish_ingest, ingest_plan
+        
+        keep_original = self.keep_original.get()
+        dialog = ProgressDialog(self.root, "批量添加")
+        
+        def run(task):
+            with self.perf.operation("upload", records=len(plan.groups)):
+                return ingest_plan(
+                    self.core, plan, apply_time, reason, task,
+                    workers=self.config["batch_ingest_workers"], keep_original=keep_original,
+                )
+        
+        def on_done(records):
+            dialog.close()
+            try:
+                with self.perf.operation("add", records=len(records)):
+                    self.core.add_records(records)
+            except Exception as e:
+                finish_ingest(self.core, records, saved=False)
+                messagebox.showerror("错误", f"添加记录失败: {str(e)}")
+                return
+            finish_ingest(self.core, records, saved=True)
+            self.refresh_table()
+            messagebox.showinfo("成功", f"已添加 {len(records)} 条记录!")
+        
+        def on_error(e):
+            dialog.close()
+            if not isinstance(e, TaskCancelled):
+                messagebox.showerror("错误", f"处理图片失败: {str(e)}")
+        
+        dialog.task = BackgroundTask(
+            self.root, run,
+            on_done=on_done, on_error=on_error, on_progress=dialog.update, name="batch-add"
+        ).start()
     
-    def clear_inputs(self):
+    def clear_inputs(self, discard_images=True):
         """清空输入框"""
+        uploaded = [var.get() for var in self._image_path_vars().values()]
         self.callsign_entry.delete(0, tk.END)
         self.datetime_entry.delete(0, tk.END)
         self.datetime_entry.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M"))
@@ -268,143 +565,158 @@ class RejectionManagementSystem:
         self.operator_path.set("")
         self.screenshot_path.set("")
         self.reason_text.delete("1.0", tk.END)
+        self._set_editing(None)
+        self._unpin_unused_uploads()
+        
+        if discard_images:
+            for path in uploaded:
+                self._discard_unsaved_image(path)
     
     def refresh_table(self):
-        """刷新表格"""
-        # 清空表格
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # 添加数据
-        for idx, record in enumerate(self.records, 1):
-            license_status = "✓" if record.get("license_image") else "✗"
-            operator_status = "✓" if record.get("operator_image") else "✗"
-            screenshot_status = "✓" if record.get("screenshot_image") else "✗"
-            
-            self.tree.insert(
-                "", 
-                tk.END, 
-                text=str(idx),
-                values=(
-                    record["callsign"],
-                    record["apply_time"],
-                    license_status,
-                    operator_status,
-                    screenshot_status,
-                    record["rejection_reason"][:50] + "..." if len(record["rejection_reason"]) > 50 else record["rejection_reason"]
-                )
-            )
+        """刷新表格 (只重新读取当前可见的行; 搜索中则重新搜索)"""
+        if not self.loaded:
+            return
+        if self.is_searching():
+            self.apply_search(keep_position=True)
+            return
+        with self.perf.operation("refresh") as op:
+            self.table.reload()
+            op.records = len(self.table.items)
+    
+    def is_searching(self):
+        """表格当前显示的是否为搜索结果"""
+        return self.table.store is not self.store
+    
+    def schedule_search(self, event=None):
+        """输入停顿一会儿后再搜索, 避免每按一个键都刷新表格"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(200, self.apply_search)
+    
+    def apply_search(self, keep_position=False):
+        """按搜索框内容过滤表格, 搜索框为空时显示全部记录"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+            self._search_job = None
+        
+        if not self.loaded:
+            # 加载完成后会按搜索框内容重新搜索
+            return
+        
+        offset = self.table.offset if keep_position else 0
+        query = self.search_var.get().strip()
+        if not query:
+            self.search_status.configure(text="")
+            self.table.set_source(self.store, offset)
+            return
+        
+        with self.perf.operation("search") as op:
+            results = SearchResults(self.store, self.search_index.search(query))
+            op.records = results.count()
+        self.search_status.configure(text=f"找到 {results.count()} 条记录")
+        self.table.set_source(results, offset)
+    
+    def clear_search(self):
+        self.search_var.set("")
+        self.apply_search()
     
     def view_images(self):
         """查看图片"""
-        selected = self.tree.selection()
-        if not selected:
+        record = self.table.selected_record()
+        if record is None:
             messagebox.showwarning("警告", "请先选择一条记录!")
             return
         
-        # 获取选中项的索引
-        item = selected[0]
-        index = int(self.tree.item(item, "text")) - 1
-        record = self.records[index]
-        
-        # 创建图片查看窗口
-        view_window = tk.Toplevel(self.root)
-        view_window.title(f"呼号: {record['callsign']} - 图片查看")
-        view_window.geometry("800x600")
-        
-        # 主框架
-        main_frame = ttk.Frame(view_window, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
-        
-        # 上部框架 - 倒品字形上面两个图片(执照和操作证)
-        top_frame = ttk.Frame(main_frame)
-        top_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
-        
-        # 左侧 - 执照照片
-        left_frame = ttk.LabelFrame(top_frame, text="执照照片", padding="5")
-        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        self.viewer.show(record)
+    
+    def find_similar(self):
+        """查找图片与选中记录相似的其他记录"""
+        if not self.require_loaded():
+            return
+        record = self.table.selected_record()
+        if record is None:
+            messagebox.showwarning("警告", "请先选择一条记录!")
+            return
+        from similar_dialog import SimilarDialog
         
-        license_img_path = record.get("license_image")
-        if license_img_path and os.path.exists(license_img_path):
-            try:
-                img = Image.open(license_img_path)
-                img.thumbnail((360, 250))
-                photo = ImageTk.PhotoImage(img)
-                img_label = ttk.Label(left_frame, image=photo)
-                img_label.image = photo
-                img_label.pack()
-            except Exception as e:
-                ttk.Label(left_frame, text=f"无法加载图片\n{str(e)}").pack()
-        else:
-            ttk.Label(left_frame, text="未上传图片", font=("Microsoft YaHei", 10)).pack(pady=50)
+        max_distance = self.config["similar_max_distance"]
+        with self.perf.operation("similar", records=1) as op:
+            matches = self.similarity.find_similar(record[ID_FIELD], max_distance)
+            op.records = len(matches)
+        SimilarDialog(
+            self.root, self.store, record, matches, max_distance,
+            pending=self.similarity.missing_count(), on_view=self.viewer.show,
+        )
+    
+    def compute_image_hashes(self):
+        """在后台补算还没有哈希的图片 (已在进行时, 完成后再补算一次)"""
+        if self._hashing:
+            self._rehash = True
+            return
+        if not self.similarity.missing_count():
+            return
+        self._hashing = True
         
-        # 右侧 - 操作证照片
-        right_frame = ttk.LabelFrame(top_frame, text="操作证照片", padding="5")
-        right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
+        def finished(result=None):
+            self._hashing = False
+            if self._rehash:
+                self._rehash = False
+                self.compute_image_hashes()
         
-        operator_img_path = record.get("operator_image")
-        if operator_img_path and os.path.exists(operator_img_path):
-            try:
-                img = Image.open(operator_img_path)
-                img.thumbnail((360, 250))
-                photo = ImageTk.PhotoImage(img)
-                img_label = ttk.Label(right_frame, image=photo)
-                img_label.image = photo
-                img_label.pack()
-            except Exception as e:
-                ttk.Label(right_frame, text=f"无法加载图片\n{str(e)}").pack()
-        else:
-            ttk.Label(right_frame, text="未上传图片", font=("Microsoft YaHei", 10)).pack(pady=50)
+        def on_error(e):
+            self.perf.logger.warning("image hash failed: %s", e)
+            finished()
         
-        # 下部框架 - 倒品字形下面的长条(申请截图)
-        bottom_frame = ttk.LabelFrame(main_frame, text="申请截图", padding="5")
-        bottom_frame.pack(fill=tk.BOTH, expand=True)
+        def run(task):
+            with self.perf.operation("image_hash") as op:
+                op.records = self.similarity.compute_missing()
         
-        screenshot_img_path = record.get("screenshot_image")
-        if screenshot_img_path and os.path.exists(screenshot_img_path):
-            try:
-                img = Image.open(screenshot_img_path)
-                img.thumbnail((760, 250))
-                photo = ImageTk.PhotoImage(img)
-                img_label = ttk.Label(bottom_frame, image=photo)
-                img_label.image = photo
-                img_label.pack()
-            except Exception as e:
-                ttk.Label(bottom_frame, text=f"无法加载图片\n{str(e)}").pack()
-        else:
-            ttk.Label(bottom_frame, text="未上传图片", font=("Microsoft YaHei", 10)).pack(pady=50)
+        BackgroundTask(self.root, run, on_done=finished, on_error=on_error, name="image-hash").start()
+    
+    def on_select(self, event=None):
+        """查看窗口打开时, 切换选中记录即切换显示的图片"""
+        record = self.table.selected_record()
+        if record is not None and self.viewer.is_open():
+            self.viewer.show(record)
     
     def delete_record(self):
         """删除记录"""
-        selected = self.tree.selection()
-        if not selected:
+        if not self.require_loaded():
+            return
+        record = self.table.selected_record()
+        if record is None:
             messagebox.showwarning("警告", "请先选择一条记录!")
             return
         
         if messagebox.askyesno("确认", "确定要删除这条记录吗?"):
-            item = selected[0]
-            index = int(self.tree.item(item, "text")) - 1
+            # 按ID删除 (表格中可能是搜索结果, 行的序号不是记录在存储中的位置)
+            record_id = record[ID_FIELD]
             
-            # 删除关联的图片文件
-            record = self.records[index]
-            for img_key in ["license_image", "operator_image", "screenshot_image"]:
-                img_path = record.get(img_key)
-                if img_path and os.path.exists(img_path):
-                    try:
-                        os.remove(img_path)
-                    except Exception as e:
-                        print(f"删除图片失败: {e}")
+            # 删除记录, 以及不再被其他记录引用的图片文件
+            try:
+                with self.perf.operation("delete", records=1):
+                    _, removed = self.core.delete_record(record_id)
+            except Exception as e:
+                # 服务器模式下记录可能已被其他操作员修改或删除
+                self.refresh_table()
+                messagebox.showerror("删除失败", f"删除记录时发生错误:\n{str(e)}")
+                return
+            self.thumbnails.invalidate(*removed)
+            if record_id == self._editing:
+                self.clear_inputs()
             
-            # 删除记录
-            del self.records[index]
-            self.save_data()
-            self.refresh_table()
+            if self.is_searching() or self.core.remote:
+                self.refresh_table()
+            else:
+                self.table.record_deleted(record_id)
             
             messagebox.showinfo("成功", "记录删除成功!")
     
     def export_data(self):
         """导出数据"""
-        if not self.records:
+        if not self.require_loaded():
+            return
+        if not self.store.count():
             messagebox.showwarning("警告", "没有数据可以导出!")
             return
         
@@ -412,19 +724,31 @@ class RejectionManagementSystem:
         export_path = filedialog.asksaveasfilename(
             title="导出数据",
             defaultextension=".json",
-            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
+            filetypes=[
+                ("JSON文件", "*.json"),
+                ("ZIP归档 (记录+图片)", "*.zip"),
+                ("TAR归档 (记录+图片)", "*.tar"),
+                ("所有文件", "*.*"),
+            ]
         )
         
         if not export_path:
             return
         
+        from exporter import is_archive_path
+        
+        if is_archive_path(export_path):
+            self.export_archive(export_path)
+            return
+        
         try:
             # 导出数据
-            with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(self.records, f, ensure_ascii=False, indent=2)
+            with self.perf.operation("export", records=self.store.count()) as op:
+                self.core.export_file(export_path)
+                op.nbytes = file_size(export_path)
             
             # 提示用户是否也要复制图片目录
-            if os.path.exists(self.image_dir) and os.listdir(self.image_dir):
+            if not self.core.remote and os.path.exists(self.image_dir) and os.listdir(self.image_dir):
                 if messagebox.askyesno("导出成功", f"数据已导出到: {export_path}\n\n是否也导出图片目录?"):
                     # 选择图片目录导出位置
                     export_images_dir = filedialog.askdirectory(title="选择图片目录导出位置")
@@ -435,6 +759,8 @@ class RejectionManagementSystem:
                             messagebox.showwarning("警告", f"目标目录 {target_images_dir} 已存在!")
                         else:
                             # 复制整个图片目录
+                            import shutil
+                            
                             shutil.copytree(self.image_dir, target_images_dir)
                             messagebox.showinfo("导出成功", f"数据已导出到: {export_path}\n图片已导出到: {target_images_dir}")
                     else:
@@ -445,84 +771,526 @@ class RejectionManagementSystem:
         except Exception as e:
             messagebox.showerror("导出失败", f"导出数据时发生错误:\n{str(e)}")
     
+    def export_archive(self, export_path):
+        """把记录和被引用的图片导出为一个归档文件 (后台进行)"""
+        from exporter import export_archive
+        
+        dialog = ProgressDialog(self.root, "导出数据")
+        
+        def on_done(result):
+            dialog.close()
+            record_count, image_count, size = result
+            messagebox.showinfo(
+                "导出成功",
+                f"已导出 {record_count} 条记录和 {image_count} 张图片到:\n{export_path}\n"
+                f"文件大小: {size / 1024 / 1024:.1f} MB"
+            )
+        
+        def on_error(e):
+            dialog.close()
+            if isinstance(e, TaskCancelled):
+                messagebox.showinfo("导出数据", "导出已取消")
+            else:
+                messagebox.showerror("导出失败", f"导出数据时发生错误:\n{str(e)}")
+        
+        def run(task):
+            with self.perf.operation("export") as op:
+                result = export_archive(self.store, export_path, task, resolve=self.core.image_resolver)
+                op.records, op.nbytes = result[0], result[2]
+            return result
+        
+        dialog.task = BackgroundTask(
+            self.root, run,
+            on_done=on_done, on_error=on_error, on_progress=dialog.update, name="export"
+        ).start()
+    
+    def export_delta_data(self):
+        """导出上次导出给对方站点以来的增量 (后台进行)"""
+        # 只导出已经写入磁盘的修改, 本机崩溃后不会出现对方有而本站没有的修改
+        if not self.require_loaded() or not self.flush_store():
+            return
+        from sync import export_delta
+        
+        peer = self.ask_sync_peer()
+        if not peer:
+            return
+        since = self.sync_state.watermark(peer)
+        
+        export_path = filedialog.asksaveasfilename(
+            title="增量导出",
+            defaultextension=".zip",
+            initialfile=f"delta_{peer}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+            filetypes=[("ZIP归档", "*.zip"), ("TAR归档", "*.tar")]
+        )
+        if not export_path:
+            return
+        
+        dialog = ProgressDialog(self.root, "增量导出")
+        
+        def on_done(result):
+            dialog.close()
+            record_count, tombstone_count, image_count, size, watermark = result
+            # 文件完整写出后才推进水位, 导出失败时下次仍从原水位导出
+            self.sync_state.mark_exported(peer, watermark)
+            messagebox.showinfo(
+                "导出成功",
+                f"已导出给 {peer} 的增量到:\n{export_path}\n\n"
+                f"修改或新增的记录: {record_count} 条\n删除的记录: {tombstone_count} 条\n"
+                f"图片: {image_count} 张, 文件大小: {size / 1024:.1f} KB"
+            )
+        
+        def on_error(e):
+            dialog.close()
+            if isinstance(e, TaskCancelled):
+                messagebox.showinfo("增量导出", "导出已取消")
+            else:
+                messagebox.showerror("导出失败", f"导出增量时发生错误:\n{str(e)}")
+        
+        def run(task):
+            with self.perf.operation("export_delta") as op:
+                result = export_delta(
+                    self.store, export_path, since, self.sync_state.station_id, task,
+                    resolve=self.core.image_resolver,
+                )
+                op.records, op.nbytes = result[0] + result[1], result[3]
+            return result
+        
+        dialog.task = BackgroundTask(
+            self.root, run,
+            on_done=on_done, on_error=on_error, on_progress=dialog.update, name="export-delta"
+        ).start()
+    
+    def ask_sync_peer(self):
+        """输入或选择对方站点名称, 取消时返回None"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("增量导出")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text="对方站点名称 (按站点分别记录导出进度):").pack(anchor=tk.W, pady=5)
+        
+        peers = self.sync_state.peers()
+        peer_var = tk.StringVar(value=peers[0] if peers else "")
+        ttk.Combobox(frame, textvariable=peer_var, values=peers, width=30).pack(fill=tk.X, pady=5)
+        
+        result = {"peer": None}
+        
+        def confirm():
+            peer = peer_var.get().strip()
+            if not peer:
+                messagebox.showwarning("警告", "请输入对方站点名称!", parent=dialog)
+                return
+            result["peer"] = peer
+            dialog.destroy()
+        
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="导出", command=confirm).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        self.root.wait_window(dialog)
+        return result["peer"]
+    
     def import_data(self):
-        """导入数据"""
+        """导入数据 (在后台线程中逐条解析并复制图片)"""
+        if not self.require_loaded():
+            return
+        from importer import ImportJob, read_delta_info, source_has_images
+        
         # 选择要导入的数据文件
         import_path = filedialog.askopenfilename(
             title="选择要导入的数据文件",
-            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
+            filetypes=[
+                ("数据文件", "*.json *.zip *.tar"),
+                ("JSON文件", "*.json"),
+                ("归档文件", "*.zip *.tar"),
+                ("所有文件", "*.*"),
+            ]
         )
         
         if not import_path:
             return
+        # 导入前先写完之前的修改, 备份和导入都以磁盘上完整的数据为准
+        if not self.flush_store():
+            return
         
         try:
-            # 读取导入的数据
-            with open(import_path, 'r', encoding='utf-8') as f:
-                imported_records = json.load(f)
-            
-            # 验证数据格式
-            if not isinstance(imported_records, list):
-                messagebox.showerror("导入失败", "数据格式不正确!")
+            delta = read_delta_info(import_path)
+        except Exception as e:
+            messagebox.showerror("导入失败", f"读取导入文件时发生错误:\n{str(e)}")
+            return
+        
+        if delta is not None:
+            # 增量同步文件: 按记录ID应用, 图片总是一起导入
+            if delta.get("station") == self.sync_state.station_id:
+                messagebox.showwarning("警告", "这是本站导出的增量文件, 无需导入!")
                 return
-            
-            # 询问用户是否导入图片目录
+            mode, import_images = "sync", True
+        else:
+            # 询问用户是否导入图片 (只复制导入记录引用到的图片)
             import_images = False
-            source_images_dir = os.path.join(os.path.dirname(import_path), "images")
-            if os.path.exists(source_images_dir) and os.listdir(source_images_dir):
+            if source_has_images(import_path):
                 import_images = messagebox.askyesno("导入数据", "检测到图片目录，是否一起导入?")
             
-            # 备份当前数据
-            if self.records:
-                backup_path = f"rejection_data_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                with open(backup_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.records, f, ensure_ascii=False, indent=2)
-                
-                if messagebox.askyesno("数据备份", f"当前数据已备份到: {backup_path}\n\n是否继续导入新数据?") == False:
-                    return
-            
-            # 导入数据
-            self.records = imported_records
-            self.save_data()
+            mode = self.ask_import_mode()
+            if mode is None:
+                return
+        
+        job = ImportJob(
+            self.store, self.images, import_path, mode, import_images, backup=self.core.snapshot_before_import
+        )
+        dialog = ProgressDialog(self.root, "导入数据")
+        
+        def on_done(job):
+            dialog.close()
+            try:
+                with self.perf.operation("import_apply", records=len(job.records)):
+                    added, updated, removed = job.apply()
+                # 导入的修改落盘后才记录同步水位
+                self.store.flush()
+            except Exception as e:
+                messagebox.showerror("导入失败", f"导入数据时发生错误:\n{str(e)}")
+                return
+            self.thumbnails.invalidate(*removed)
+            self.refresh_table()
+            self.compute_image_hashes()
             
-            # 导入图片目录
-            if import_images:
-                if os.path.exists(self.image_dir):
-                    # 删除现有图片目录
-                    shutil.rmtree(self.image_dir)
-                
-                # 复制导入的图片目录
-                shutil.copytree(source_images_dir, self.image_dir)
+            if job.delta is not None:
+                self.sync_state.mark_received(job.delta["station"], job.delta["watermark"])
+                messagebox.showinfo(
+                    "同步完成",
+                    f"新增 {added} 条, 更新 {updated} 条, 删除 {job.deleted} 条记录\n"
+                    f"已是最新而未改变的记录 {len(job.records) - added - updated} 条"
+                )
+                return
             
-            # 刷新显示
+            message = f"成功导入 {added + updated} 条记录!"
+            if updated:
+                message += f"\n其中新增 {added} 条, 更新 {updated} 条"
+            if job.skipped:
+                message += f"\n跳过已有或重复的记录 {job.skipped} 条"
+            if job.missing_images:
+                message += f"\n有 {job.missing_images} 张图片在导入目录中找不到"
+            if job.snapshot is not None:
+                message += f"\n\n导入前的数据已保存为快照: {job.snapshot['id']}"
+            messagebox.showinfo("导入成功", message)
+        
+        def on_error(e):
+            dialog.close()
+            if isinstance(e, TaskCancelled):
+                messagebox.showinfo("导入数据", "导入已取消, 数据未改变")
+            else:
+                messagebox.showerror("导入失败", f"导入数据时发生错误:\n{str(e)}")
+        
+        def prepare(task):
+            with self.perf.operation("import", nbytes=file_size(import_path)) as op:
+                job.prepare(task)
+                op.records = len(job.records)
+            return job
+        
+        dialog.task = BackgroundTask(
+            self.root, prepare,
+            on_done=on_done, on_error=on_error, on_progress=dialog.update, name="import"
+        ).start()
+    
+    def ask_import_mode(self):
+        """选择导入方式, 取消时返回None"""
+        from importer import IMPORT_MODES
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("导入方式")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text="已有记录按 呼号+申请时间 识别:").pack(anchor=tk.W, pady=5)
+        
+        mode_var = tk.StringVar(value="merge")
+        for mode, text in IMPORT_MODES:
+            ttk.Radiobutton(frame, text=text, value=mode, variable=mode_var).pack(anchor=tk.W, padx=10)
+        
+        result = {"mode": None}
+        
+        def confirm():
+            result["mode"] = mode_var.get()
+            dialog.destroy()
+        
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="导入", command=confirm).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        self.root.wait_window(dialog)
+        return result["mode"]
+    
+    def show_snapshots(self):
+        """打开备份与恢复窗口"""
+        if not self.require_loaded():
+            return
+        if self.core.remote:
+            messagebox.showinfo("备份与恢复", "记录保存在服务器上, 请在服务器上备份和恢复")
+            return
+        from snapshot_dialog import SnapshotDialog
+        
+        if self.snapshot_dialog is not None and self.snapshot_dialog.is_open():
+            self.snapshot_dialog.window.lift()
+            return
+        self.snapshot_dialog = SnapshotDialog(
+            self.root, self.core.list_snapshots, on_create=self.create_snapshot, on_restore=self.restore_snapshot,
+            link_images=self.core.config["snapshot_link_images"],
+        )
+    
+    def _reload_snapshot_dialog(self):
+        if self.snapshot_dialog is not None:
+            self.snapshot_dialog.reload()
+    
+    def create_snapshot(self, reason="手动备份", quiet=False):
+        """在后台创建快照; quiet 为True时 (定时备份) 不显示进度和结果"""
+        dialog = None if quiet else ProgressDialog(self.root, "创建快照")
+        
+        def on_done(manifest):
+            self._reload_snapshot_dialog()
+            if dialog is None:
+                return
+            dialog.close()
+            message = (
+                f"已创建快照: {manifest['records']} 条记录, {manifest['images']} 张图片\n"
+                f"新增占用 {format_size(manifest['new_bytes'])}"
+            )
+            if manifest["missing_images"]:
+                message += f"\n有 {manifest['missing_images']} 张图片找不到, 未能备份"
+            messagebox.showinfo("创建快照", message)
+        
+        def on_error(e):
+            if dialog is None:
+                self.perf.logger.error("scheduled snapshot failed: %s", e)
+                messagebox.showwarning("定时备份失败", f"自动创建快照时发生错误:\n{str(e)}")
+                return
+            dialog.close()
+            if isinstance(e, TaskCancelled):
+                messagebox.showinfo("创建快照", "已取消")
+            else:
+                messagebox.showerror("备份失败", f"创建快照时发生错误:\n{str(e)}")
+        
+        def run(task):
+            with self.perf.operation("snapshot") as op:
+                manifest = self.core.create_snapshot(reason, task)
+                op.records = manifest["records"]
+                op.nbytes = manifest["new_bytes"]
+            return manifest
+        
+        task = BackgroundTask(
+            self.root, run, on_done=on_done, on_error=on_error,
+            on_progress=dialog.update if dialog is not None else None, name="snapshot"
+        )
+        if dialog is not None:
+            dialog.task = task
+        task.start()
+    
+    def restore_snapshot(self, manifest):
+        """把全部记录恢复为快照的内容
+        
+        快照的读取和恢复前的备份在后台进行, 替换记录在界面线程中进行.
+        """
+        if not self.flush_store():
+            return
+        dialog = ProgressDialog(self.root, "恢复快照")
+        
+        def on_done(result):
+            dialog.close()
+            records, missing, before = result
+            try:
+                with self.perf.operation("restore", records=len(records)):
+                    removed = self.core.apply_restore(records)
+                self.store.flush()
+            except Exception as e:
+                messagebox.showerror("恢复失败", f"恢复快照时发生错误:\n{str(e)}")
+                return
+            self.thumbnails.invalidate(*removed)
             self.refresh_table()
-            messagebox.showinfo("导入成功", f"成功导入 {len(imported_records)} 条记录!")
+            self.compute_image_hashes()
+            self._reload_snapshot_dialog()
             
+            message = f"已恢复为 {manifest['created']} 的快照, 共 {len(records)} 条记录"
+            if missing:
+                message += f"\n有 {missing} 张图片在快照中也找不到"
+            if before is not None:
+                message += f"\n\n恢复前的数据已保存为快照: {before['id']}"
+            messagebox.showinfo("恢复成功", message)
+        
+        def on_error(e):
+            dialog.close()
+            if isinstance(e, TaskCancelled):
+                messagebox.showinfo("恢复快照", "已取消, 数据未改变")
+            else:
+                messagebox.showerror("恢复失败", f"恢复快照时发生错误:\n{str(e)}")
+        
+        def run(task):
+            records, missing = self.core.prepare_restore(manifest["id"], task)
+            before = self.core.create_snapshot("恢复前", task) if self.store.count() else None
+            return records, missing, before
+        
+        dialog.task = BackgroundTask(
+            self.root, run, on_done=on_done, on_error=on_error, on_progress=dialog.update, name="restore"
+        ).start()
+    
+    def show_stats(self):
+        """打开统计窗口"""
+        if self.require_loaded():
+            self.dashboard.show()
+    
+    def _poll_save_status(self):
+        """显示是否还有修改未写入磁盘; 写入失败时提示一次"""
+        if self.core.remote:
+            if self._server_error is not None:
+                self.save_status.configure(text=f"无法连接服务器: {self._server_error}", foreground="red")
+            else:
+                self.save_status.configure(text=f"已连接 {self.config['server_url']}", foreground="gray")
+            self.root.after(SAVE_STATUS_INTERVAL_MS, self._poll_save_status)
+            return
+        error = self.store.write_error
+        pending = self.store.pending_writes()
+        if error is not None:
+            self.save_status.configure(text=f"写入失败, 将重试 ({pending} 项未保存)", foreground="red")
+            if error is not self._shown_write_error:
+                self._shown_write_error = error
+                messagebox.showerror("保存失败", f"修改未能写入磁盘, 将自动重试:\n{str(error)}")
+        elif pending:
+            self.save_status.configure(text=f"正在保存 ({pending} 项)...", foreground="gray")
+        else:
+            self.save_status.configure(text="已保存", foreground="gray")
+        self.root.after(SAVE_STATUS_INTERVAL_MS, self._poll_save_status)
+    
+    def _poll_server(self):
+        """服务器模式: 定时取回其他操作员的修改 (在后台请求, 在界面线程中应用)"""
+        def schedule():
+            self.root.after(self.config["server_poll_seconds"] * 1000, self._poll_server)
+        
+        def on_done(feed):
+            self._server_error = None
+            if self.store.apply_feed(feed):
+                self.refresh_table()
+            schedule()
+        
+        def on_error(e):
+            self._server_error = e
+            schedule()
+        
+        BackgroundTask(
+            self.root, lambda task: self.store.fetch_changes(),
+            on_done=on_done, on_error=on_error, name="poll-server"
+        ).start()
+    
+    def flush_store(self):
+        """等待修改写入磁盘, 失败时提示并返回False"""
+        try:
+            self.store.flush()
         except Exception as e:
-            messagebox.showerror("导入失败", f"导入数据时发生错误:\n{str(e)}")
+            messagebox.showerror("保存失败", f"修改未能写入磁盘:\n{str(e)}")
+            return False
+        return True
+    
+    def require_loaded(self):
+        """数据加载完成前不能修改记录, 提示稍候"""
+        if not self.loaded:
+            messagebox.showinfo("提示", "数据正在加载, 请稍候...")
+        return self.loaded
+    
+    def start_loading(self):
+        """在后台加载数据并建立索引, 窗口先显示出来
+        
+        记录读入后立即显示第一屏, 搜索索引和统计建立完成后才允许修改记录.
+        """
+        def on_progress(done, total, text):
+            self.search_status.configure(text=text)
+            if done == 1:
+                with self.timer.phase("显示第一屏记录"):
+                    self.table.reload()
+                    self.root.update_idletasks()
+        
+        def on_done(result):
+            self.loaded = True
+            self.timer.mark("加载完成, 可以操作")
+            if self._load_warning is not None:
+                messagebox.showwarning("数据文件损坏", self._load_warning)
+            self.search_status.configure(text="")
+            self.apply_search(keep_position=True)
+            self.timer.report()
+            self.compute_image_hashes()
+            if self.core.snapshot_due():
+                self.create_snapshot("定时备份", quiet=True)
+            if self.core.remote:
+                self.root.after(self.config["server_poll_seconds"] * 1000, self._poll_server)
+        
+        def on_error(e):
+            self.search_status.configure(text="加载失败")
+            messagebox.showerror("加载失败", f"加载数据时发生错误:\n{str(e)}")
+            self.timer.report()
+        
+        BackgroundTask(
+            self.root, self._load_in_background,
+            on_done=on_done, on_error=on_error, on_progress=on_progress, name="load"
+        ).start()
+    
+    def _load_in_background(self, task):
+        """工作线程: 加载记录, 建立搜索索引和统计
+        
+        建立期间界面不允许修改记录, 所以索引不会错过任何修改.
+        """
+        with self.timer.phase("加载数据"), self.perf.operation("load") as op:
+            self.load_data()
+            op.records = self.store.count()
+            op.nbytes = file_size(self.store_file())
+        task.report(1, 4, f"已加载 {self.store.count()} 条记录, 正在建立搜索索引...")
+        with self.timer.phase("建立搜索索引"):
+            self.search_index.attach(self.store)
+        task.report(2, 4, "正在统计...")
+        with self.timer.phase("统计"):
+            self.stats.attach(self.store)
+        task.report(3, 4, "正在建立相似图片索引...")
+        with self.timer.phase("建立相似图片索引"):
+            self.similarity.attach(self.store)
     
-    def save_data(self):
-        """保存数据到JSON文件"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.records, f, ensure_ascii=False, indent=2)
+    def store_file(self):
+        """数据所在的文件 (服务器模式下为None)"""
+        if self.core.remote:
+            return None
+        if self.config["storage"] == "sqlite":
+            return self.config["database_file"]
+        return self.data_file
     
     def load_data(self):
-        """从JSON文件加载数据"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.records = json.load(f)
-            except Exception as e:
-                print(f"加载数据失败: {e}")
-                self.records = []
-        else:
-            self.records = []
+        """打开数据存储 (在工作线程中调用)
+        
+        JSON数据文件无法解析时改名为 .corrupt 保留, 以空数据重新开始, 加载完成后提示;
+        其他错误 (文件被占用、SQLite数据库损坏等) 不动任何文件, 直接抛出, 由加载失败的提示显示.
+        """
+        try:
+            self.store.load()
+        except ValueError as e:
+            data_file = self.store_file()
+            if self.core.remote or self.config["storage"] != "json" or not os.path.exists(data_file):
+                raise
+            corrupt_path = data_file + ".corrupt"
+            os.replace(data_file, corrupt_path)
+            self.perf.logger.error("load %s failed, moved to %s: %s", data_file, corrupt_path, e)
+            self._load_warning = f"数据文件无法解析, 已改名为 {corrupt_path} 保留, 以空数据重新开始:\n{str(e)}"
+            self.store.load()
 
 
 def main():
     """主函数"""
-    root = tk.Tk()
-    app = RejectionManagementSystem(root)
+    timer = StartupTimer(_STARTED)
+    timer.add("导入模块", _STARTED, _IMPORTED)
+    with timer.phase("创建窗口"):
+        root = tk.Tk()
+    with timer.phase("创建界面"):
+        app = RejectionManagementSystem(root, timer)
     root.mainloop()
 
 
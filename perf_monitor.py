@@ -0,0 +1,231 @@
+"""
+性能记录
+记录加载、保存、刷新、上传、查看、导入、导出等操作的耗时、记录数和读写的字节数:
+内存中按操作保留最近的耗时 (用于 p50/p95 和直方图), 同时写入滚动的日志文件;
+可以对接下来的N次操作启用 cProfile 分析
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import cProfile
+import io
+import logging
+import math
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+
+# 每种操作在内存中保留的最近耗时个数
+ROLLING_WINDOW = 1000
+
+# 直方图各档的上限 (毫秒), 最后一档为更长的耗时
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# 分析结果在日志中列出的函数个数
+PROFILE_TOP_FUNCTIONS = 20
+
+LOGGER_NAME = "rejection.perf"
+
+
+def percentile(sorted_values, fraction):
+    """已排序序列的百分位数 (最近秩)"""
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def file_size(path):
+    """文件大小, 不存在时为0"""
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+class Operation:
+    """一次操作, 在 with 块中可以补充处理的记录数和字节数"""
+
+    def __init__(self, name, records=0, nbytes=0):
+        self.name = name
+        self.records = records
+        self.nbytes = nbytes
+        self.seconds = 0.0
+        self.error = None
+
+
+class OperationStats:
+    """一种操作的统计: 最近的耗时和累计次数"""
+
+    def __init__(self):
+        self.recent = deque(maxlen=ROLLING_WINDOW)
+        self.count = 0
+        self.errors = 0
+        self.last = None
+
+    def summary(self):
+        durations = sorted(seconds for seconds, _, _ in self.recent)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "p50": percentile(durations, 0.50),
+            "p95": percentile(durations, 0.95),
+            "max": durations[-1] if durations else 0.0,
+            "last": self.last,
+        }
+
+    def histogram(self):
+        """最近耗时在各档中的个数, 比 HISTOGRAM_BOUNDS_MS 多一档"""
+        counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        for seconds, _, _ in self.recent:
+            ms = seconds * 1000
+            k = 0
+            while k < len(HISTOGRAM_BOUNDS_MS) and ms > HISTOGRAM_BOUNDS_MS[k]:
+                k += 1
+            counts[k] += 1
+        return counts
+
+
+class PerfMonitor:
+    """操作计时
+
+    用法:
+        with monitor.operation("export", records=n) as op:
+            ...
+            op.nbytes = 写出的字节数
+
+    可以在任意线程中使用. profile_next(n) 之后的n次操作在 cProfile 下运行,
+    结果保存为 .prof 文件并把耗时最多的函数写入日志 (同一时间只分析一个操作).
+    """
+
+    def __init__(self, log_file=None, max_bytes=1024 * 1024, backups=3, profile_dir="profiles"):
+        self.profile_dir = profile_dir
+        self.version = 0
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._profile_remaining = 0
+        self._profiling = False
+        self.last_profile = None
+
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self._handler = None
+        if log_file:
+            try:
+                self._handler = RotatingFileHandler(
+                    log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True
+                )
+            except OSError as e:
+                self.logger.warning("open perf log %s failed: %s", log_file, e)
+            else:
+                self._handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                self.logger.addHandler(self._handler)
+
+    def close(self):
+        if self._handler is not None:
+            self.logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+    # ------------------------------------------------------------------
+    # 记录
+    # ------------------------------------------------------------------
+    @contextmanager
+    def operation(self, name, records=0, nbytes=0):
+        op = Operation(name, records, nbytes)
+        profiler = self._start_profile()
+        start = time.perf_counter()
+        try:
+            yield op
+        except BaseException as e:
+            op.error = e
+            raise
+        finally:
+            op.seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._save_profile(op, profiler)
+            self._record(op)
+
+    def _record(self, op):
+        with self._lock:
+            stats = self._stats.get(op.name)
+            if stats is None:
+                stats = self._stats[op.name] = OperationStats()
+            stats.recent.append((op.seconds, op.records, op.nbytes))
+            stats.count += 1
+            stats.last = op.seconds
+            if op.error is not None:
+                stats.errors += 1
+            self.version += 1
+
+        status = "ok" if op.error is None else f"error={type(op.error).__name__}: {op.error}"
+        self.logger.info(
+            "%s %.1fms records=%d bytes=%d thread=%s %s",
+            op.name, op.seconds * 1000, op.records or 0, op.nbytes or 0,
+            threading.current_thread().name, status,
+        )
+
+    def operations(self):
+        """[(操作, 统计摘要)] 按操作名称排序"""
+        with self._lock:
+            return [(name, stats.summary()) for name, stats in sorted(self._stats.items())]
+
+    def histogram(self, name):
+        with self._lock:
+            stats = self._stats.get(name)
+            return stats.histogram() if stats is not None else [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.version += 1
+
+    # ------------------------------------------------------------------
+    # cProfile
+    # ------------------------------------------------------------------
+    def profile_next(self, count):
+        """对接下来的count次操作启用分析 (0 为取消)"""
+        with self._lock:
+            self._profile_remaining = max(0, int(count))
+            self.version += 1
+        self.logger.info("profile next %d operations", self._profile_remaining)
+
+    @property
+    def profile_remaining(self):
+        return self._profile_remaining
+
+    def _start_profile(self):
+        with self._lock:
+            if self._profile_remaining <= 0 or self._profiling:
+                return None
+            self._profile_remaining -= 1
+            self._profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _save_profile(self, op, profiler):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(
+                self.profile_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{op.name}.prof"
+            )
+            profiler.dump_stats(path)
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            self.logger.info("profile %s %.1fms saved to %s\n%s", op.name, op.seconds * 1000, path, text.getvalue())
+            self.last_profile = path
+        except OSError as e:
+            self.logger.info("profile %s failed: %s", op.name, e)
+        finally:
+            with self._lock:
+                self._profiling = False
+                self.version += 1
@@ -0,0 +1,165 @@
+"""
+性能面板 (开发者用, 按F12打开)
+显示各操作最近耗时的 p50/p95 和直方图, 并可对接下来的N次操作启用 cProfile 分析
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+from perf_monitor import HISTOGRAM_BOUNDS_MS
+
+
+# 检查数据是否变化的间隔 (毫秒)
+REFRESH_INTERVAL_MS = 1000
+
+# 直方图条的最大长度 (字符数)
+BAR_LENGTH = 40
+
+# 操作名称 -> 显示名称
+OPERATION_NAMES = {
+    "load": "加载",
+    "save": "保存",
+    "refresh": "刷新表格",
+    "search": "搜索",
+    "add": "添加记录",
+    "edit": "修改记录",
+    "delete": "删除记录",
+    "upload": "上传图片",
+    "view": "查看图片 (解码)",
+    "import": "导入 (读取)",
+    "import_apply": "导入 (写入)",
+    "export": "导出",
+    "export_delta": "增量导出",
+    "snapshot": "创建快照",
+    "restore": "恢复快照",
+}
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.1f}" if seconds is not None else ""
+
+
+def histogram_labels():
+    labels = []
+    lower = 0
+    for bound in HISTOGRAM_BOUNDS_MS:
+        labels.append(f"{lower}-{bound} ms")
+        lower = bound
+    labels.append(f"> {lower} ms")
+    return labels
+
+
+class PerfPanel:
+    """性能面板窗口 (同一时间只保留一个)"""
+
+    def __init__(self, root, monitor):
+        self.root = root
+        self.monitor = monitor
+        self.window = None
+        self.tree = None
+        self._version = None
+
+    def is_open(self):
+        return self.window is not None and self.window.winfo_exists()
+
+    def show(self):
+        if self.is_open():
+            self.window.lift()
+            return
+        self._create_window()
+        self.refresh()
+        self.window.after(REFRESH_INTERVAL_MS, self._poll)
+
+    def _create_window(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.title("性能")
+        self.window.geometry("720x560")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = ("count", "errors", "p50", "p95", "max", "last")
+        self.tree = ttk.Treeview(main_frame, columns=columns, show="tree headings", height=10)
+        self.tree.heading("#0", text="操作")
+        self.tree.column("#0", width=160, anchor=tk.W)
+        for column, text in zip(columns, ("次数", "出错", "p50 (ms)", "p95 (ms)", "最长 (ms)", "最近 (ms)")):
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=85, anchor=tk.CENTER)
+        self.tree.pack(fill=tk.X)
+        self.tree.bind("<<TreeviewSelect>>", lambda e: self._show_histogram())
+
+        ttk.Label(main_frame, text="最近耗时分布 (选中的操作):").pack(anchor=tk.W, pady=(10, 2))
+        self.histogram = tk.Text(main_frame, height=14, font=("Consolas", 9), state="disabled")
+        self.histogram.pack(fill=tk.BOTH, expand=True)
+
+        profile_frame = ttk.Frame(main_frame)
+        profile_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Label(profile_frame, text="用 cProfile 分析接下来的").pack(side=tk.LEFT)
+        self.profile_count = tk.StringVar(value="5")
+        ttk.Spinbox(profile_frame, from_=1, to=100, width=5, textvariable=self.profile_count).pack(side=tk.LEFT, padx=5)
+        ttk.Label(profile_frame, text="次操作").pack(side=tk.LEFT)
+        ttk.Button(profile_frame, text="开始", command=self.start_profile).pack(side=tk.LEFT, padx=5)
+        ttk.Button(profile_frame, text="取消", command=lambda: self.monitor.profile_next(0)).pack(side=tk.LEFT)
+        ttk.Button(profile_frame, text="清空统计", command=self.monitor.reset).pack(side=tk.RIGHT)
+
+        self.profile_status = ttk.Label(main_frame, text="", foreground="gray")
+        self.profile_status.pack(anchor=tk.W, pady=(5, 0))
+
+    def start_profile(self):
+        try:
+            count = int(self.profile_count.get())
+        except ValueError:
+            return
+        self.monitor.profile_next(count)
+
+    def refresh(self):
+        if not self.is_open():
+            return
+        self._version = self.monitor.version
+        selected = self.tree.selection()
+        self.tree.delete(*self.tree.get_children())
+        for name, summary in self.monitor.operations():
+            self.tree.insert("", tk.END, iid=name, text=OPERATION_NAMES.get(name, name), values=(
+                summary["count"], summary["errors"], format_ms(summary["p50"]),
+                format_ms(summary["p95"]), format_ms(summary["max"]), format_ms(summary["last"]),
+            ))
+        selected = [item for item in selected if self.tree.exists(item)]
+        if selected:
+            self.tree.selection_set(selected)
+        self._show_histogram()
+
+        status = ""
+        if self.monitor.profile_remaining:
+            status = f"还将分析 {self.monitor.profile_remaining} 次操作"
+        if self.monitor.last_profile:
+            status += ("; " if status else "") + f"最近的分析结果: {self.monitor.last_profile}"
+        self.profile_status.configure(text=status)
+
+    def _show_histogram(self):
+        selected = self.tree.selection()
+        lines = []
+        if selected:
+            counts = self.monitor.histogram(selected[0])
+            peak = max(counts) or 1
+            for label, count in zip(histogram_labels(), counts):
+                bar = "█" * round(count * BAR_LENGTH / peak)
+                lines.append(f"{label:>14} {count:6d} {bar}")
+        self.histogram.configure(state="normal")
+        self.histogram.delete("1.0", tk.END)
+        self.histogram.insert("1.0", "\n".join(lines))
+        self.histogram.configure(state="disabled")
+
+    def _poll(self):
+        if not self.is_open():
+            return
+        if self.monitor.version != self._version:
+            self.refresh()
+        self.window.after(REFRESH_INTERVAL_MS, self._poll)
+
+    def close(self):
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
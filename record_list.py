@@ -0,0 +1,184 @@
+"""
+按位置和按ID都能快速访问的记录列表
+记录保存在槽位中, 删除只把槽位置空 (不移动后面的记录), 另有 ID -> 槽位 的索引;
+有空槽时用树状数组 (Fenwick tree) 统计每个槽位之前的有效记录数, 位置与槽位
+互相换算为 O(log N). 空槽超过一定比例时整理一次.
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+from array import array
+
+from repository import ID_FIELD
+
+
+# 空槽至少这么多、且超过有效记录数的 1/4 时整理
+MIN_HOLES_TO_COMPACT = 1024
+
+
+class RecordList:
+    """记录列表, 支持 len / 按位置取值和切片 / 遍历 / append / 按位置赋值和删除
+
+    与 list 的区别: 每条记录必须有唯一的ID, 可以按ID取得记录 (by_id) 和它的
+    位置 (index_of_id); 删除和按ID定位的代价与记录总数无关. 非线程安全,
+    由存储的锁保护.
+    """
+
+    def __init__(self, records=()):
+        self._slots = list(records)
+        self._slot_of = {record[ID_FIELD]: slot for slot, record in enumerate(self._slots)}
+        if len(self._slot_of) != len(self._slots):
+            raise ValueError("记录ID重复")
+        self._holes = 0
+        # 树状数组 (下标从1开始), 只在有空槽时存在
+        self._tree = None
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+    def __len__(self):
+        return len(self._slots) - self._holes
+
+    def __iter__(self):
+        if not self._holes:
+            return iter(self._slots)
+        return (record for record in self._slots if record is not None)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("不支持步长")
+            return self._range(start, stop - start)
+        return self._slots[self._slot_at(index)]
+
+    def _range(self, start, limit):
+        if limit <= 0:
+            return []
+        if not self._holes:
+            return self._slots[start:start + limit]
+        result = []
+        slot = self._find(start)
+        slots = self._slots
+        while slot < len(slots) and len(result) < limit:
+            if slots[slot] is not None:
+                result.append(slots[slot])
+            slot += 1
+        return result
+
+    def has_id(self, record_id):
+        return record_id in self._slot_of
+
+    def ids(self):
+        """全部记录ID (顺序不定)"""
+        return self._slot_of.keys()
+
+    def by_id(self, record_id):
+        """按ID取得记录, 不存在时返回None"""
+        slot = self._slot_of.get(record_id)
+        return None if slot is None else self._slots[slot]
+
+    def index_of_id(self, record_id):
+        """按ID取得记录的位置, 不存在时返回None"""
+        slot = self._slot_of.get(record_id)
+        if slot is None:
+            return None
+        return slot if not self._holes else self._prefix(slot)
+
+    # ------------------------------------------------------------------
+    # 修改
+    # ------------------------------------------------------------------
+    def append(self, record):
+        record_id = record[ID_FIELD]
+        if record_id in self._slot_of:
+            raise ValueError(f"记录ID重复: {record_id}")
+        slot = len(self._slots)
+        self._slots.append(record)
+        self._slot_of[record_id] = slot
+        if self._tree is not None:
+            # 新节点 i 覆盖 (i - lowbit(i), i], 其中只有新槽位是它自己
+            i = slot + 1
+            self._tree.append(1 + self._prefix(slot) - self._prefix(i - (i & -i)))
+
+    def __setitem__(self, index, record):
+        slot = self._slot_at(index)
+        old_id = self._slots[slot][ID_FIELD]
+        if record[ID_FIELD] != old_id:
+            if record[ID_FIELD] in self._slot_of:
+                raise ValueError(f"记录ID重复: {record[ID_FIELD]}")
+            del self._slot_of[old_id]
+            self._slot_of[record[ID_FIELD]] = slot
+        self._slots[slot] = record
+
+    def __delitem__(self, index):
+        slot = self._slot_at(index)
+        record = self._slots[slot]
+        del self._slot_of[record[ID_FIELD]]
+        if slot == len(self._slots) - 1:
+            # 删除最后一条不留空槽
+            self._slots.pop()
+            if self._tree is not None:
+                self._tree.pop()
+            return
+        if self._tree is None:
+            self._build_tree()
+        self._slots[slot] = None
+        self._holes += 1
+        i = slot + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] -= 1
+            i += i & -i
+        if self._holes >= MIN_HOLES_TO_COMPACT and self._holes * 4 > len(self):
+            self._compact()
+
+    # ------------------------------------------------------------------
+    # 槽位
+    # ------------------------------------------------------------------
+    def _slot_at(self, index):
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("记录位置超出范围")
+        return index if not self._holes else self._find(index)
+
+    def _build_tree(self):
+        size = len(self._slots)
+        tree = array('q', [0]) * (size + 1)
+        for i in range(1, size + 1):
+            tree[i] = i & -i
+        self._tree = tree
+
+    def _prefix(self, slot):
+        """槽位 slot 之前的有效记录数"""
+        total = 0
+        i = slot
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _find(self, index):
+        """第 index 条 (从0开始) 有效记录所在的槽位; index 等于记录数时返回槽位总数"""
+        if index >= len(self):
+            return len(self._slots)
+        tree = self._tree
+        size = len(tree) - 1
+        slot = 0
+        remaining = index + 1
+        step = 1 << size.bit_length()
+        while step:
+            nxt = slot + step
+            if nxt <= size and tree[nxt] < remaining:
+                slot = nxt
+                remaining -= tree[nxt]
+            step >>= 1
+        return slot
+
+    def _compact(self):
+        self._slots = [record for record in self._slots if record is not None]
+        self._slot_of = {record[ID_FIELD]: slot for slot, record in enumerate(self._slots)}
+        self._holes = 0
+        self._tree = None
@@ -0,0 +1,249 @@
+"""
+紧凑的记录表示
+JSON存储在内存中保存全部记录, 每条记录一个字典 (十个字符串) 占用较多内存.
+CompactRecord 用 __slots__ 保存各字段, 重复出现的字符串 (拒签原因、图片路径、
+呼号) 只保留一份, 申请时间/创建时间/修改时间保存为整数; 对外仍是只读的映射,
+与原来的字典按相同的键顺序相互转换, 序列化结果与原JSON格式完全一致
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import sys
+from collections.abc import Mapping
+from datetime import date
+
+from repository import ID_FIELD, IMAGE_FIELDS, MODIFIED_FIELD, REV_FIELD
+
+
+# 保存在槽中的字段, 其余字段放在 _extra 字典中
+SLOT_FIELDS = (
+    "callsign", "apply_time", "create_time", "rejection_reason",
+) + IMAGE_FIELDS + (ID_FIELD, MODIFIED_FIELD, REV_FIELD)
+
+# 重复较多、值得共享的字段
+INTERNED_FIELDS = frozenset(("callsign", "rejection_reason") + IMAGE_FIELDS)
+
+# 保存为整数的时间字段
+TIME_FIELDS = frozenset(("apply_time", "create_time", MODIFIED_FIELD))
+
+# 字段 -> 存入槽时的处理方式, 不在其中的字段放入 _extra
+_PLAIN, _INTERN, _TIME = 0, 1, 2
+_FIELD_KINDS = {
+    field: _TIME if field in TIME_FIELDS else _INTERN if field in INTERNED_FIELDS else _PLAIN
+    for field in SLOT_FIELDS
+}
+
+# 字段顺序 -> 共享的键元组 (绝大多数记录的键顺序相同)
+_layouts = {}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# 时间格式编号 (整数的低3位)
+_DATE = 1           # 2025-11-18
+_MINUTE = 2         # 2025-11-18 10:00
+_SECOND = 3         # 2025-11-18 10:00:00
+_MICROSECOND = 4    # 2025-11-18T10:00:00.000000Z (修改时间)
+_FORMAT_BITS = 3
+
+# (长度, 日期与时间之间的分隔符) -> 格式编号
+_FORMATS = {(10, None): _DATE, (16, " "): _MINUTE, (19, " "): _SECOND, (27, "T"): _MICROSECOND}
+
+# 两位数字 -> 值; 查表同时保证了格式 (只接受两位ASCII数字)
+_HOURS = {f"{h:02d}": h * 3600 for h in range(24)}
+_MINUTES = {f"{m:02d}": m * 60 for m in range(60)}
+_SECONDS = {f"{s:02d}": s for s in range(60)}
+
+# 还原时使用的文本: 一天中的第几分钟 -> " HH:MM", 秒 -> ":SS"
+_MINUTE_TEXT = [f" {m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)]
+_SECOND_TEXT = [f":{s:02d}" for s in range(60)]
+
+# 日期部分 "YYYY-MM-DD" -> 距1970-01-01的天数 (None为无效); 天数 -> 日期部分
+# 记录的日期集中在几年之内, 两个缓存都很小
+_days_of = {}
+_date_text = {}
+
+
+def _parse_days(text):
+    days = _days_of.get(text)
+    if days is None and text not in _days_of:
+        if text[4] == "-" and text[7] == "-" and text[:4].isdigit() and text[:4].isascii() \
+                and text[5:7] in _SECONDS and text[8:10] in _SECONDS:
+            try:
+                days = date(int(text[:4]), int(text[5:7]), int(text[8:10])).toordinal() - _EPOCH_ORDINAL
+            except ValueError:
+                days = None
+        _days_of[text] = days
+    return days
+
+
+def encode_time(text):
+    """时间字符串 -> 整数 (秒或微秒 << 3 | 格式编号)
+
+    只接受能原样还原的写法, 其他值 (手工填写的不规范时间等) 原样返回.
+    """
+    if type(text) is not str:
+        return text
+    fmt = _FORMATS.get((len(text), text[10] if len(text) > 10 else None))
+    if fmt is None:
+        return text
+    days = _parse_days(text[:10])
+    if days is None:
+        return text
+    seconds = days * 86400
+    if fmt == _DATE:
+        return (seconds << _FORMAT_BITS) | fmt
+    hours = _HOURS.get(text[11:13])
+    minutes = _MINUTES.get(text[14:16])
+    if hours is None or minutes is None or text[13] != ":":
+        return text
+    seconds += hours + minutes
+    if fmt == _MINUTE:
+        return (seconds << _FORMAT_BITS) | fmt
+    secs = _SECONDS.get(text[17:19])
+    if secs is None or text[16] != ":":
+        return text
+    seconds += secs
+    if fmt == _SECOND:
+        return (seconds << _FORMAT_BITS) | fmt
+    micro = text[20:26]
+    if text[19] != "." or text[26] != "Z" or not (micro.isdigit() and micro.isascii()):
+        return text
+    return ((seconds * 1000000 + int(micro)) << _FORMAT_BITS) | fmt
+
+
+def decode_time(value):
+    """encode_time 的逆变换"""
+    fmt = value & ((1 << _FORMAT_BITS) - 1)
+    value >>= _FORMAT_BITS
+    micro = 0
+    if fmt == _MICROSECOND:
+        value, micro = divmod(value, 1000000)
+    days, seconds = divmod(value, 86400)
+    text = _date_text.get(days)
+    if text is None:
+        d = date.fromordinal(days + _EPOCH_ORDINAL)
+        text = _date_text[days] = f"{d.year:04d}-{d.month:02d}-{d.day:02d}"
+    if fmt == _DATE:
+        return text
+    minutes, seconds = divmod(seconds, 60)
+    if fmt == _MINUTE:
+        return text + _MINUTE_TEXT[minutes]
+    if fmt == _SECOND:
+        return text + _MINUTE_TEXT[minutes] + _SECOND_TEXT[seconds]
+    return f"{text}T{minutes // 60:02d}:{minutes % 60:02d}:{seconds:02d}.{micro:06d}Z"
+
+
+class CompactRecord(Mapping):
+    """只读的紧凑记录
+
+    与字典一样支持 record["callsign"]、record.get()、dict(record)、{**record};
+    修改记录时用 replace() 得到新对象. 编码JSON时使用 json_default.
+    """
+
+    __slots__ = SLOT_FIELDS + ("_keys", "_extra")
+
+    def __getitem__(self, key):
+        if key in _FIELD_KINDS:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                pass
+            else:
+                if type(value) is int and _FIELD_KINDS[key] == _TIME:
+                    return decode_time(value)
+                return value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __eq__(self, other):
+        if type(other) is CompactRecord:
+            if self is other:
+                return True
+            # 不同记录的ID几乎总是不同, 先比较ID (list.index 等逐个比较时很快)
+            if getattr(self, ID_FIELD, None) != getattr(other, ID_FIELD, None):
+                return False
+            return self._keys == other._keys and self.to_dict() == other.to_dict()
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"CompactRecord({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return compact_record, (self.to_dict(),)
+
+    def to_dict(self):
+        """转换为原来的记录字典 (键的顺序不变)"""
+        result = {}
+        extra = self._extra or {}
+        for key in self._keys:
+            if key in extra:
+                result[key] = extra[key]
+                continue
+            value = getattr(self, key)
+            if type(value) is int and _FIELD_KINDS[key] == _TIME:
+                value = decode_time(value)
+            result[key] = value
+        return result
+
+    def replace(self, fields):
+        """返回修改了部分字段的新记录"""
+        return compact_record({**self.to_dict(), **fields})
+
+
+def compact_record(record):
+    """记录字典 -> CompactRecord"""
+    if isinstance(record, CompactRecord):
+        return record
+    obj = CompactRecord.__new__(CompactRecord)
+    keys = tuple(record)
+    obj._keys = _layouts.setdefault(keys, keys)
+    extra = None
+    for key, value in record.items():
+        kind = _FIELD_KINDS.get(key)
+        if kind == _TIME and type(value) is str:
+            setattr(obj, key, encode_time(value))
+        elif kind == _INTERN and type(value) is str:
+            setattr(obj, key, sys.intern(value))
+        elif kind is not None and (kind != _TIME or value is None):
+            setattr(obj, key, value)
+        else:
+            # 包括非字符串的时间值 (槽中的整数总是表示编码后的时间)
+            if extra is None:
+                extra = {}
+            extra[key] = value
+    obj._extra = extra
+    return obj
+
+
+def json_object_hook(obj):
+    """json.loads 的 object_hook: 记录在解析时就转为紧凑形式, 不必先保留整份字典列表"""
+    if "callsign" in obj:
+        return compact_record(obj)
+    return obj
+
+
+def json_default(obj):
+    """json.dumps 的 default: 把 CompactRecord 编码为原来的字典"""
+    if isinstance(obj, CompactRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
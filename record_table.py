@@ -0,0 +1,241 @@
+"""
+虚拟化记录表格
+Treeview中只保留当前可见的若干行, 滚动时按需从存储取数据;
+单条增删改只更新受影响的可见行, 代价与记录总数无关
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+from functools import lru_cache
+
+from repository import ID_FIELD
+
+
+# 拒签原因在表格中最多显示的字数
+REASON_PREVIEW_LENGTH = 50
+
+
+@lru_cache(maxsize=4096)
+def _format_values(callsign, apply_time, has_license, has_operator, has_screenshot, reason):
+    return (
+        callsign,
+        apply_time,
+        "✓" if has_license else "✗",
+        "✓" if has_operator else "✗",
+        "✓" if has_screenshot else "✗",
+        reason[:REASON_PREVIEW_LENGTH] + "..." if len(reason) > REASON_PREVIEW_LENGTH else reason,
+    )
+
+
+def format_row(record):
+    """记录 -> 表格各列的显示值 (结果有缓存, 刷新时不重复拼接)"""
+    return _format_values(
+        record["callsign"],
+        record["apply_time"],
+        bool(record.get("license_image")),
+        bool(record.get("operator_image")),
+        bool(record.get("screenshot_image")),
+        record.get("rejection_reason", ""),
+    )
+
+
+class VirtualTable:
+    """把 ttk.Treeview 变成只显示窗口内记录的虚拟表格
+
+    offset 为窗口第一行在全部记录中的位置, 每行的 text 为 位置+1 (序号).
+    每行的 iid 为记录ID, 选中的行跟随记录 (前面增删记录、滚动后仍选中同一条),
+    按行取记录不依赖序号. 滚动条由本类根据 offset/总数 自行维护, Treeview 本身不再滚动.
+    store 只需提供 count/page/get, 也可以是搜索结果 (见 set_source).
+    """
+
+    def __init__(self, tree, scrollbar, store):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.store = store
+        self.offset = 0
+        self.rows = max(1, int(tree.cget("height")))
+        # 窗口中各行的 iid (记录ID), 以及 iid -> 记录
+        self.items = []
+        self._shown = {}
+
+        self.scrollbar.configure(command=self._on_scrollbar)
+        self.tree.configure(yscrollcommand="")
+
+        self.tree.bind("<Configure>", self._on_resize, add="+")
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_units(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_units(3))
+        self.tree.bind("<Up>", lambda e: self._on_arrow(-1))
+        self.tree.bind("<Down>", lambda e: self._on_arrow(1))
+        self.tree.bind("<Prior>", lambda e: self._scroll_units(-self.rows) or "break")
+        self.tree.bind("<Next>", lambda e: self._scroll_units(self.rows) or "break")
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0) or "break")
+        self.tree.bind("<End>", lambda e: self.scroll_to(self.store.count()) or "break")
+
+    # ------------------------------------------------------------------
+    # 渲染
+    # ------------------------------------------------------------------
+    def reload(self):
+        """按当前位置重新取数并刷新窗口内的行"""
+        self._clamp_offset()
+        self._render_from(self.offset)
+
+    def scroll_to(self, offset):
+        """滚动到指定位置"""
+        self.offset = offset
+        self.reload()
+
+    def set_source(self, store, offset=0):
+        """切换显示的数据 (全部记录或搜索结果) 并滚动到offset"""
+        self.store = store
+        self.tree.selection_set(())
+        self.scroll_to(offset)
+
+    def index_of(self, item):
+        """表格行 -> 记录位置 (在当前显示的数据中)"""
+        return self.offset + self.items.index(item)
+
+    def selected_record(self):
+        """选中的记录 (多选时为第一条), 没有选中时返回None"""
+        selected = self.tree.selection()
+        return self._shown.get(selected[0]) if selected else None
+
+    def _clamp_offset(self):
+        total = self.store.count()
+        self.offset = max(0, min(self.offset, total - self.rows))
+
+    def _render_from(self, index):
+        """从记录位置index起重新取数, 只改写窗口中该位置之后的行
+
+        仍在窗口中的记录保留原来的行 (只移动并更新显示), 选中状态随之保留.
+        """
+        start = max(index, self.offset) - self.offset
+        records = self.store.page(self.offset + start, self.rows - start)
+        new_items = [record[ID_FIELD] for record in records]
+
+        # 先删除不再显示的行, 以免与移入窗口的记录的 iid 冲突
+        keep = set(new_items)
+        gone = [item for item in self.items[start:] if item not in keep]
+        if gone:
+            self.tree.delete(*gone)
+            for item in gone:
+                del self._shown[item]
+        del self.items[start:]
+
+        for k, record in enumerate(records, start):
+            item = record[ID_FIELD]
+            text = str(self.offset + k + 1)
+            if item in self._shown:
+                self.tree.move(item, "", k)
+                self.tree.item(item, text=text, values=format_row(record))
+            else:
+                self.tree.insert("", k, iid=item, text=text, values=format_row(record))
+            self._shown[item] = record
+        self.items.extend(new_items)
+        self._update_scrollbar()
+
+    def _renumber(self):
+        for k, item in enumerate(self.items):
+            self.tree.item(item, text=str(self.offset + k + 1))
+
+    def _update_scrollbar(self):
+        total = self.store.count()
+        if total == 0:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + len(self.items)) / total)
+
+    # ------------------------------------------------------------------
+    # 增量更新
+    # ------------------------------------------------------------------
+    def row_inserted(self, index):
+        """位置index处插入了一条记录"""
+        if index < self.offset:
+            # 窗口前插入, 保持显示同样的记录, 只更新序号
+            self.offset += 1
+            self._renumber()
+            self._update_scrollbar()
+        elif index < self.offset + self.rows:
+            self._render_from(index)
+        else:
+            self._update_scrollbar()
+
+    def row_deleted(self, index):
+        """位置index处的记录被删除"""
+        if index < self.offset:
+            self.offset -= 1
+            self._renumber()
+            self._update_scrollbar()
+        elif index < self.offset + len(self.items):
+            k = index - self.offset
+            item = self.items.pop(k)
+            self.tree.delete(item)
+            del self._shown[item]
+            if self.offset > 0 and self.offset + self.rows > self.store.count():
+                # 已经滚动到末尾, 向上补一行
+                self.offset -= 1
+                self.reload()
+            else:
+                self._renumber()
+                self._render_from(self.offset + len(self.items))
+        else:
+            self._update_scrollbar()
+
+    def record_updated(self, record):
+        """记录被修改 (不在窗口中时什么也不做)"""
+        item = record[ID_FIELD]
+        if item in self._shown:
+            self._shown[item] = record
+            self.tree.item(item, values=format_row(record))
+
+    def record_deleted(self, record_id):
+        """记录被删除: 在窗口中时按它的位置删除该行, 否则保持当前位置重新取数"""
+        if record_id in self._shown:
+            self.row_deleted(self.index_of(record_id))
+        else:
+            self.reload()
+
+    # ------------------------------------------------------------------
+    # 滚动
+    # ------------------------------------------------------------------
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.store.count()))
+        elif action == "scroll":
+            step = self.rows if unit == "pages" else 1
+            self._scroll_units(int(amount) * step)
+
+    def _scroll_units(self, delta):
+        self.scroll_to(self.offset + delta)
+
+    def _on_mousewheel(self, event):
+        self._scroll_units(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_arrow(self, delta):
+        """方向键移动到窗口边缘时滚动窗口"""
+        focus = self.tree.focus()
+        if not focus or focus not in self.items:
+            return None
+        k = self.items.index(focus) + delta
+        if 0 <= k < len(self.items):
+            return None
+        old_offset = self.offset
+        self._scroll_units(delta)
+        if self.offset != old_offset:
+            item = self.items[0] if delta < 0 else self.items[-1]
+            self.tree.focus(item)
+            self.tree.selection_set(item)
+        return "break"
+
+    def _on_resize(self, event):
+        """窗口大小变化时重新计算可见行数"""
+        if not self.items:
+            return
+        bbox = self.tree.bbox(self.items[0])
+        if not bbox:
+            return
+        rows = max(1, (event.height - bbox[1]) // bbox[3])
+        if rows != self.rows:
+            self.rows = rows
+            self.reload()
@@ -0,0 +1,159 @@
+"""
+拒签统计
+按拒签原因、申请月份、呼号前缀和地区汇总的计数器, 随存储的每次修改增量更新,
+打开统计窗口只需读取各个分组的计数, 与记录总数无关
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import re
+import threading
+from collections import Counter
+
+
+# 呼号分区数字 -> 地区
+CALLSIGN_REGIONS = {
+    "1": "北京",
+    "2": "黑龙江/吉林/辽宁",
+    "3": "天津/内蒙古/河北/山西",
+    "4": "上海/山东/江苏",
+    "5": "浙江/江西/福建",
+    "6": "安徽/河南/湖北",
+    "7": "湖南/广东/广西/海南",
+    "8": "四川/重庆/贵州/云南",
+    "9": "陕西/甘肃/宁夏/青海",
+    "0": "新疆/西藏",
+}
+
+UNKNOWN = "(未知)"
+EMPTY_REASON = "(未填写)"
+
+# 拒签原因只取第一句作为分类, 最多这么多字
+REASON_KEY_LENGTH = 20
+
+_REASON_SPLIT = re.compile(r"[，。；,.;\n\r]")
+_TRAILING_DIGITS = re.compile(r"[\s\d]+$")
+_CALLSIGN_PREFIX = re.compile(r"^([A-Z]+)(\d)")
+_MONTH = re.compile(r"^(\d{4})[-/.年](\d{1,2})")
+
+
+def reason_bucket(reason):
+    """拒签原因 -> 分类 (第一句, 去掉末尾的编号)"""
+    reason = (reason or "").strip()
+    if not reason:
+        return EMPTY_REASON
+    first = _REASON_SPLIT.split(reason, 1)[0].strip()
+    first = _TRAILING_DIGITS.sub("", first) or first
+    return first[:REASON_KEY_LENGTH] or EMPTY_REASON
+
+
+def month_bucket(apply_time):
+    """申请时间 -> YYYY-MM"""
+    match = _MONTH.match((apply_time or "").strip())
+    if not match:
+        return UNKNOWN
+    return f"{match.group(1)}-{int(match.group(2)):02d}"
+
+
+def prefix_bucket(callsign):
+    """呼号 -> 前缀 (字母部分加分区数字, 如 BH2)"""
+    match = _CALLSIGN_PREFIX.match((callsign or "").strip().upper())
+    return match.group(0) if match else UNKNOWN
+
+
+def region_bucket(callsign):
+    """呼号 -> 地区 (按分区数字)"""
+    match = _CALLSIGN_PREFIX.match((callsign or "").strip().upper())
+    return CALLSIGN_REGIONS.get(match.group(2), UNKNOWN) if match else UNKNOWN
+
+
+# 统计的维度: (名称, 记录字段, 分组函数)
+DIMENSIONS = (
+    ("reason", "rejection_reason", reason_bucket),
+    ("month", "apply_time", month_bucket),
+    ("prefix", "callsign", prefix_bucket),
+    ("region", "callsign", region_bucket),
+)
+
+
+def group_counts(value_counts, bucket):
+    """把一列各取值的计数按分组函数合并
+
+    同一原因、同一天、同一前缀的记录很多, 分组函数只需调用 "不同值的个数" 次,
+    而不是每条记录一次.
+    """
+    totals = Counter()
+    for value, count in value_counts.items():
+        totals[bucket(value)] += count
+    return totals
+
+
+class RejectionStats:
+    """各维度的拒签计数
+
+    attach() 后注册为存储的修改回调, 增删改只调整受影响的几个计数;
+    version 在每次变化后递增, 界面据此判断是否需要刷新.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.version = 0
+        self.counters = {name: Counter() for name, _, _ in DIMENSIONS}
+
+    def attach(self, store):
+        """从存储重建计数, 并注册回调跟随之后的修改"""
+        self.rebuild_from_store(store)
+        store.add_listener(self.on_change)
+
+    def detach(self, store):
+        store.remove_listener(self.on_change)
+
+    def rebuild_from_store(self, store):
+        """从头批量统计: 每个字段整列计数 (SQLite中由 GROUP BY 完成), 再按分组合并"""
+        fields = {field for _, field, _ in DIMENSIONS}
+        self._install({field: store.value_counts(field) for field in fields}, store.count())
+
+    def rebuild(self, records):
+        """从一组记录批量统计 (整体替换时)"""
+        fields = {field for _, field, _ in DIMENSIONS}
+        columns = {field: [] for field in fields}
+        for record in records:
+            for field, column in columns.items():
+                column.append(record.get(field))
+        total = len(next(iter(columns.values())))
+        self._install({field: Counter(column) for field, column in columns.items()}, total)
+
+    def _install(self, value_counts, total):
+        counters = {
+            name: group_counts(value_counts[field], bucket) for name, field, bucket in DIMENSIONS
+        }
+        with self._lock:
+            self.counters = counters
+            self.total = total
+            self.version += 1
+
+    def on_change(self, removed, added):
+        """存储修改回调; removed 为None表示整体替换"""
+        if removed is None:
+            self.rebuild(added)
+            return
+        with self._lock:
+            for sign, records in ((-1, removed), (1, added)):
+                for record in records:
+                    for name, field, bucket in DIMENSIONS:
+                        counter = self.counters[name]
+                        key = bucket(record.get(field))
+                        counter[key] += sign
+                        if counter[key] <= 0:
+                            del counter[key]
+                self.total += sign * len(records)
+            self.version += 1
+
+    def snapshot(self, name):
+        """某个维度当前的 [(分组, 数量)], 月份按时间排序, 其余按数量从多到少"""
+        with self._lock:
+            items = list(self.counters[name].items())
+        if name == "month":
+            return sorted(items)
+        return sorted(items, key=lambda item: (-item[1], item[0]))
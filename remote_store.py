@@ -0,0 +1,390 @@
+"""
+连接 server.py 的记录存储和图片库
+RemoteRepository 在本地保留一份全部记录的副本 (界面的读取、搜索和统计都不经过
+网络), 修改按记录ID和修改序号发给服务器, 之后取回服务器上的变化; 其他操作员的
+修改通过定时调用 fetch_changes() / apply_feed() 取回
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import tempfile
+import threading
+from urllib.parse import quote, urlencode, urlsplit
+
+from blob_store import BlobStore
+from record_list import RecordList
+from record_model import json_default, json_object_hook
+from repository import ID_FIELD, REV_FIELD, RecordRepository, normalize_image_path
+
+
+# 保留的空闲连接数
+MAX_IDLE_CONNECTIONS = 8
+
+# 连接在等待响应时断开后可以重发的请求方法 (重复执行没有影响)
+RETRY_METHODS = ("GET", "HEAD")
+
+
+class RemoteError(Exception):
+    """服务器返回错误或无法连接服务器"""
+
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body or {}
+
+
+class ConflictError(RemoteError):
+    """记录在服务器上已被其他操作员修改或删除"""
+
+
+class HttpClient:
+    """到服务器的HTTP连接池
+
+    连接在请求之间保持 (keep-alive), 可以在多个线程中同时使用. 复用的空闲连接
+    可能已被服务器关闭, 这时换一个新连接重试: 发送请求时就失败的 (服务器没有收到),
+    或者是重复执行也没有影响的 GET/HEAD. 其他请求在等待响应时连接断开的, 服务器
+    可能已经处理过, 不能重发 (追加记录会重复, 带修改序号的修改会误报冲突), 直接报错.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        url = urlsplit(base_url)
+        if url.scheme != "http" or not url.hostname:
+            raise ValueError(f"服务器地址无效: {base_url} (应为 http://主机:端口)")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < MAX_IDLE_CONNECTIONS:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method, path, params=None, body=None, headers=None):
+        """发送请求, 返回 (状态码, 响应头, 响应体)
+
+        body 为字节串或文件对象 (从当前位置读到结尾).
+        """
+        url = path + ("?" + urlencode(params) if params else "")
+        headers = dict(headers or {})
+        start = None
+        if hasattr(body, "read"):
+            start = body.tell()
+            headers["Content-Length"] = str(body.seek(0, os.SEEK_END) - start)
+        while True:
+            conn, reused = self._acquire()
+            if start is not None:
+                body.seek(start)
+            sent = False
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                sent = True
+                response = conn.getresponse()
+                data = response.read()
+            except (ConnectionError, http.client.BadStatusLine) as e:
+                conn.close()
+                if reused and (not sent or method in RETRY_METHODS):
+                    continue
+                raise RemoteError(f"无法连接服务器 {self.host}:{self.port}: {e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise RemoteError(f"无法连接服务器 {self.host}:{self.port}: {e}") from e
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, response.headers, data
+
+    def call(self, method, path, params=None, value=None, body=None):
+        """JSON接口: 请求体为 value 编码的JSON (或原样的 body), 返回解码后的响应
+
+        记录解码为 CompactRecord. 409 抛出 ConflictError, 其他错误抛出 RemoteError.
+        """
+        headers = {}
+        if value is not None:
+            body = json.dumps(value, ensure_ascii=False, default=json_default).encode('utf-8')
+            headers["Content-Type"] = "application/json; charset=utf-8"
+        status, _, data = self.request(method, path, params, body, headers)
+        try:
+            result = json.loads(data.decode('utf-8'), object_hook=json_object_hook) if data else {}
+        except ValueError:
+            result = {}
+        if status >= 400:
+            error = ConflictError if status == 409 else RemoteError
+            raise error(result.get("error") or f"服务器返回 HTTP {status}", status, result)
+        return result
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class RemoteRepository(RecordRepository):
+    """服务器上的记录 (本地副本 + HTTP接口)
+
+    读取只访问本地副本. 按位置的修改先换成记录ID和界面看到的修改序号再发给
+    服务器, 记录已被其他操作员修改或删除时服务器拒绝修改, 抛出 ConflictError
+    (本地副本随即更新为服务器上的最新内容). 每次修改后取回服务器上的变化,
+    修改回调在调用修改或 apply_feed() 的线程中调用.
+    """
+
+    def __init__(self, url, timeout=30):
+        super().__init__()
+        self.url = url
+        self.client = HttpClient(url, timeout)
+        self.records = RecordList()
+        self._rev = 0
+        self._lock = threading.RLock()
+
+    def load(self):
+        result = self.client.call("GET", "/api/snapshot")
+        with self._lock:
+            self.records = RecordList(result["records"])
+            self._rev = result["rev"]
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+    def count(self):
+        return len(self.records)
+
+    def get(self, index):
+        return self.records[index]
+
+    def page(self, offset, limit):
+        return self.records[offset:offset + limit]
+
+    def iter_records(self):
+        with self._lock:
+            return iter(list(self.records))
+
+    def get_by_id(self, record_id):
+        with self._lock:
+            return self.records.by_id(record_id)
+
+    def index_of_id(self, record_id):
+        with self._lock:
+            return self.records.index_of_id(record_id)
+
+    def image_ref_count(self, path):
+        return self.client.call("GET", "/api/image-refs", {"path": path})["count"]
+
+    def get_tombstone(self, record_id):
+        try:
+            return self.client.call("GET", f"/api/tombstones/{quote(record_id, safe='')}")
+        except RemoteError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def max_rev(self):
+        return self._rev
+
+    def changes_since(self, rev):
+        result = self.client.call("GET", "/api/changes", {"since": rev})
+        return result["records"], result["tombstones"]
+
+    # ------------------------------------------------------------------
+    # 取回服务器上的变化
+    # ------------------------------------------------------------------
+    def fetch_changes(self):
+        """从服务器取回本地副本之后的变化 (不修改副本, 可以在后台线程中调用)"""
+        return self.client.call("GET", "/api/changes", {"since": self._rev})
+
+    def apply_feed(self, feed):
+        """把 fetch_changes() 的结果应用到本地副本, 返回是否有变化
+
+        比本地副本旧的结果 (取回期间本地已经更新过) 直接忽略.
+        """
+        with self._lock:
+            if feed["rev"] <= self._rev:
+                return False
+            removed, added = [], []
+            for tombstone in feed["tombstones"]:
+                index = self.records.index_of_id(tombstone[ID_FIELD])
+                if index is not None:
+                    removed.append(self.records[index])
+                    del self.records[index]
+            for record in feed["records"]:
+                index = self.records.index_of_id(record[ID_FIELD])
+                if index is None:
+                    self.records.append(record)
+                else:
+                    removed.append(self.records[index])
+                    self.records[index] = record
+                added.append(record)
+            self._rev = feed["rev"]
+        self._notify(removed, added)
+        return True
+
+    def refresh(self):
+        """取回并应用服务器上的变化, 返回是否有变化"""
+        return self.apply_feed(self.fetch_changes())
+
+    # ------------------------------------------------------------------
+    # 修改
+    # ------------------------------------------------------------------
+    def _write(self, method, path, params=None, value=None):
+        """修改服务器上的记录, 之后 (包括被拒绝时) 取回服务器上的变化"""
+        try:
+            return self.client.call(method, path, params, value)
+        finally:
+            self.refresh()
+
+    @staticmethod
+    def _record_path(record):
+        return f"/api/records/{quote(record[ID_FIELD], safe='')}"
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        self._write("POST", "/api/records", value={"records": list(records)})
+
+    def delete(self, index):
+        return self.delete_by_id(self.records[index][ID_FIELD])
+
+    def update(self, index, fields):
+        self.update_by_id(self.records[index][ID_FIELD], fields)
+
+    def _known(self, record_id):
+        record = self.get_by_id(record_id)
+        if record is None:
+            raise KeyError(f"记录不存在或已被删除: {record_id}")
+        return record
+
+    def delete_by_id(self, record_id):
+        record = self._known(record_id)
+        return self._write("DELETE", self._record_path(record), {REV_FIELD: record[REV_FIELD]})["record"]
+
+    def update_by_id(self, record_id, fields):
+        record = self._known(record_id)
+        self._write("PATCH", self._record_path(record), value={"fields": fields, REV_FIELD: record[REV_FIELD]})
+
+    def update_many(self, updates):
+        updates = [
+            {ID_FIELD: self.records[index][ID_FIELD], REV_FIELD: self.records[index][REV_FIELD], "fields": fields}
+            for index, fields in updates
+        ]
+        self._write("POST", "/api/records/update", value={"updates": updates})
+
+    def replace_all(self, records):
+        # 服务器上的记录全部重新写入 (顺序也可能改变), 重新取得全部记录
+        self.client.call("POST", "/api/records/replace", value={"records": list(records)})
+        self.load()
+        self._notify(None, list(self.records))
+
+    def apply_changes(self, records, tombstones):
+        result = self._write(
+            "POST", "/api/changes", value={"records": list(records), "tombstones": list(tombstones)}
+        )
+        return result["added"], result["updated"], result["deleted"], result["replaced"]
+
+    def close(self):
+        self.client.close()
+
+
+class RemoteBlobStore:
+    """服务器上的图片库, 接口与 BlobStore 相同
+
+    查看和导出时用 local_path() 把图片下载到本地缓存目录: 按内容寻址的图片
+    内容不会改变, 缓存中有就直接使用; 旧版命名的图片带 If-None-Match 询问服务器,
+    未改变时不重新下载.
+    """
+
+    content_hash = staticmethod(BlobStore.content_hash)
+    file_hash = staticmethod(BlobStore.file_hash)
+    is_content_addressed = staticmethod(BlobStore.is_content_addressed)
+
+    def __init__(self, client, cache_dir):
+        self.client = client
+        self.cache_dir = cache_dir
+        self._etags = {}
+
+    def ingest(self, src_path, pin=False):
+        return self.ingest_file(src_path, pin)[0]
+
+    def ingest_file(self, src_path, pin=False):
+        with open(src_path, 'rb') as src:
+            return self.ingest_fileobj(src, os.path.splitext(src_path)[1], pin)
+
+    def ingest_fileobj(self, src, ext, pin=False):
+        params = {"ext": ext.lower()}
+        if pin:
+            params["pin"] = "1"
+        result = self.client.call("POST", "/api/image", params, body=src)
+        return result["path"], result["created"]
+
+    def pin(self, path):
+        self.client.call("POST", "/api/image-pin", {"path": normalize_image_path(path)})
+
+    def unpin(self, path):
+        self.client.call("DELETE", "/api/image-pin", {"path": normalize_image_path(path)})
+
+    def store_original(self, path, src_path):
+        with open(src_path, 'rb') as src:
+            return self.client.call(
+                "POST", "/api/original", {"path": path, "ext": os.path.splitext(src_path)[1].lower()}, body=src
+            )["path"]
+
+    def release(self, path):
+        path = normalize_image_path(path)
+        if not path:
+            return False
+        return self.client.call("DELETE", "/api/image", {"path": path})["removed"]
+
+    def local_path(self, path):
+        """图片在本地缓存中的文件 (需要时从服务器下载), 服务器上没有这张图片时返回None"""
+        path = normalize_image_path(path)
+        if not path:
+            return None
+        if self.is_content_addressed(path):
+            key = self.content_hash(path)
+        else:
+            key = hashlib.sha256(path.encode('utf-8')).hexdigest()
+        local = os.path.join(self.cache_dir, key[:2], key + os.path.splitext(path)[1].lower())
+        cached = os.path.exists(local)
+        if cached and self.is_content_addressed(path):
+            return local
+
+        headers = {}
+        etag = self._etags.get(path)
+        if cached and etag:
+            headers["If-None-Match"] = etag
+        status, response_headers, data = self.client.request(
+            "GET", "/api/image", {"path": path}, headers=headers
+        )
+        if status == 304:
+            return local
+        if status == 404:
+            return None
+        if status >= 400:
+            raise RemoteError(f"下载图片失败: HTTP {status}", status)
+
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(local), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, local)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._etags[path] = response_headers.get("ETag")
+        return local
@@ -0,0 +1,359 @@
+"""
+记录存储接口
+界面只通过 RecordRepository 访问数据, 具体存储 (JSON日志 / SQLite) 可以替换
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+
+# 记录字段 (即数据文件中每条记录的键)
+RECORD_FIELDS = (
+    "callsign",
+    "apply_time",
+    "license_image",
+    "operator_image",
+    "screenshot_image",
+    "rejection_reason",
+    "create_time",
+)
+
+# 保存图片路径的字段
+IMAGE_FIELDS = ("license_image", "operator_image", "screenshot_image")
+
+# 同步用的元数据字段:
+#   id       记录的稳定ID, 各站点之间不变
+#   modified 最后修改时间 (UTC), 各站点之间以较新的为准
+#   rev      本站修改序号, 每次本站写入都会递增, 作为增量导出的水位
+ID_FIELD = "id"
+MODIFIED_FIELD = "modified"
+REV_FIELD = "rev"
+META_FIELDS = (ID_FIELD, MODIFIED_FIELD, REV_FIELD)
+
+# 升级前的旧记录没有修改时间, 统一使用最早的时间, 各站点的同一条旧记录不会互相覆盖
+LEGACY_MODIFIED = "1970-01-01T00:00:00.000000Z"
+
+# 由 呼号+申请时间 生成记录ID时使用的命名空间
+RECORD_ID_NAMESPACE = uuid.UUID("5b0f3f0e-6d1c-4c5e-9a57-1c2b6d0d7a11")
+
+_last_stamp = None
+
+
+def normalize_image_path(path):
+    """统一图片路径分隔符 (旧版在Windows下保存为 images\\xxx.jpg)"""
+    if not path:
+        return path
+    return path.replace("\\", "/")
+
+
+def image_refs(record):
+    """记录引用的全部图片路径 (已统一分隔符)"""
+    return [
+        normalize_image_path(record[field])
+        for field in IMAGE_FIELDS
+        if record.get(field)
+    ]
+
+
+def new_record_id():
+    """随机的记录ID"""
+    return uuid.uuid4().hex
+
+
+def derived_record_id(record):
+    """由 呼号+申请时间 生成确定的记录ID
+
+    没有ID的旧记录在各站点升级时会得到相同的ID, 之后的增量同步能对上.
+    """
+    key = f"{record.get('callsign', '').strip()}|{record.get('apply_time', '').strip()}"
+    return uuid.uuid5(RECORD_ID_NAMESPACE, key).hex
+
+
+def modified_stamp():
+    """当前UTC时间 (精确到微秒, 可按字符串比较), 同一进程内严格递增"""
+    global _last_stamp
+    now = datetime.now(timezone.utc)
+    if _last_stamp is not None and now <= _last_stamp:
+        now = _last_stamp + timedelta(microseconds=1)
+    _last_stamp = now
+    return now.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def stamp_new_record(record, rev, id_taken):
+    """补全新记录的元数据, 返回新字典
+
+    已有的ID和修改时间 (来自导入或同步) 保留; ID已被占用时换一个新ID.
+    id_taken(ID) 判断ID是否已被本地记录使用.
+    """
+    record = dict(record)
+    record_id = record.get(ID_FIELD)
+    if not record_id:
+        record_id = derived_record_id(record)
+    if id_taken(record_id):
+        record_id = new_record_id()
+    record[ID_FIELD] = record_id
+    if not record.get(MODIFIED_FIELD):
+        record[MODIFIED_FIELD] = modified_stamp()
+    record[REV_FIELD] = rev
+    return record
+
+
+def stamp_update(fields, rev):
+    """补全更新字段的元数据: ID不可修改, 未给出修改时间时使用当前时间"""
+    fields = {key: value for key, value in fields.items() if key != ID_FIELD}
+    if not fields.get(MODIFIED_FIELD):
+        fields[MODIFIED_FIELD] = modified_stamp()
+    fields[REV_FIELD] = rev
+    return fields
+
+
+def plan_changes(store, records, tombstones):
+    """比较其他站点的增量与本地数据, 返回 (新增, 更新, 删除, 墓碑)
+
+    新增为 [记录], 更新为 [(本地记录, 新记录)], 删除为 [(本地记录, 墓碑)],
+    墓碑为本地没有对应记录、只需记下的删除. 同一ID以修改时间较新的一方为准,
+    时间相同时删除优先. 已经应用过的增量再次应用时不会产生任何操作.
+    """
+    # 增量内同一ID只保留最新的一个版本
+    latest = {}
+    for record in records:
+        record_id = record.get(ID_FIELD)
+        if record_id and (record_id not in latest or _stamp(record) > _stamp(latest[record_id])):
+            latest[record_id] = record
+    deletions = {}
+    for tombstone in tombstones:
+        record_id = tombstone[ID_FIELD]
+        if record_id in deletions and tombstone["deleted"] <= deletions[record_id]["deleted"]:
+            continue
+        if record_id in latest and _stamp(latest[record_id]) > tombstone["deleted"]:
+            continue
+        latest.pop(record_id, None)
+        deletions[record_id] = tombstone
+
+    adds, updates, deletes, remembered = [], [], [], []
+    for record_id, record in latest.items():
+        local = store.get_by_id(record_id)
+        if local is not None:
+            if _stamp(record) > _stamp(local):
+                updates.append((local, record))
+            continue
+        known = store.get_tombstone(record_id)
+        if known is None or _stamp(record) > known["deleted"]:
+            adds.append(record)
+
+    for record_id, tombstone in deletions.items():
+        local = store.get_by_id(record_id)
+        if local is not None:
+            if tombstone["deleted"] >= _stamp(local):
+                deletes.append((local, tombstone))
+            continue
+        known = store.get_tombstone(record_id)
+        if known is None or tombstone["deleted"] > known["deleted"]:
+            remembered.append(tombstone)
+    return adds, updates, deletes, remembered
+
+
+def _stamp(record):
+    return record.get(MODIFIED_FIELD) or ""
+
+
+class RecordRepository:
+    """记录存储接口
+
+    记录按添加顺序排列, 以位置 (从0开始) 访问. 记录是普通字典,
+    调用方不要原地修改取得的记录, 修改请使用 update().
+
+    每条记录带有 id / modified / rev 元数据 (见 META_FIELDS), 由存储在写入
+    时维护; 删除记录时留下墓碑 {id, deleted, rev}, 供增量同步传播删除.
+
+    add_listener() 注册的回调在每次写入后以 (删除的记录, 新增的记录) 调用,
+    更新视为删除旧记录再新增新记录; 整体替换时删除的记录为None (表示全部).
+    """
+
+    def __init__(self):
+        self._listeners = []
+        # 最近一次写入失败的异常 (成功写入后清除)
+        self.write_error = None
+
+    def add_listener(self, listener):
+        """注册修改回调 listener(removed, added), 在写入的线程中调用"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, removed, added):
+        if removed is not None and not removed and not added:
+            return
+        for listener in list(self._listeners):
+            listener(removed, added)
+
+    def load(self):
+        """打开存储"""
+
+    def count(self):
+        """记录总数"""
+        raise NotImplementedError
+
+    def get(self, index):
+        """取得指定位置的记录"""
+        raise NotImplementedError
+
+    def page(self, offset, limit):
+        """取得从offset开始的至多limit条记录"""
+        raise NotImplementedError
+
+    def iter_records(self):
+        """按顺序遍历全部记录"""
+        raise NotImplementedError
+
+    def append(self, record):
+        """追加一条记录"""
+        raise NotImplementedError
+
+    def delete(self, index):
+        """删除指定位置的记录, 返回被删除的记录"""
+        raise NotImplementedError
+
+    def update(self, index, fields):
+        """更新指定位置记录的部分字段"""
+        raise NotImplementedError
+
+    def extend(self, records):
+        """批量追加记录 (一次写入)"""
+        for record in records:
+            self.append(record)
+
+    def update_many(self, updates):
+        """批量更新 [(位置, 字段)] (一次写入)"""
+        for index, fields in updates:
+            self.update(index, fields)
+
+    def replace_all(self, records):
+        """整体替换所有记录"""
+        raise NotImplementedError
+
+    def find_by_callsign(self, callsign):
+        """按呼号查找, 返回 [(位置, 记录)]"""
+        return [
+            (index, record)
+            for index, record in enumerate(self.iter_records())
+            if record.get("callsign") == callsign
+        ]
+
+    def find_by_apply_time(self, start, end):
+        """按申请时间范围查找 (闭区间, 字符串比较), 返回 [(位置, 记录)]"""
+        return self._find_by_range("apply_time", start, end)
+
+    def find_by_create_time(self, start, end):
+        """按创建时间范围查找 (闭区间, 字符串比较), 返回 [(位置, 记录)]"""
+        return self._find_by_range("create_time", start, end)
+
+    def _find_by_range(self, field, start, end):
+        return [
+            (index, record)
+            for index, record in enumerate(self.iter_records())
+            if start <= record.get(field, "") <= end
+        ]
+
+    def value_counts(self, field):
+        """某个字段各个取值的记录数 (Counter)"""
+        return Counter(record.get(field) for record in self.iter_records())
+
+    def image_ref_count(self, path):
+        """引用某张图片的记录数"""
+        return sum(image_refs(record).count(path) for record in self.iter_records())
+
+    def get_by_id(self, record_id):
+        """按ID取得记录, 不存在时返回None"""
+        for record in self.iter_records():
+            if record.get(ID_FIELD) == record_id:
+                return record
+        return None
+
+    def index_of_id(self, record_id):
+        """按ID取得记录的位置, 不存在时返回None"""
+        for index, record in enumerate(self.iter_records()):
+            if record.get(ID_FIELD) == record_id:
+                return index
+        return None
+
+    def delete_by_id(self, record_id):
+        """删除指定ID的记录, 返回被删除的记录; 记录不存在时抛出 KeyError"""
+        return self.delete(self._index_of_existing(record_id))
+
+    def update_by_id(self, record_id, fields):
+        """更新指定ID记录的部分字段; 记录不存在时抛出 KeyError"""
+        self.update(self._index_of_existing(record_id), fields)
+
+    def update_many_by_id(self, updates):
+        """[(记录ID, 字段)] 一次更新多条记录; 有记录不存在时抛出 KeyError, 不做任何修改"""
+        self.update_many([(self._index_of_existing(record_id), fields) for record_id, fields in updates])
+
+    def _index_of_existing(self, record_id):
+        index = self.index_of_id(record_id)
+        if index is None:
+            raise KeyError(f"记录不存在或已被删除: {record_id}")
+        return index
+
+    def get_tombstone(self, record_id):
+        """取得已删除记录的墓碑, 没有时返回None"""
+        raise NotImplementedError
+
+    def max_rev(self):
+        """当前最大的本站修改序号 (增量导出的水位)"""
+        raise NotImplementedError
+
+    def changes_since(self, rev):
+        """本站修改序号大于rev的 (记录列表, 墓碑列表)"""
+        raise NotImplementedError
+
+    def apply_changes(self, records, tombstones):
+        """应用其他站点的增量 (见 plan_changes), 一次写入
+
+        返回 (新增数, 更新数, 删除数, 被覆盖或删除的旧记录).
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        """整理存储 (写出快照等)"""
+
+    def pending_writes(self):
+        """已生效但尚未写入磁盘的修改数"""
+        return 0
+
+    def flush(self):
+        """写入尚未写入磁盘的修改, 失败时抛出异常"""
+
+    def close(self):
+        """关闭存储"""
+
+
+def open_repository(config, readers=0):
+    """按配置创建存储
+
+    设置了 server_url 时连接 server.py 提供的服务 (多人共用), 否则使用本地存储.
+    storage 为 "sqlite" 时, 若数据库尚不存在而旧的JSON数据文件存在,
+    会先执行一次迁移; readers 为SQLite只读连接池的大小 (0为不使用连接池).
+    """
+    if config.get("server_url"):
+        from remote_store import RemoteRepository
+
+        return RemoteRepository(config["server_url"], timeout=config["server_timeout_seconds"])
+    backend = config.get("storage", "json")
+    if backend == "sqlite":
+        from sqlite_store import SqliteRepository, migrate_json_to_sqlite
+
+        db_file = config["database_file"]
+        if not os.path.exists(db_file) and os.path.exists(config["data_file"]):
+            migrate_json_to_sqlite(config["data_file"], db_file)
+        return SqliteRepository(db_file, readers=readers)
+    if backend == "json":
+        from journal_store import JournalStore
+
+        return JournalStore(config["data_file"], write_delay=config["write_delay_ms"] / 1000)
+    raise ValueError(f"未知的存储类型: {backend}")
@@ -0,0 +1,219 @@
+"""
+搜索索引
+内存中的两个索引, 随存储的每次修改增量更新:
+  拒签原因: 按相邻两字 (二元组) 建立的倒排索引, 中文不需要分词
+  呼号:     排序列表, 用二分查找做前缀查询 (如 "BH2")
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+
+from repository import ID_FIELD
+
+
+def normalize_text(text):
+    """统一全角/半角和大小写"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def normalize_callsign(callsign):
+    return normalize_text(callsign).strip().upper()
+
+
+def bigrams(text):
+    """文本 (已统一) 中不含空白的相邻两字"""
+    return {
+        text[k:k + 2]
+        for k in range(len(text) - 1)
+        if not text[k].isspace() and not text[k + 1].isspace()
+    }
+
+
+class SearchIndex:
+    """拒签原因倒排索引 + 呼号前缀索引
+
+    每条记录在索引中有一个序号, 按记录加入的先后递增 (与存储中的顺序一致),
+    查询结果按序号排序. 倒排表是只追加的 uint32 数组: 删除和修改只把旧序号
+    标记为失效, 失效条目过多时整体重建. 查询时取最短的倒排表, 再用子串匹配
+    核对原文, 因此结果总是准确的.
+    """
+
+    # 失效条目超过有效条目的比例时重建倒排表
+    REBUILD_RATIO = 0.5
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._order_of = {}       # 记录ID -> 序号
+        self._ids = {}            # 序号 -> 记录ID
+        self._texts = {}          # 序号 -> 统一后的拒签原因
+        self._postings = {}       # 二元组 -> array('I') 序号
+        self._callsigns = []      # 排序的 (呼号, 序号)
+        self._callsign_of = {}    # 序号 -> 呼号
+        self._next_order = 0
+        self._entries = 0
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    # ------------------------------------------------------------------
+    # 维护
+    # ------------------------------------------------------------------
+    def attach(self, store):
+        """从存储建立索引, 并注册回调跟随之后的修改"""
+        self.build(store.iter_records())
+        store.add_listener(self.on_change)
+
+    def detach(self, store):
+        store.remove_listener(self.on_change)
+
+    def build(self, records):
+        with self._lock:
+            self._reset()
+            for record in records:
+                self._add(record)
+            self._callsigns.sort()
+
+    def on_change(self, removed, added):
+        """存储修改回调; removed 为None表示整体替换"""
+        with self._lock:
+            if removed is None:
+                self.build(added)
+                return
+            # 修改 = 删除旧记录 + 新增新记录, 保留原来的序号 (即原来的位置)
+            reused = {}
+            for record in removed:
+                order = self._remove(record[ID_FIELD])
+                if order is not None:
+                    reused[record[ID_FIELD]] = order
+            for record in added:
+                self._add(record, reused.get(record[ID_FIELD]), keep_sorted=True)
+            if self._stale > self.REBUILD_RATIO * max(self._entries - self._stale, 1000):
+                self._rebuild_postings()
+
+    def _add(self, record, order=None, keep_sorted=False):
+        record_id = record[ID_FIELD]
+        if order is None:
+            order = self._next_order
+            self._next_order += 1
+        self._order_of[record_id] = order
+        self._ids[order] = record_id
+
+        text = normalize_text(record.get("rejection_reason"))
+        self._texts[order] = text
+        for gram in bigrams(text):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('I')
+            postings.append(order)
+            self._entries += 1
+
+        callsign = normalize_callsign(record.get("callsign"))
+        self._callsign_of[order] = callsign
+        if keep_sorted:
+            insort(self._callsigns, (callsign, order))
+        else:
+            self._callsigns.append((callsign, order))
+
+    def _remove(self, record_id):
+        order = self._order_of.pop(record_id, None)
+        if order is None:
+            return None
+        del self._ids[order]
+        text = self._texts.pop(order)
+        self._stale += len(bigrams(text))
+
+        callsign = self._callsign_of.pop(order)
+        k = bisect_left(self._callsigns, (callsign, order))
+        if k < len(self._callsigns) and self._callsigns[k] == (callsign, order):
+            del self._callsigns[k]
+        return order
+
+    def _rebuild_postings(self):
+        """去掉倒排表中的失效条目"""
+        postings = {}
+        for order in sorted(self._texts):
+            for gram in bigrams(self._texts[order]):
+                entries = postings.get(gram)
+                if entries is None:
+                    entries = postings[gram] = array('I')
+                entries.append(order)
+        self._postings = postings
+        self._entries = sum(len(entries) for entries in postings.values())
+        self._stale = 0
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def search(self, query):
+        """按空白分隔的各个词查询, 返回同时匹配所有词的记录ID (按存储顺序)
+
+        每个词匹配呼号前缀或拒签原因中的子串.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        with self._lock:
+            matched = None
+            for term in terms:
+                orders = self.match_callsign_prefix(term) | self.match_reason(term)
+                matched = orders if matched is None else matched & orders
+                if not matched:
+                    return []
+            return [self._ids[order] for order in sorted(matched)]
+
+    def match_callsign_prefix(self, prefix):
+        """呼号以prefix开头的记录序号"""
+        prefix = normalize_callsign(prefix)
+        with self._lock:
+            k = bisect_left(self._callsigns, (prefix,))
+            result = set()
+            while k < len(self._callsigns) and self._callsigns[k][0].startswith(prefix):
+                result.add(self._callsigns[k][1])
+                k += 1
+            return result
+
+    def match_reason(self, text):
+        """拒签原因包含text的记录序号"""
+        text = normalize_text(text).strip()
+        with self._lock:
+            if not text:
+                return set()
+            grams = bigrams(text)
+            if not grams:
+                # 单个字没有二元组, 直接扫描原文
+                return {order for order, reason in self._texts.items() if text in reason}
+            shortest = None
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    return set()
+                if shortest is None or len(postings) < len(shortest):
+                    shortest = postings
+            texts = self._texts
+            return {order for order in shortest if order in texts and text in texts[order]}
+
+
+class SearchResults:
+    """搜索结果, 提供与存储相同的 count/page/get 接口供表格显示"""
+
+    def __init__(self, store, record_ids):
+        self.store = store
+        self.record_ids = record_ids
+
+    def count(self):
+        return len(self.record_ids)
+
+    def get(self, index):
+        return self.store.get_by_id(self.record_ids[index])
+
+    def page(self, offset, limit):
+        records = (self.store.get_by_id(record_id) for record_id in self.record_ids[offset:offset + limit])
+        return [record for record in records if record is not None]
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+多人共用的本地服务
+记录保存在服务器的SQLite数据库中, 通过HTTP JSON接口读写; 图片通过同一服务上传和
+下载 (带ETag, 客户端按条件请求复用本地缓存). 读取使用连接池, 多个请求可以同时读;
+修改在服务器上依次进行, 并按记录的修改序号检查冲突 (见 remote_store.py)
+
+用法:
+    python server.py [--host 127.0.0.1] [--port 8765] [--config config.json]
+
+接口 (请求和响应均为JSON, 出错时为 {"error": 说明} 和相应的状态码):
+    GET    /api/info                       记录数和当前修改序号
+    GET    /api/snapshot                   {"rev", "records"} 全部记录
+    GET    /api/changes?since=N            {"rev", "records", "tombstones"} 修改序号大于N的变化
+    GET    /api/records?offset=&limit=     {"records"} 一页记录 (limit 默认 DEFAULT_PAGE_SIZE,
+                                           最多 MAX_PAGE_SIZE)
+    GET    /api/records/<id>               一条记录
+    GET    /api/tombstones/<id>            已删除记录的墓碑
+    GET    /api/image-refs?path=           {"count"} 引用图片的记录数
+    POST   /api/records                    {"records"} 追加记录
+    PATCH  /api/records/<id>               {"fields", "rev"} 修改记录; rev不是最新时为409
+    DELETE /api/records/<id>?rev=          删除记录; rev不是最新时为409
+    POST   /api/records/update             {"updates": [{"id", "rev", "fields"}]} 批量修改
+    POST   /api/records/replace            {"records"} 整体替换
+    POST   /api/changes                    {"records", "tombstones"} 应用其他站点的增量
+    GET    /api/image?path=                图片内容 (支持 If-None-Match)
+    POST   /api/image?ext=.jpg&pin=1       请求体为图片内容, 存入图片库, 返回 {"path", "created"};
+                                           pin=1 时同时固定图片 (租约, 见 UPLOAD_PIN_SECONDS)
+    DELETE /api/image?path=                {"removed"} 没有记录引用、也没有被固定时删除图片
+    POST   /api/image-pin?path=            固定图片
+    DELETE /api/image-pin?path=            解除一次固定
+    POST   /api/original?path=&ext=.jpg    请求体为原图内容, 为图片库中的 path 保留原图
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from blob_store import COPY_CHUNK_SIZE, BlobStore
+from config import CONFIG_FILE, load_config
+from record_model import json_default
+from repository import ID_FIELD, REV_FIELD, normalize_image_path, open_repository
+
+
+# 空闲的连接保持的秒数, 超时后关闭 (客户端会重新连接)
+IDLE_TIMEOUT_SECONDS = 300
+
+# 请求体 (JSON) 的大小上限
+MAX_JSON_BYTES = 256 * 1024 * 1024
+
+# 上传的图片 (和原图) 的大小上限
+MAX_IMAGE_BYTES = 64 * 1024 * 1024
+
+# 出错时为了继续使用连接而读掉的请求体上限, 更多时关闭连接
+MAX_DISCARD_BYTES = 16 * 1024 * 1024
+
+# 分页读取记录时每页的默认条数和上限
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 上传后尚未保存到记录中的图片的固定时限 (秒): 客户端保存记录后解除固定,
+# 客户端异常退出时到期自动失效, 之后没有记录引用的图片由校验清理
+UPLOAD_PIN_SECONDS = 24 * 3600
+
+# 按内容寻址的图片内容不会改变, 客户端可以一直使用缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class HttpError(Exception):
+    """以指定状态码回应的错误"""
+
+    def __init__(self, status, message, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class BodyReader:
+    """只读取 Content-Length 个字节的请求体"""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.read(size)
+        if not data:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "请求体不完整")
+        self.remaining -= len(data)
+        return data
+
+
+class RecordServer(ThreadingHTTPServer):
+    """记录服务: 每个请求一个线程
+
+    读取直接访问存储 (SQLite只读连接池); 所有修改持有 write_lock 依次进行,
+    "检查修改序号 -> 写入" 不会被其他修改打断.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, store, blobs):
+        super().__init__(address, RequestHandler)
+        self.store = store
+        self.blobs = blobs
+        self.image_root = os.path.realpath(blobs.image_dir)
+        self.write_lock = threading.Lock()
+        self.verbose = False
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def resolve_image(self, path):
+        """请求中的图片路径 -> 服务器上的文件, 只允许访问图片目录中的文件"""
+        path = normalize_image_path(path or "")
+        if not path:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "缺少图片路径")
+        real = os.path.realpath(path)
+        if os.path.commonpath([real, self.image_root]) != self.image_root:
+            raise HttpError(HTTPStatus.FORBIDDEN, "只能访问图片目录中的文件")
+        return path, real
+
+    # ------------------------------------------------------------------
+    # 修改 (持有 write_lock 调用)
+    # ------------------------------------------------------------------
+    def locate(self, record_id, expected_rev):
+        """按ID找到记录, 并确认客户端看到的是最新版本"""
+        record = self.store.get_by_id(record_id)
+        if record is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "记录不存在或已被删除")
+        if expected_rev is not None and record[REV_FIELD] != expected_rev:
+            raise HttpError(HTTPStatus.CONFLICT, "记录已被其他操作员修改", {"record": record})
+        return record
+
+    def update_records(self, updates):
+        """[{"id", "rev", "fields"}] 全部检查通过后一次写入"""
+        for update in updates:
+            self.locate(update[ID_FIELD], update.get(REV_FIELD))
+        if len(updates) == 1:
+            self.store.update_by_id(updates[0][ID_FIELD], updates[0]["fields"])
+            return
+        self.store.update_many_by_id([(update[ID_FIELD], update["fields"]) for update in updates])
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_TIMEOUT_SECONDS
+    server_version = "RejectionServer/1.0"
+
+    # ------------------------------------------------------------------
+    # 分派
+    # ------------------------------------------------------------------
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        # 同一个连接上的多个请求使用同一个处理器对象
+        self._body = None
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        try:
+            if parts[0] != "api" or len(parts) < 2:
+                raise HttpError(HTTPStatus.NOT_FOUND, "没有这个接口")
+            handler = getattr(self, f"_{method.lower()}_{parts[1].replace('-', '_')}", None)
+            if handler is None:
+                raise HttpError(HTTPStatus.NOT_FOUND, "没有这个接口")
+            handler(*parts[2:])
+        except HttpError as e:
+            self._discard_body()
+            self.send_json(dict(e.body or {}, error=str(e)), e.status)
+        except (ValueError, KeyError, TypeError) as e:
+            self._discard_body()
+            self.send_json({"error": f"请求无效: {e}"}, HTTPStatus.BAD_REQUEST)
+        except Exception as e:
+            self._discard_body()
+            self.log_error("%s %s failed: %r", method, self.path, e)
+            self.send_json({"error": str(e)}, HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # ------------------------------------------------------------------
+    # 请求和响应
+    # ------------------------------------------------------------------
+    def body(self):
+        """请求体的读取器 (只能读一次)"""
+        if self._body is None:
+            length = int(self.headers.get("Content-Length") or 0)
+            self._body = BodyReader(self.rfile, length)
+        return self._body
+
+    def limited_body(self, limit):
+        """请求体的读取器, 超过 limit 字节时为413"""
+        reader = self.body()
+        if reader.remaining > limit:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+        return reader
+
+    def read_json(self):
+        data = self.limited_body(MAX_JSON_BYTES).read()
+        return json.loads(data.decode('utf-8')) if data else {}
+
+    def _discard_body(self):
+        """出错时读掉剩余的请求体, 连接才能继续使用; 剩余太多时直接关闭连接"""
+        try:
+            reader = self.body()
+            if reader.remaining > MAX_DISCARD_BYTES:
+                self.close_connection = True
+                return
+            while reader.read(COPY_CHUNK_SIZE):
+                pass
+        except (OSError, ValueError, HttpError):
+            self.close_connection = True
+
+    def int_param(self, name, default=None):
+        value = self.query.get(name)
+        if value is None or value == "":
+            if default is None:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"缺少参数 {name}")
+            return default
+        return int(value)
+
+    def send_json(self, value, status=HTTPStatus.OK):
+        data = json.dumps(value, ensure_ascii=False, default=json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # ------------------------------------------------------------------
+    # 记录
+    # ------------------------------------------------------------------
+    def _get_info(self):
+        store = self.server.store
+        self.send_json({"records": store.count(), "rev": store.max_rev()})
+
+    def _get_snapshot(self):
+        rev, records = self.server.store.snapshot()
+        self.send_json({"rev": rev, "records": records})
+
+    def _get_changes(self):
+        since = self.int_param("since", 0)
+        records, tombstones = self.server.store.changes_since(since)
+        # 水位取返回内容中最大的修改序号: 写入线程的计数器可能包含尚未提交的事务
+        rev = max([since] + [item[REV_FIELD] for item in records + tombstones])
+        self.send_json({"rev": rev, "records": records, "tombstones": tombstones})
+
+    def _get_records(self, record_id=None):
+        store = self.server.store
+        if record_id is None:
+            offset = self.int_param("offset", 0)
+            limit = min(self.int_param("limit", DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+            if offset < 0 or limit < 0:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "offset 和 limit 不能为负数")
+            self.send_json({"records": store.page(offset, limit)})
+            return
+        record = store.get_by_id(record_id)
+        if record is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "记录不存在或已被删除")
+        self.send_json(record)
+
+    def _get_tombstones(self, record_id):
+        tombstone = self.server.store.get_tombstone(record_id)
+        if tombstone is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "没有这条记录的墓碑")
+        self.send_json(tombstone)
+
+    def _get_image_refs(self):
+        path = normalize_image_path(self.query.get("path", ""))
+        self.send_json({"count": self.server.store.image_ref_count(path)})
+
+    def _post_records(self, action=None):
+        request = self.read_json()
+        store = self.server.store
+        with self.server.write_lock:
+            if action is None:
+                store.extend(request["records"])
+            elif action == "update":
+                self.server.update_records(request["updates"])
+            elif action == "replace":
+                store.replace_all(request["records"])
+            else:
+                raise HttpError(HTTPStatus.NOT_FOUND, "没有这个接口")
+            rev = store.max_rev()
+        self.send_json({"rev": rev})
+
+    def _patch_records(self, record_id):
+        request = self.read_json()
+        with self.server.write_lock:
+            self.server.update_records(
+                [{ID_FIELD: record_id, REV_FIELD: request.get(REV_FIELD), "fields": request["fields"]}]
+            )
+            rev = self.server.store.max_rev()
+        self.send_json({"rev": rev})
+
+    def _delete_records(self, record_id):
+        expected = self.query.get(REV_FIELD)
+        with self.server.write_lock:
+            self.server.locate(record_id, None if expected is None else int(expected))
+            record = self.server.store.delete_by_id(record_id)
+            rev = self.server.store.max_rev()
+        self.send_json({"rev": rev, "record": record})
+
+    def _post_changes(self):
+        request = self.read_json()
+        with self.server.write_lock:
+            added, updated, deleted, replaced = self.server.store.apply_changes(
+                request.get("records", []), request.get("tombstones", [])
+            )
+            rev = self.server.store.max_rev()
+        self.send_json({
+            "rev": rev, "added": added, "updated": updated, "deleted": deleted, "replaced": replaced,
+        })
+
+    # ------------------------------------------------------------------
+    # 图片
+    # ------------------------------------------------------------------
+    def _get_image(self):
+        path, real = self.server.resolve_image(self.query.get("path"))
+        try:
+            f = open(real, 'rb')
+        except FileNotFoundError:
+            raise HttpError(HTTPStatus.NOT_FOUND, "图片不存在")
+        with f:
+            stat = os.fstat(f.fileno())
+            if BlobStore.is_content_addressed(path):
+                etag, cache_control = f'"{BlobStore.content_hash(path)}"', IMMUTABLE_CACHE_CONTROL
+            else:
+                # 旧版命名的图片以大小和修改时间判断是否变化
+                etag, cache_control = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"', "no-cache"
+            if etag in (tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", cache_control)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(stat.st_size))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, COPY_CHUNK_SIZE)
+
+    def _post_image(self):
+        ext = self.query.get("ext", "")
+        if ext and (not ext.startswith(".") or "/" in ext or "\\" in ext):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "扩展名无效")
+        path, created = self.server.blobs.ingest_fileobj(
+            self.limited_body(MAX_IMAGE_BYTES), ext, self.query.get("pin") == "1"
+        )
+        self.send_json({"path": path, "created": created})
+
+    def _delete_image(self):
+        path, _ = self.server.resolve_image(self.query.get("path"))
+        # 与记录的修改依次进行, 检查引用计数和删除文件之间不会有新的引用;
+        # 其他操作员刚上传、尚未保存的图片由固定保护 (存入和删除在图片库的锁内依次进行)
+        with self.server.write_lock:
+            removed = self.server.blobs.release(path)
+        self.send_json({"removed": removed})
+
+    def _post_image_pin(self):
+        path, _ = self.server.resolve_image(self.query.get("path"))
+        self.server.blobs.pin(path)
+        self.send_json({"pinned": True})
+
+    def _delete_image_pin(self):
+        path, _ = self.server.resolve_image(self.query.get("path"))
+        self.server.blobs.unpin(path)
+        self.send_json({"pinned": self.server.blobs.is_pinned(path)})
+
+    def _post_original(self):
+        path, _ = self.server.resolve_image(self.query.get("path"))
+        ext = self.query.get("ext", "")
+        if ext and (not ext.startswith(".") or "/" in ext or "\\" in ext):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "扩展名无效")
+        body = self.limited_body(MAX_IMAGE_BYTES)
+        # store_original 从文件复制 (按源文件取扩展名), 先把请求体写到临时文件
+        fd, tmp_path = tempfile.mkstemp(suffix=ext)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(body, f, COPY_CHUNK_SIZE)
+            original = self.server.blobs.store_original(path, tmp_path)
+        finally:
+            os.remove(tmp_path)
+        self.send_json({"path": original})
+
+
+def create_server(config, host=None, port=None, verbose=False):
+    """按配置创建服务 (尚未开始处理请求), 返回 RecordServer
+
+    服务器总是使用SQLite存储; 数据库不存在而JSON数据文件存在时先迁移.
+    """
+    store = open_repository(
+        dict(config, storage="sqlite", server_url=""), readers=config["server_readers"]
+    )
+    store.load()
+    blobs = BlobStore(config["image_dir"], store, config["original_image_dir"], pin_seconds=UPLOAD_PIN_SECONDS)
+    try:
+        server = RecordServer(
+            (host or config["server_host"], config["server_port"] if port is None else port), store, blobs
+        )
+    except BaseException:
+        store.close()
+        raise
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="拒签记录的多人共用服务")
+    parser.add_argument("--host", help="监听地址 (默认见配置 server_host)")
+    parser.add_argument("--port", type=int, help="端口 (默认见配置 server_port)")
+    parser.add_argument("--config", default=CONFIG_FILE, help="配置文件")
+    parser.add_argument("--verbose", action="store_true", help="输出每个请求")
+    args = parser.parse_args(argv)
+
+    server = create_server(load_config(args.config), args.host, args.port, args.verbose)
+    print(f"服务已启动: {server.url}  (Ctrl+C 停止)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+相似图片窗口
+列出与选中记录的图片相似的其他记录 (同一张执照照片或申请截图被不同呼号或多次申请使用),
+双击一行查看那条记录的图片
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+
+# 图片字段 -> 显示名称
+IMAGE_LABELS = {
+    "license_image": "执照照片",
+    "operator_image": "操作证照片",
+    "screenshot_image": "申请截图",
+}
+
+
+class SimilarDialog:
+    """相似图片列表, 双击一行时调用 on_view(记录)"""
+
+    def __init__(self, root, store, record, matches, max_distance, pending=0, on_view=None):
+        self.store = store
+        self.on_view = on_view
+        self.records = {}
+
+        self.window = tk.Toplevel(root)
+        self.window.title(f"相似图片 - {record['callsign']}")
+        self.window.geometry("900x400")
+        self.window.transient(root)
+
+        frame = ttk.Frame(self.window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        records = len({match.other_id for match in matches})
+        summary = f"{records} 条其他记录有相似图片 (差异不超过 {max_distance} 位, 0 为完全相同)"
+        if not matches:
+            summary = f"没有找到相似图片 (差异不超过 {max_distance} 位)"
+        if pending:
+            summary += f"; 还有 {pending} 张图片的指纹正在计算, 结果可能不全"
+        ttk.Label(frame, text=summary).pack(anchor=tk.W, pady=(0, 5))
+
+        columns = ("field", "callsign", "apply_time", "other_field", "distance", "reason")
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+        for column, text, width in zip(
+            columns,
+            ("本记录图片", "呼号", "申请时间", "对方图片", "差异", "拒签原因"),
+            (90, 100, 140, 90, 50, 300),
+        ):
+            tree.heading(column, text=text)
+            tree.column(column, width=width, anchor=tk.W)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        for match in matches:
+            other = store.get_by_id(match.other_id)
+            if other is None:
+                continue
+            item = tree.insert("", tk.END, values=(
+                IMAGE_LABELS.get(match.field, match.field),
+                other.get("callsign", ""),
+                other.get("apply_time", ""),
+                IMAGE_LABELS.get(match.other_field, match.other_field),
+                "相同" if match.distance == 0 else match.distance,
+                other.get("rejection_reason", ""),
+            ))
+            self.records[item] = other
+        tree.bind("<Double-1>", lambda event: self._view(tree.focus()))
+        self.tree = tree
+
+        ttk.Button(frame, text="关闭", command=self.window.destroy).pack(pady=(10, 0))
+
+    def _view(self, item):
+        record = self.records.get(item)
+        if record is not None and self.on_view is not None:
+            self.on_view(record)
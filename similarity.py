@@ -0,0 +1,381 @@
+"""
+相似图片索引
+每张图片计算64位的差值哈希 (dHash): 缩小为9x8的灰度图, 每行相邻像素比较亮度得到
+64位. 同一张照片重新拍摄、截图重新保存或缩放后, 哈希只有少数几位不同, 以汉明距离
+衡量相似程度. 哈希放入多索引哈希表, 查找距离不超过阈值的图片只需核对少量候选.
+纯色或几乎没有明暗变化的图片 (空白截图、纯色扫描件) 相邻像素的比较只是噪声或全为0,
+彼此都会被当作相同, 这类图片记为 FLAT_HASH, 不放入索引.
+
+哈希按图片内容哈希 (旧版命名的图片按路径) 保存在 image_hash_file 中, 上传时计算,
+其余的 (导入的、升级前的图片) 在后台补算
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import json
+import logging
+import os
+import threading
+from itertools import combinations
+
+from blob_store import BlobStore
+from journal_store import atomic_write
+from perf_monitor import LOGGER_NAME
+from repository import ID_FIELD, IMAGE_FIELDS, normalize_image_path
+
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# 哈希的边长: 9x8 的灰度图, 64位
+HASH_SIZE = 8
+
+# 多索引哈希表把64位哈希分为几段, 每段的位数
+CHUNKS = 4
+CHUNK_BITS = HASH_SIZE * HASH_SIZE // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# 缩小后的灰度图亮度标准差低于此值 (0-255) 时视为没有足够的细节, 不参与比较
+FLAT_STDDEV = 4.0
+
+# 没有足够细节的图片的哈希; 在缓存文件中保存为 "-000000000000001"
+FLAT_HASH = -1
+
+ALL_ONES = (1 << (HASH_SIZE * HASH_SIZE)) - 1
+
+# 补算哈希时保存一次缓存文件的间隔 (张)
+SAVE_EVERY = 500
+
+# 翻转位数 -> 一段中翻转不超过这么多位的全部掩码
+_masks = {}
+
+
+def dhash(source):
+    """图片 (路径或文件对象) 的64位差值哈希; 几乎没有明暗变化的图片返回 FLAT_HASH"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        # JPEG直接以缩小的比例解码, 大照片不必解出全尺寸
+        img.draft("L", (HASH_SIZE * 4, HASH_SIZE * 4))
+        if getattr(img, "is_animated", False):
+            img.seek(0)
+        img = ImageOps.exif_transpose(img)
+        small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = list(small.getdata())
+    mean = sum(pixels) / len(pixels)
+    if sum((pixel - mean) ** 2 for pixel in pixels) / len(pixels) < FLAT_STDDEV ** 2:
+        return FLAT_HASH
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def is_informative(value):
+    """哈希是否可以用来比较: 排除没有细节的图片, 以及旧缓存中全0、全1的哈希"""
+    return value not in (FLAT_HASH, 0, ALL_ONES)
+
+
+def hamming(a, b):
+    """两个哈希不同的位数"""
+    return bin(a ^ b).count("1")
+
+
+def _flip_masks(radius):
+    masks = _masks.get(radius)
+    if masks is None:
+        masks = [
+            sum(1 << bit for bit in bits)
+            for count in range(min(radius, CHUNK_BITS) + 1)
+            for bits in combinations(range(CHUNK_BITS), count)
+        ]
+        _masks[radius] = masks
+    return masks
+
+
+def hash_key(path):
+    """哈希缓存的键: 按内容寻址的图片用内容哈希 (同一内容只算一次), 旧版命名的图片用路径"""
+    path = normalize_image_path(path)
+    return BlobStore.content_hash(path) if BlobStore.is_content_addressed(path) else path
+
+
+class MultiIndexHash:
+    """多索引哈希表: 64位哈希分为4段, 每段一个 {段值: {哈希}} 的表
+
+    两个哈希相差不超过d位时, 由抽屉原理至少有一段相差不超过 d//4 位. 查询时
+    只需在每段的表中查找翻转了不超过 d//4 位的段值, 再逐个核对候选的完整距离.
+    """
+
+    def __init__(self):
+        self._tables = [{} for _ in range(CHUNKS)]
+        self._values = set()
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, value):
+        """加入一个值, 已存在时返回False"""
+        if value in self._values:
+            return False
+        self._values.add(value)
+        for k, table in enumerate(self._tables):
+            chunk = (value >> (k * CHUNK_BITS)) & CHUNK_MASK
+            bucket = table.get(chunk)
+            if bucket is None:
+                bucket = table[chunk] = set()
+            bucket.add(value)
+        return True
+
+    def discard(self, value):
+        if value not in self._values:
+            return
+        self._values.discard(value)
+        for k, table in enumerate(self._tables):
+            chunk = (value >> (k * CHUNK_BITS)) & CHUNK_MASK
+            bucket = table[chunk]
+            bucket.discard(value)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, value, max_distance):
+        """[(距离, 值)] 距离不超过max_distance的所有值"""
+        masks = _flip_masks(max_distance // CHUNKS)
+        if len(masks) * CHUNKS >= len(self._values):
+            # 阈值很大 (或值很少) 时要查找的段值比值还多, 直接逐个比较
+            candidates = self._values
+        else:
+            candidates = set()
+            for k, table in enumerate(self._tables):
+                chunk = (value >> (k * CHUNK_BITS)) & CHUNK_MASK
+                for mask in masks:
+                    bucket = table.get(chunk ^ mask)
+                    if bucket is not None:
+                        candidates.update(bucket)
+        result = []
+        for candidate in candidates:
+            distance = hamming(value, candidate)
+            if distance <= max_distance:
+                result.append((distance, candidate))
+        return result
+
+
+class ImageHashes:
+    """图片哈希的持久缓存 {hash_key: 哈希}, 可以在任意线程中使用
+
+    第一次用到时才读取缓存文件.
+    """
+
+    def __init__(self, hash_file=None):
+        self.hash_file = hash_file
+        self._lock = threading.Lock()
+        self._hashes = None
+        self._dirty = False
+
+    def _loaded(self):
+        if self._hashes is None:
+            self._hashes = {}
+            if self.hash_file and os.path.exists(self.hash_file):
+                try:
+                    with open(self.hash_file, 'r', encoding='utf-8') as f:
+                        self._hashes = {key: int(value, 16) for key, value in json.load(f).items()}
+                except (OSError, ValueError, AttributeError) as e:
+                    logger.warning("read image hash cache failed: %s", e)
+        return self._hashes
+
+    def get(self, path):
+        with self._lock:
+            return self._loaded().get(hash_key(path))
+
+    def compute(self, path, source=None):
+        """计算并记下图库中 path 的哈希; source 为实际读取的文件或文件对象 (默认为 path)"""
+        value = dhash(path if source is None else source)
+        with self._lock:
+            self._loaded()[hash_key(path)] = value
+            self._dirty = True
+        return value
+
+    def save(self):
+        if not self.hash_file:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {key: f"{value:016x}" for key, value in self._hashes.items()}
+            self._dirty = False
+        try:
+            atomic_write(self.hash_file, json.dumps(data).encode('utf-8'))
+        except OSError:
+            with self._lock:
+                self._dirty = True
+            raise
+
+
+class SimilarMatch:
+    """一处相似: 本记录的 field 图片与另一条记录的 other_field 图片"""
+
+    def __init__(self, distance, field, path, other_id, other_field, other_path):
+        self.distance = distance
+        self.field = field
+        self.path = path
+        self.other_id = other_id
+        self.other_field = other_field
+        self.other_path = other_path
+
+
+class SimilarityIndex:
+    """记录图片的相似索引, 随存储的修改增量更新
+
+    哈希表中每个哈希只出现一次, 再由哈希找到图片、由图片找到引用它的记录
+    (内容相同的图片在图片库中只有一份, 被多条记录引用).
+    """
+
+    def __init__(self, hashes, resolve=None):
+        self.hashes = hashes
+        # 图片路径 -> 可以读取的文件 (服务器模式下先下载), 找不到时返回None
+        self.resolve = resolve
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._images_of = {}      # 记录ID -> [(字段, 图片路径)]
+        self._refs = {}           # 图片路径 -> {(记录ID, 字段)}
+        self._paths_of = {}       # 哈希 -> {图片路径}
+        self._hash_of = {}        # 图片路径 -> 哈希
+        self._missing = set()     # 还没有哈希的图片
+        self._failed = set()      # 无法读取的图片 (不再重试)
+        self._table = MultiIndexHash()
+
+    # ------------------------------------------------------------------
+    # 维护
+    # ------------------------------------------------------------------
+    def attach(self, store):
+        """从存储建立索引, 并注册回调跟随之后的修改"""
+        self.build(store.iter_records())
+        store.add_listener(self.on_change)
+
+    def detach(self, store):
+        store.remove_listener(self.on_change)
+
+    def build(self, records):
+        with self._lock:
+            self._reset()
+            for record in records:
+                self._add(record)
+
+    def on_change(self, removed, added):
+        """存储修改回调; removed 为None表示整体替换"""
+        with self._lock:
+            if removed is None:
+                self.build(added)
+                return
+            for record in removed:
+                self._remove(record[ID_FIELD])
+            for record in added:
+                self._add(record)
+
+    def _add(self, record):
+        record_id = record[ID_FIELD]
+        images = []
+        for field in IMAGE_FIELDS:
+            path = normalize_image_path(record.get(field))
+            if not path:
+                continue
+            images.append((field, path))
+            refs = self._refs.get(path)
+            if refs is None:
+                refs = self._refs[path] = set()
+                value = self.hashes.get(path)
+                if value is not None:
+                    self._index_path(path, value)
+                elif path not in self._failed:
+                    self._missing.add(path)
+            refs.add((record_id, field))
+        self._images_of[record_id] = images
+
+    def _remove(self, record_id):
+        for field, path in self._images_of.pop(record_id, ()):
+            refs = self._refs.get(path)
+            if refs is None:
+                continue
+            refs.discard((record_id, field))
+            if not refs:
+                del self._refs[path]
+                self._missing.discard(path)
+                value = self._hash_of.pop(path, None)
+                if value is not None:
+                    paths = self._paths_of[value]
+                    paths.discard(path)
+                    if not paths:
+                        del self._paths_of[value]
+                        self._table.discard(value)
+
+    def _index_path(self, path, value):
+        if not is_informative(value):
+            # 纯色、空白的图片彼此的哈希都相同, 放进索引只会得到大量误报
+            return
+        self._hash_of[path] = value
+        paths = self._paths_of.get(value)
+        if paths is None:
+            paths = self._paths_of[value] = set()
+            self._table.add(value)
+        paths.add(path)
+
+    def missing_count(self):
+        """还没有哈希的图片数"""
+        return len(self._missing)
+
+    def compute_missing(self, task=None):
+        """补算还没有哈希的图片 (耗时, 在后台线程中调用), 返回计算的张数"""
+        with self._lock:
+            pending = sorted(self._missing)
+        done = 0
+        for k, path in enumerate(pending, 1):
+            if task is not None:
+                task.check_cancelled()
+            value = self.hashes.get(path)
+            if value is None:
+                try:
+                    source = self.resolve(path) if self.resolve is not None else path
+                    value = self.hashes.compute(path, source) if source else None
+                except Exception as e:
+                    logger.warning("image hash %s failed: %s", path, e)
+                    value = None
+                done += 1
+            with self._lock:
+                if path in self._missing:
+                    self._missing.discard(path)
+                    if value is None:
+                        self._failed.add(path)
+                    else:
+                        self._index_path(path, value)
+            if task is not None:
+                task.report(k, len(pending), f"已计算 {k} / {len(pending)} 张图片的指纹")
+            if done and done % SAVE_EVERY == 0:
+                self.hashes.save()
+        self.hashes.save()
+        return done
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def find_similar(self, record_id, max_distance):
+        """与这条记录的图片相似 (汉明距离不超过max_distance) 的其他记录的图片
+
+        返回 [SimilarMatch], 按距离排序; 同一条记录中的图片互相不算.
+        """
+        matches = []
+        with self._lock:
+            for field, path in self._images_of.get(record_id, ()):
+                value = self._hash_of.get(path)
+                if value is None:
+                    continue
+                for distance, other_value in self._table.search(value, max_distance):
+                    for other_path in self._paths_of.get(other_value, ()):
+                        for other_id, other_field in self._refs.get(other_path, ()):
+                            if other_id != record_id:
+                                matches.append(SimilarMatch(
+                                    distance, field, path, other_id, other_field, other_path
+                                ))
+        matches.sort(key=lambda match: (match.distance, match.other_id, match.field, match.other_field))
+        return matches
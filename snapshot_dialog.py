@@ -0,0 +1,104 @@
+"""
+备份与恢复窗口
+列出已有的备份快照, 可以立即创建快照或把全部记录恢复为所选快照的内容
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+from snapshots import format_size
+
+
+class SnapshotDialog:
+    """快照列表
+
+    on_create() 创建快照, on_restore(快照清单) 恢复快照, 均由主窗口在后台执行,
+    完成后调用 reload() 刷新列表. link_images 为快照中的图片是否用硬链接保存.
+    """
+
+    def __init__(self, root, list_snapshots, on_create, on_restore, link_images=False):
+        self.list_snapshots = list_snapshots
+        self.link_images = link_images
+        self.on_create = on_create
+        self.on_restore = on_restore
+        self.manifests = {}
+
+        self.window = tk.Toplevel(root)
+        self.window.title("备份与恢复")
+        self.window.geometry("800x400")
+        self.window.transient(root)
+
+        frame = ttk.Frame(self.window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        self.summary = ttk.Label(frame)
+        self.summary.pack(anchor=tk.W, pady=(0, 5))
+
+        columns = ("created", "reason", "records", "images", "new_bytes")
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="browse")
+        for column, text, width in zip(
+            columns,
+            ("创建时间", "原因", "记录数", "图片数", "新增占用"),
+            (160, 200, 90, 90, 100),
+        ):
+            tree.heading(column, text=text)
+            tree.column(column, width=width, anchor=tk.W)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = tree
+
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(pady=(10, 0))
+        ttk.Button(button_frame, text="立即备份", command=self.on_create).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="恢复所选", command=self._restore).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=self.window.destroy).pack(side=tk.LEFT, padx=5)
+
+        self.reload()
+
+    def is_open(self):
+        return self.window.winfo_exists()
+
+    def reload(self):
+        """重新读取快照列表 (最新的在最上面)"""
+        if not self.is_open():
+            return
+        self.tree.delete(*self.tree.get_children())
+        self.manifests = {}
+        manifests = self.list_snapshots()
+        for manifest in reversed(manifests):
+            item = self.tree.insert("", tk.END, values=(
+                manifest["created"],
+                manifest["reason"],
+                manifest["records"],
+                manifest["images"],
+                format_size(manifest["new_bytes"]),
+            ))
+            self.manifests[item] = manifest
+        if manifests:
+            text = f"共 {len(manifests)} 个快照, 未变化的记录和图片在各快照之间只保存一份"
+        else:
+            text = "还没有快照"
+        if self.link_images:
+            text += "\n图片以硬链接保存, 与图片库是同一个文件, 不能防止图片文件损坏"
+        else:
+            text += "\n图片复制保存在快照目录中"
+        self.summary.configure(text=text, justify=tk.LEFT)
+
+    def _restore(self):
+        manifest = self.manifests.get(self.tree.focus())
+        if manifest is None:
+            messagebox.showwarning("警告", "请先选择一个快照!", parent=self.window)
+            return
+        if messagebox.askyesno(
+            "恢复快照",
+            f"确定要把全部记录恢复为 {manifest['created']} 的快照吗?\n"
+            f"快照中有 {manifest['records']} 条记录; 恢复前会先为当前数据创建一个快照.",
+            parent=self.window,
+        ):
+            self.on_restore(manifest)
@@ -0,0 +1,366 @@
+"""
+增量备份快照
+每个快照保存全部记录和它们引用的图片, 但只写入与已有快照不同的部分:
+
+- 记录按ID切分为块 (块的边界只由记录ID决定, 增删改一条记录只影响它所在的块),
+  每块压缩后按内容哈希保存在 objects/ 中, 相同的块在各快照之间只保存一份;
+- 图片按内容哈希保存在 blobs/ 中 (同一磁盘上用硬链接, 不额外占用空间);
+- manifests/ 中每个快照一个清单, 列出它的记录块和图片列表块.
+
+恢复时按清单读出记录块即可, 不需要重放任何修改. 按保留策略 (最近几个、每天/每周/
+每月各一个) 删除旧快照后, 不再被任何快照引用的块和图片一并删除.
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import zlib
+from datetime import datetime
+
+from blob_store import BlobStore
+from journal_store import atomic_write
+from perf_monitor import LOGGER_NAME
+from record_model import json_default, json_object_hook
+from repository import ID_FIELD, image_refs, normalize_image_path
+
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# 切分块: 键的CRC32低位全为0处为块的边界, 平均每块 CHUNK_TARGET 项, 最多 CHUNK_MAX 项
+CHUNK_TARGET = 256
+CHUNK_MAX = CHUNK_TARGET * 8
+
+# 快照ID (即创建时间) 的格式
+SNAPSHOT_ID_FORMAT = "%Y%m%d-%H%M%S"
+
+
+def retained_snapshots(manifests, keep_last=5, daily=7, weekly=4, monthly=6):
+    """按保留策略选出要保留的快照ID
+
+    保留最新的 keep_last 个, 以及最近 daily 天、weekly 周、monthly 个月中
+    每天/每周/每月最新的一个 (没有快照的日子不计). 最新的快照总是保留.
+    """
+    ordered = sorted(manifests, key=lambda manifest: (manifest["created"], manifest["id"]), reverse=True)
+    keep = {manifest["id"] for manifest in ordered[:max(1, keep_last)]}
+    periods = (
+        (daily, lambda t: t.date()),
+        (weekly, lambda t: t.isocalendar()[:2]),
+        (monthly, lambda t: (t.year, t.month)),
+    )
+    for count, period_of in periods:
+        seen = set()
+        for manifest in ordered:
+            if len(seen) >= count:
+                break
+            period = period_of(datetime.strptime(manifest["created"], "%Y-%m-%d %H:%M:%S"))
+            if period not in seen:
+                seen.add(period)
+                keep.add(manifest["id"])
+    return keep
+
+
+def format_size(nbytes):
+    """字节数 -> 便于阅读的大小"""
+    for unit in ("B", "KB", "MB"):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} GB"
+
+
+def _boundary(key):
+    return zlib.crc32(key.encode('utf-8')) % CHUNK_TARGET == 0
+
+
+def _split(items, key_of):
+    """按键把列表切分为块; 插入或删除一项后, 只有它所在的块与之前不同"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if _boundary(key_of(item)) or len(chunk) >= CHUNK_MAX:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class SnapshotStore:
+    """快照目录 (snapshot_dir) 的读写
+
+    image_dir 为图片库目录, 恢复图片时按内容哈希放回原来的路径.
+    图片默认复制一份保存; link_images 为True时尽量用硬链接保存, 不额外占用空间, 但快照中的图片
+    与图片库是同一个文件, 图片库中的文件损坏或被改写时快照中的也随之改变.
+    同一时间只进行一个创建、恢复或清理操作.
+    """
+
+    def __init__(self, snapshot_dir, image_dir, link_images=False):
+        self.snapshot_dir = snapshot_dir
+        self.image_dir = image_dir
+        self.link_images = link_images
+        self.manifest_dir = os.path.join(snapshot_dir, "manifests")
+        self.object_dir = os.path.join(snapshot_dir, "objects")
+        self.blob_dir = os.path.join(snapshot_dir, "blobs")
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 清单
+    # ------------------------------------------------------------------
+    def list(self):
+        """全部快照的清单, 按创建时间从旧到新"""
+        manifests = []
+        try:
+            names = os.listdir(self.manifest_dir)
+        except FileNotFoundError:
+            return manifests
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                manifests.append(self._read_manifest(name[:-len(".json")]))
+            except (OSError, ValueError) as e:
+                logger.warning("read snapshot manifest %s failed: %s", name, e)
+        manifests.sort(key=lambda manifest: (manifest["created"], manifest["id"]))
+        return manifests
+
+    def latest(self):
+        manifests = self.list()
+        return manifests[-1] if manifests else None
+
+    def _manifest_path(self, snapshot_id):
+        return os.path.join(self.manifest_dir, snapshot_id + ".json")
+
+    def _read_manifest(self, snapshot_id):
+        with open(self._manifest_path(snapshot_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def get(self, snapshot_id):
+        """按ID读取快照清单, 不存在时抛出 KeyError"""
+        if not os.path.exists(self._manifest_path(snapshot_id)):
+            raise KeyError(f"快照不存在: {snapshot_id}")
+        return self._read_manifest(snapshot_id)
+
+    # ------------------------------------------------------------------
+    # 块
+    # ------------------------------------------------------------------
+    def _object_path(self, digest):
+        return os.path.join(self.object_dir, digest[:2], digest + ".json.gz")
+
+    def _write_chunks(self, items, key_of, task=None):
+        """切分并保存块, 返回 (块哈希列表, 新写入的字节数)"""
+        digests, written = [], 0
+        for chunk in _split(items, key_of):
+            if task is not None:
+                task.check_cancelled()
+            data = json.dumps(chunk, ensure_ascii=False, default=json_default).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                payload = gzip.compress(data, compresslevel=6)
+                atomic_write(path, payload)
+                written += len(payload)
+            digests.append(digest)
+        return digests, written
+
+    def _read_chunk(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            data = gzip.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"快照数据块 {digest} 已损坏")
+        return json.loads(data.decode('utf-8'), object_hook=json_object_hook)
+
+    # ------------------------------------------------------------------
+    # 图片
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _blob_name(digest, path):
+        return f"{digest[:2]}/{digest}{os.path.splitext(path)[1].lower()}"
+
+    def _save_blob(self, name, src):
+        """把图片放入快照 (已有时不做任何事), 返回新写入的字节数"""
+        dst = os.path.join(self.blob_dir, name)
+        if os.path.exists(dst):
+            return 0
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        self._place(src, dst)
+        return 0 if self.link_images and os.stat(dst).st_nlink > 1 else os.path.getsize(dst)
+
+    def _place(self, src, dst):
+        """src -> dst: 复制; link_images 时尽量硬链接, 跨磁盘等情况下仍然复制"""
+        tmp_path = dst + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            if not self.link_images:
+                raise OSError
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+
+    def _image_names(self, records, previous, task=None):
+        """记录引用的图片 -> (快照中的图片名集合, 旧版命名图片的 {路径: [哈希, 大小, 修改时间]}, 找不到的图片数)
+
+        旧版命名的图片要读出内容计算哈希, 大小和修改时间与上一个快照相同时沿用上次的结果.
+        """
+        known = previous.get("legacy_images", {}) if previous else {}
+        names, legacy, missing = {}, {}, 0
+        paths = sorted({path for record in records for path in image_refs(record)})
+        for k, path in enumerate(paths, 1):
+            if task is not None:
+                task.check_cancelled()
+                if k % 200 == 0:
+                    task.report(k, len(paths), f"正在备份图片 {k} / {len(paths)}")
+            try:
+                if BlobStore.is_content_addressed(path):
+                    digest = BlobStore.content_hash(path)
+                else:
+                    stat = os.stat(path)
+                    entry = known.get(path)
+                    if entry is None or entry[1:] != [stat.st_size, stat.st_mtime_ns]:
+                        entry = [BlobStore.file_hash(path), stat.st_size, stat.st_mtime_ns]
+                    legacy[path] = entry
+                    digest = entry[0]
+                names[self._blob_name(digest, path)] = path
+            except FileNotFoundError:
+                missing += 1
+        return names, legacy, missing
+
+    # ------------------------------------------------------------------
+    # 创建
+    # ------------------------------------------------------------------
+    def create(self, store, reason="", task=None):
+        """为存储的当前内容创建快照, 返回清单"""
+        with self._lock:
+            records = list(store.iter_records())
+            previous = self.latest()
+            now = datetime.now()
+            snapshot_id = now.strftime(SNAPSHOT_ID_FORMAT)
+            suffix = 1
+            while os.path.exists(self._manifest_path(snapshot_id)):
+                suffix += 1
+                snapshot_id = f"{now.strftime(SNAPSHOT_ID_FORMAT)}-{suffix:02d}"
+
+            if task is not None:
+                task.report(0, 1, "正在备份记录")
+            record_chunks, written = self._write_chunks(records, lambda record: record[ID_FIELD], task)
+
+            names, legacy, missing = self._image_names(records, previous, task)
+            saved = []
+            for name, path in names.items():
+                try:
+                    written += self._save_blob(name, path)
+                    saved.append(name)
+                except FileNotFoundError:
+                    # 备份期间图片随记录一起被删除
+                    missing += 1
+            saved.sort()
+            image_chunks, image_bytes = self._write_chunks(saved, lambda name: name)
+
+            manifest = {
+                "id": snapshot_id,
+                "created": now.strftime("%Y-%m-%d %H:%M:%S"),
+                "reason": reason,
+                "records": len(records),
+                "images": len(saved),
+                "missing_images": missing,
+                "new_bytes": written + image_bytes,
+                "record_chunks": record_chunks,
+                "image_chunks": image_chunks,
+                "legacy_images": legacy,
+            }
+            os.makedirs(self.manifest_dir, exist_ok=True)
+            atomic_write(
+                self._manifest_path(snapshot_id),
+                json.dumps(manifest, ensure_ascii=False).encode('utf-8'),
+            )
+            return manifest
+
+    # ------------------------------------------------------------------
+    # 恢复
+    # ------------------------------------------------------------------
+    def load_records(self, snapshot_id, task=None):
+        """读出快照中的全部记录 (按原来的顺序)"""
+        manifest = self.get(snapshot_id)
+        records = []
+        chunks = manifest["record_chunks"]
+        for k, digest in enumerate(chunks, 1):
+            if task is not None:
+                task.check_cancelled()
+                task.report(k, len(chunks), f"正在读取快照中的记录 {len(records)} / {manifest['records']}")
+            records.extend(self._read_chunk(digest))
+        return records
+
+    def restore_images(self, snapshot_id, records, task=None):
+        """把记录引用的、图片库中已经没有的图片从快照放回原处, 返回 (放回的张数, 快照中也没有的张数)"""
+        manifest = self.get(snapshot_id)
+        legacy = manifest.get("legacy_images", {})
+        restored, missing = 0, 0
+        paths = sorted({path for record in records for path in image_refs(record)})
+        for k, path in enumerate(paths, 1):
+            if task is not None and k % 200 == 0:
+                task.check_cancelled()
+                task.report(k, len(paths), f"正在检查图片 {k} / {len(paths)}")
+            if os.path.exists(path):
+                continue
+            if BlobStore.is_content_addressed(path):
+                digest = BlobStore.content_hash(path)
+            elif path in legacy:
+                digest = legacy[path][0]
+            else:
+                missing += 1
+                continue
+            src = os.path.join(self.blob_dir, self._blob_name(digest, path))
+            if not os.path.exists(src):
+                missing += 1
+                continue
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._lock:
+                self._place(src, normalize_image_path(path))
+            restored += 1
+        return restored, missing
+
+    # ------------------------------------------------------------------
+    # 清理
+    # ------------------------------------------------------------------
+    def prune(self, keep_last=5, daily=7, weekly=4, monthly=6):
+        """按保留策略删除旧快照, 并删除不再被引用的块和图片; 返回删除的快照ID"""
+        with self._lock:
+            manifests = self.list()
+            keep = retained_snapshots(manifests, keep_last, daily, weekly, monthly)
+            removed = [manifest["id"] for manifest in manifests if manifest["id"] not in keep]
+            for snapshot_id in removed:
+                os.remove(self._manifest_path(snapshot_id))
+            if removed:
+                self._collect_garbage([manifest for manifest in manifests if manifest["id"] in keep])
+            return removed
+
+    def _collect_garbage(self, manifests):
+        """删除不被 manifests 引用的块和图片 (标记-清除)"""
+        objects, blobs = set(), set()
+        for manifest in manifests:
+            objects.update(manifest["record_chunks"])
+            for digest in manifest["image_chunks"]:
+                if digest not in objects:
+                    objects.add(digest)
+                    blobs.update(self._read_chunk(digest))
+        self._sweep(self.object_dir, lambda name: name[:-len(".json.gz")] in objects)
+        self._sweep(self.blob_dir, lambda name: name in blobs, with_subdir=True)
+
+    @staticmethod
+    def _sweep(root, keep, with_subdir=False):
+        if not os.path.isdir(root):
+            return
+        for subdir in os.listdir(root):
+            dir_path = os.path.join(root, subdir)
+            if not os.path.isdir(dir_path):
+                continue
+            for name in os.listdir(dir_path):
+                if not keep(f"{subdir}/{name}" if with_subdir else name):
+                    os.remove(os.path.join(dir_path, name))
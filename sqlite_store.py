@@ -0,0 +1,739 @@
+#!/usr/bin/env python3
+"""
+SQLite数据存储
+记录保存在带索引的SQLite数据库中, 按需查询, 启动时不再把全部记录读入内存
+
+用法 (从JSON数据文件一次性迁移):
+    python sqlite_store.py rejection_data.json rejection_data.db
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from bisect import bisect_right
+from collections import Counter
+from contextlib import contextmanager
+
+from journal_store import fsync_dir, read_records
+from repository import (
+    ID_FIELD, LEGACY_MODIFIED, META_FIELDS, MODIFIED_FIELD, RECORD_FIELDS, IMAGE_FIELDS, REV_FIELD,
+    RecordRepository, modified_stamp, normalize_image_path, plan_changes, stamp_new_record, stamp_update,
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    callsign TEXT NOT NULL,
+    apply_time TEXT NOT NULL,
+    license_image TEXT NOT NULL DEFAULT '',
+    operator_image TEXT NOT NULL DEFAULT '',
+    screenshot_image TEXT NOT NULL DEFAULT '',
+    rejection_reason TEXT NOT NULL DEFAULT '',
+    create_time TEXT NOT NULL DEFAULT '',
+    record_id TEXT,
+    modified TEXT,
+    rev INTEGER,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS tombstones (
+    record_id TEXT PRIMARY KEY,
+    deleted TEXT NOT NULL,
+    rev INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tombstones_rev ON tombstones (rev);
+"""
+
+# 依赖元数据列的索引; 旧数据库要先补上列再建索引
+INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_records_record_id ON records (record_id);
+CREATE INDEX IF NOT EXISTS idx_records_rev ON records (rev);
+CREATE INDEX IF NOT EXISTS idx_records_callsign ON records (callsign);
+CREATE INDEX IF NOT EXISTS idx_records_apply_time ON records (apply_time);
+CREATE INDEX IF NOT EXISTS idx_records_create_time ON records (create_time);
+CREATE INDEX IF NOT EXISTS idx_records_license_image ON records (license_image);
+CREATE INDEX IF NOT EXISTS idx_records_operator_image ON records (operator_image);
+CREATE INDEX IF NOT EXISTS idx_records_screenshot_image ON records (screenshot_image);
+"""
+
+# 元数据字段对应的列 (id 列名与主键区分, 叫 record_id)
+META_COLUMNS = ("record_id", "modified", "rev")
+_ALL_COLUMNS = RECORD_FIELDS + META_COLUMNS
+
+_COLUMNS = ", ".join(_ALL_COLUMNS)
+_SELECT = f"SELECT seq, {_COLUMNS}, extra FROM records"
+_INSERT = (
+    f"INSERT INTO records ({_COLUMNS}, extra) "
+    f"VALUES ({', '.join('?' * (len(_ALL_COLUMNS) + 1))})"
+)
+
+# 批量插入时每批的记录数
+BATCH_SIZE = 5000
+
+# 按位置读取时缓存的位置标记间隔: 每隔这么多条记录记下一个seq
+MARK_STEP = 1000
+
+
+def record_to_row(record):
+    """记录字典 -> 插入参数 (未知字段放入extra列)"""
+    row = [record.get(field) or "" for field in RECORD_FIELDS]
+    row += [record.get(field) for field in META_FIELDS]
+    extra = {
+        key: value for key, value in record.items()
+        if key not in RECORD_FIELDS and key not in META_FIELDS
+    }
+    row.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+    return row
+
+
+def row_to_record(row):
+    """查询结果 (seq, 字段..., 元数据..., extra) -> 记录字典"""
+    record = dict(zip(RECORD_FIELDS + META_FIELDS, row[1:-1]))
+    if row[-1]:
+        record.update(json.loads(row[-1]))
+    return record
+
+
+class ConnectionPool:
+    """只读连接池
+
+    WAL模式下读连接与写连接互不阻塞, 每个读连接看到的是已提交的数据.
+    同时借出的连接不超过 size 个, 归还的连接留待下次使用.
+    """
+
+    def __init__(self, db_file, size):
+        self.db_file = db_file
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+
+    def _connect(self):
+        # 自动提交模式: 每条查询单独成为一个读事务, 需要一致的多次读取时显式 BEGIN
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA query_only=ON")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+
+class SqliteRepository(RecordRepository):
+    """基于SQLite的记录存储
+
+    记录顺序即自增主键seq的顺序. 记录总数缓存在内存中, 避免每次 COUNT(*) 全表扫描.
+    按位置读取时不用 OFFSET 从头数起: 缓存位置 0, MARK_STEP, 2*MARK_STEP... 处记录的seq
+    (位置标记), 从最近的标记沿主键向后查找, 每次最多经过 MARK_STEP 条记录. 插入只在末尾追加,
+    标记不变; 删除一行后丢弃它之后的标记, 用到时再补算.
+
+    readers 大于0时读取使用只读连接池, 多个线程 (例如 server.py 的请求线程)
+    可以同时读取, 也不必等待正在进行的写入; 写入仍通过唯一的写连接依次进行.
+    """
+
+    def __init__(self, db_file, readers=0):
+        super().__init__()
+        self.db_file = db_file
+        self.readers = readers
+        self._conn = None
+        self._pool = None
+        self._count = 0
+        self._rev = 0
+        self._lock = threading.RLock()
+        self._marks = []
+        self._marks_version = 0
+        self._marks_lock = threading.Lock()
+        self._deleted_seq = None
+
+    def load(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.executescript(SCHEMA)
+                self._upgrade_schema()
+                if self.readers:
+                    self._pool = ConnectionPool(self.db_file, self.readers)
+            self._forget_marks(0)
+            self._count = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+            self._rev = max(
+                self._conn.execute("SELECT IFNULL(MAX(rev), 0) FROM records").fetchone()[0],
+                self._conn.execute("SELECT IFNULL(MAX(rev), 0) FROM tombstones").fetchone()[0],
+            )
+            self._assign_missing_ids()
+
+    def _upgrade_schema(self):
+        """旧数据库补上元数据列, 再建立依赖它们的索引"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(records)")}
+        with self._conn:
+            for column, column_type in zip(META_COLUMNS, ("TEXT", "TEXT", "INTEGER")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE records ADD COLUMN {column} {column_type}")
+        self._conn.executescript(INDEXES)
+
+    def _assign_missing_ids(self):
+        """给没有ID的旧记录补上ID、修改时间和修改序号"""
+        rows = self._conn.execute(
+            f"{_SELECT} WHERE record_id IS NULL OR modified IS NULL OR rev IS NULL ORDER BY seq"
+        ).fetchall()
+        if not rows:
+            return
+        with self._conn:
+            for row in rows:
+                record = {
+                    key: value for key, value in row_to_record(row).items()
+                    if key != REV_FIELD and value is not None
+                }
+                record.setdefault(MODIFIED_FIELD, LEGACY_MODIFIED)
+                self._rev += 1
+                record = stamp_new_record(record, self._rev, lambda record_id: self._id_taken(record_id, row[0]))
+                self._conn.execute(
+                    "UPDATE records SET record_id = ?, modified = ?, rev = ? WHERE seq = ?",
+                    [record[field] for field in META_FIELDS] + [row[0]],
+                )
+
+    def _id_taken(self, record_id, exclude_seq=None):
+        row = self._conn.execute(
+            "SELECT seq FROM records WHERE record_id = ?", (record_id,)
+        ).fetchone()
+        return row is not None and row[0] != exclude_seq
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _reading(self):
+        """读取用的连接: 有连接池时从池中借用, 否则在锁内使用写连接"""
+        if self._pool is None:
+            with self._lock:
+                yield self._conn
+        else:
+            with self._pool.connection() as conn:
+                yield conn
+
+    @contextmanager
+    def _read_transaction(self):
+        """在一个读事务中进行多次读取 (连接池的连接是自动提交的, 要显式开始事务)"""
+        with self._reading() as conn:
+            if self._pool is None:
+                yield conn
+                return
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.execute("COMMIT")
+
+    def count(self):
+        return self._count
+
+    def get(self, index):
+        index = self._check_index(index)
+        with self._reading() as conn:
+            row = conn.execute(
+                f"{_SELECT} WHERE seq = ?", (self._seq_at(conn, index),)
+            ).fetchone()
+        return row_to_record(row)
+
+    def page(self, offset, limit):
+        with self._reading() as conn:
+            seq = self._seq_at(conn, offset)
+            if seq is None:
+                return []
+            rows = conn.execute(
+                f"{_SELECT} WHERE seq >= ? ORDER BY seq LIMIT ?", (seq, limit)
+            ).fetchall()
+        return [row_to_record(row) for row in rows]
+
+    # ------------------------------------------------------------------
+    # 位置标记
+    # ------------------------------------------------------------------
+    def _mark_at(self, conn, k):
+        """位置 k*MARK_STEP 处记录的seq, 超出范围时返回None; 缓存中没有时从最后一个标记向后补算"""
+        with self._marks_lock:
+            if k < len(self._marks):
+                return self._marks[k]
+            version = self._marks_version
+            marks = list(self._marks)
+        while len(marks) <= k:
+            if marks:
+                row = conn.execute(
+                    "SELECT seq FROM records WHERE seq > ? ORDER BY seq LIMIT 1 OFFSET ?",
+                    (marks[-1], MARK_STEP - 1),
+                ).fetchone()
+            else:
+                row = conn.execute("SELECT MIN(seq) FROM records").fetchone()
+            if row is None or row[0] is None:
+                break
+            marks.append(row[0])
+        with self._marks_lock:
+            # 补算期间有记录被删除时算出的标记可能已经过时; 读事务中的连接看到的可能是
+            # 更早的数据. 这两种情况都不放入缓存
+            cacheable = conn is self._conn or not conn.in_transaction
+            if cacheable and version == self._marks_version and len(marks) > len(self._marks):
+                self._marks = marks
+        return marks[k] if k < len(marks) else None
+
+    def _seq_at(self, conn, position):
+        """位置 -> seq, 超出范围时返回None"""
+        mark = self._mark_at(conn, position // MARK_STEP)
+        if mark is None:
+            return None
+        row = conn.execute(
+            "SELECT seq FROM records WHERE seq >= ? ORDER BY seq LIMIT 1 OFFSET ?",
+            (mark, position % MARK_STEP),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _position_of_seq(self, conn, seq):
+        """已有记录的seq -> 位置: 找到不超过它的最后一个标记, 只数标记之后的记录"""
+        with self._marks_lock:
+            marks = list(self._marks)
+        k = max(bisect_right(marks, seq) - 1, 0)
+        if k >= len(marks) - 1:
+            # 缓存的标记还没有到这条记录, 向后补算
+            while True:
+                mark = self._mark_at(conn, k + 1)
+                if mark is None or mark > seq:
+                    break
+                k += 1
+        mark = self._mark_at(conn, k)
+        return k * MARK_STEP + conn.execute(
+            "SELECT COUNT(*) FROM records WHERE seq >= ? AND seq < ?", (mark, seq)
+        ).fetchone()[0]
+
+    def _forget_marks(self, seq):
+        """seq处的记录被删除: 丢弃它之后的标记 (位置都变了)"""
+        with self._marks_lock:
+            del self._marks[bisect_right(self._marks, seq - 1):]
+            self._marks_version += 1
+
+    @contextmanager
+    def _deleting(self):
+        """会删除记录的写事务; 结束后 (无论提交还是回滚) 再丢弃一次被删除行之后的标记,
+        事务进行中其他连接补算的标记看到的是删除前的数据"""
+        self._deleted_seq = None
+        try:
+            with self._conn:
+                yield
+        finally:
+            if self._deleted_seq is not None:
+                self._forget_marks(self._deleted_seq)
+                self._deleted_seq = None
+
+    def iter_records(self):
+        # 分批读取, 不一次性把整张表读入内存
+        last_seq = 0
+        while True:
+            with self._reading() as conn:
+                rows = conn.execute(
+                    f"{_SELECT} WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (last_seq, BATCH_SIZE),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row_to_record(row)
+            last_seq = rows[-1][0]
+
+    def find_by_callsign(self, callsign):
+        return self._query_with_index(f"{_SELECT} WHERE callsign = ? ORDER BY seq", (callsign,))
+
+    def _find_by_range(self, field, start, end):
+        return self._query_with_index(
+            f"{_SELECT} WHERE {field} BETWEEN ? AND ? ORDER BY seq", (start, end)
+        )
+
+    def _query_with_index(self, sql, params):
+        """执行带索引的查询, 并补上每条结果在全表中的位置
+
+        结果按seq排序, 位置只需统计相邻两条结果之间的记录数累加,
+        总共只沿主键扫描一遍.
+        """
+        with self._reading() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            results = []
+            position = 0
+            previous_seq = 0
+            for row in rows:
+                position += conn.execute(
+                    "SELECT COUNT(*) FROM records WHERE seq >= ? AND seq < ?",
+                    (previous_seq, row[0]),
+                ).fetchone()[0]
+                results.append((position, row_to_record(row)))
+                previous_seq = row[0]
+        return results
+
+    def image_ref_count(self, path):
+        with self._reading() as conn:
+            return sum(
+                conn.execute(
+                    f"SELECT COUNT(*) FROM records WHERE {field} = ?", (path,)
+                ).fetchone()[0]
+                for field in IMAGE_FIELDS
+            )
+
+    def value_counts(self, field):
+        if field not in RECORD_FIELDS:
+            return super().value_counts(field)
+        with self._reading() as conn:
+            rows = conn.execute(
+                f"SELECT {field}, COUNT(*) FROM records GROUP BY {field}"
+            ).fetchall()
+        return Counter(dict(rows))
+
+    def get_by_id(self, record_id):
+        with self._reading() as conn:
+            row = conn.execute(f"{_SELECT} WHERE record_id = ?", (record_id,)).fetchone()
+        return None if row is None else row_to_record(row)
+
+    def index_of_id(self, record_id):
+        with self._reading() as conn:
+            row = conn.execute(
+                "SELECT seq FROM records WHERE record_id = ?", (record_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return self._position_of_seq(conn, row[0])
+
+    def get_tombstone(self, record_id):
+        with self._reading() as conn:
+            row = conn.execute(
+                "SELECT record_id, deleted, rev FROM tombstones WHERE record_id = ?", (record_id,)
+            ).fetchone()
+        return None if row is None else dict(zip((ID_FIELD, "deleted", REV_FIELD), row))
+
+    def max_rev(self):
+        return self._rev
+
+    def changes_since(self, rev):
+        # 记录和墓碑在同一个读事务中读取, 不会只看到一个写事务的一半
+        with self._read_transaction() as conn:
+            rows = conn.execute(
+                f"{_SELECT} WHERE rev > ? ORDER BY seq", (rev,)
+            ).fetchall()
+            tombstone_rows = conn.execute(
+                "SELECT record_id, deleted, rev FROM tombstones WHERE rev > ? ORDER BY rev", (rev,)
+            ).fetchall()
+        return (
+            [row_to_record(row) for row in rows],
+            [dict(zip((ID_FIELD, "deleted", REV_FIELD), row)) for row in tombstone_rows],
+        )
+
+    # ------------------------------------------------------------------
+    # 修改
+    # ------------------------------------------------------------------
+    def append(self, record):
+        with self._lock:
+            with self._conn:
+                added = self._insert_many([record])
+            self._notify([], added)
+
+    def delete(self, index):
+        index = self._check_index(index)
+        with self._lock:
+            with self._deleting():
+                row = self._conn.execute(
+                    f"{_SELECT} WHERE seq = ?", (self._seq_at(self._conn, index),)
+                ).fetchone()
+                record = row_to_record(row)
+                self._delete_row(row[0], record[ID_FIELD], modified_stamp())
+            self._notify([record], [])
+        return record
+
+    def delete_by_id(self, record_id):
+        # 按ID直接定位, 不需要计算位置
+        with self._lock:
+            with self._deleting():
+                row = self._row_of_id(record_id)
+                record = row_to_record(row)
+                self._delete_row(row[0], record_id, modified_stamp())
+            self._notify([record], [])
+        return record
+
+    def update_by_id(self, record_id, fields):
+        with self._lock:
+            with self._conn:
+                old, new = self._update_row(self._row_of_id(record_id)[0], fields)
+            self._notify([old], [new])
+
+    def update_many_by_id(self, updates):
+        removed, added = [], []
+        with self._lock:
+            with self._conn:
+                seqs = [self._row_of_id(record_id)[0] for record_id, _ in updates]
+                for seq, (_, fields) in zip(seqs, updates):
+                    old, new = self._update_row(seq, fields)
+                    removed.append(old)
+                    added.append(new)
+            self._notify(removed, added)
+
+    def _row_of_id(self, record_id):
+        row = self._conn.execute(f"{_SELECT} WHERE record_id = ?", (record_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"记录不存在或已被删除: {record_id}")
+        return row
+
+    def _delete_row(self, seq, record_id, deleted):
+        """在当前事务中删除一行并留下墓碑"""
+        self._conn.execute("DELETE FROM records WHERE seq = ?", (seq,))
+        self._count -= 1
+        self._deleted_seq = seq if self._deleted_seq is None else min(self._deleted_seq, seq)
+        self._forget_marks(seq)
+        self._write_tombstone(record_id, deleted)
+
+    def _write_tombstone(self, record_id, deleted):
+        self._rev += 1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tombstones (record_id, deleted, rev) VALUES (?, ?, ?)",
+            (record_id, deleted, self._rev),
+        )
+
+    def update(self, index, fields):
+        self.update_many([(index, fields)])
+
+    def extend(self, records):
+        with self._lock:
+            with self._conn:
+                added = self._insert_many(records)
+            self._notify([], added)
+
+    def update_many(self, updates):
+        updates = [(self._check_index(index), fields) for index, fields in updates]
+        removed, added = [], []
+        with self._lock:
+            with self._conn:
+                seqs = self._seqs_at(index for index, _ in updates)
+                for index, fields in updates:
+                    old, new = self._update_row(seqs[index], fields)
+                    removed.append(old)
+                    added.append(new)
+            self._notify(removed, added)
+
+    def _update_row(self, seq, fields):
+        """在当前事务中更新一行的部分字段, 返回 (旧记录, 新记录)"""
+        assignments = ", ".join(f"{column} = ?" for column in _ALL_COLUMNS + ("extra",))
+        row = self._conn.execute(f"{_SELECT} WHERE seq = ?", (seq,)).fetchone()
+        self._rev += 1
+        old = row_to_record(row)
+        new = {**old, **stamp_update(fields, self._rev)}
+        self._conn.execute(f"UPDATE records SET {assignments} WHERE seq = ?", record_to_row(new) + [seq])
+        return old, new
+
+    def _seqs_at(self, positions):
+        """一组位置 -> 主键seq; 位置较多时沿主键只扫描一遍"""
+        wanted = sorted(set(positions))
+        if len(wanted) * MARK_STEP < self._count:
+            return {position: self._seq_at(self._conn, position) for position in wanted}
+
+        result = {}
+        cursor = self._conn.execute("SELECT seq FROM records ORDER BY seq")
+        k = 0
+        for position, (seq,) in enumerate(cursor):
+            if k == len(wanted):
+                break
+            if position == wanted[k]:
+                result[position] = seq
+                k += 1
+        cursor.close()
+        return result
+
+    def replace_all(self, records):
+        with self._lock:
+            with self._deleting():
+                old_ids = [row[0] for row in self._conn.execute("SELECT record_id FROM records")]
+                self._conn.execute("DELETE FROM records")
+                self._count = 0
+                self._deleted_seq = 0
+                self._forget_marks(0)
+                added = self._insert_many(records)
+                # 不再存在的记录留下墓碑
+                deleted = modified_stamp()
+                for record_id in old_ids:
+                    if not self._id_taken(record_id):
+                        self._write_tombstone(record_id, deleted)
+            self._notify(None, added)
+
+    def apply_changes(self, records, tombstones):
+        """应用其他站点的增量, 在一个事务中完成"""
+        removed, added = [], []
+        with self._lock:
+            with self._deleting():
+                adds, updates, deletes, remembered = plan_changes(self, records, tombstones)
+                for old, new in updates:
+                    seq = self._conn.execute(
+                        "SELECT seq FROM records WHERE record_id = ?", (old[ID_FIELD],)
+                    ).fetchone()[0]
+                    old, new = self._update_row(
+                        seq, {key: value for key, value in new.items() if key != REV_FIELD}
+                    )
+                    removed.append(old)
+                    added.append(new)
+                for old, tombstone in deletes:
+                    seq = self._conn.execute(
+                        "SELECT seq FROM records WHERE record_id = ?", (old[ID_FIELD],)
+                    ).fetchone()[0]
+                    self._delete_row(seq, old[ID_FIELD], tombstone["deleted"])
+                    removed.append(old)
+                for tombstone in remembered:
+                    self._write_tombstone(tombstone[ID_FIELD], tombstone["deleted"])
+                added += self._insert_many(
+                    {key: value for key, value in record.items() if key != REV_FIELD} for record in adds
+                )
+            self._notify(removed, added)
+
+        replaced = [old for old, _ in updates] + [old for old, _ in deletes]
+        return len(adds), len(updates), len(deletes), replaced
+
+    def _insert_many(self, records):
+        """在当前事务中分批插入 (调用方持有锁并负责提交)
+
+        补全元数据时ID要和已有记录及同一批中尚未写入的记录都不重复.
+        返回补全后的记录 (没有注册修改回调时不保留, 返回空列表).
+        """
+        inserted = []
+        batch = []
+        batch_ids = set()
+
+        def id_taken(record_id):
+            return record_id in batch_ids or self._id_taken(record_id)
+
+        for record in records:
+            self._rev += 1
+            record = stamp_new_record(record, self._rev, id_taken)
+            batch_ids.add(record[ID_FIELD])
+            self._conn.execute("DELETE FROM tombstones WHERE record_id = ?", (record[ID_FIELD],))
+            batch.append(record_to_row(record))
+            if self._listeners:
+                inserted.append(record)
+            if len(batch) >= BATCH_SIZE:
+                self._conn.executemany(_INSERT, batch)
+                self._count += len(batch)
+                batch = []
+                batch_ids = set()
+        if batch:
+            self._conn.executemany(_INSERT, batch)
+            self._count += len(batch)
+        return inserted
+
+    def _check_index(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("记录位置超出范围")
+        return index
+
+    def snapshot(self):
+        """一致的 (修改序号, 全部记录): 在同一个读事务中读取, 期间的写入不影响结果"""
+        with self._read_transaction() as conn:
+            rev = max(
+                conn.execute("SELECT IFNULL(MAX(rev), 0) FROM records").fetchone()[0],
+                conn.execute("SELECT IFNULL(MAX(rev), 0) FROM tombstones").fetchone()[0],
+            )
+            records = [row_to_record(row) for row in conn.execute(f"{_SELECT} ORDER BY seq")]
+        return rev, records
+
+    def compact(self):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _remove_database(db_file):
+    """删除数据库文件及其WAL文件"""
+    for path in (db_file, db_file + "-wal", db_file + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def migrate_json_to_sqlite(json_file, db_file):
+    """把JSON数据文件 (连同未压缩的修改日志) 一次性迁移到SQLite数据库
+
+    旧版保存的 images\\xxx.jpg 路径会统一为 images/xxx.jpg.
+    只读取JSON数据文件和日志, 不修改它们; 先写入临时数据库, 完成后再改名为 db_file,
+    中途失败不会留下不完整的数据库. 目标数据库中已有记录时拒绝迁移, 返回迁移的记录数.
+    """
+    records = read_records(json_file)
+    for record in records:
+        for field in IMAGE_FIELDS:
+            record[field] = normalize_image_path(record.get(field))
+        # 没有修改时间的旧记录与JSON存储一样使用最早的时间 (ID由呼号+申请时间生成)
+        if not record.get(MODIFIED_FIELD):
+            record[MODIFIED_FIELD] = LEGACY_MODIFIED
+
+    if os.path.exists(db_file):
+        existing = SqliteRepository(db_file)
+        existing.load()
+        try:
+            if existing.count():
+                raise ValueError(f"数据库 {db_file} 中已有记录, 不能重复迁移")
+        finally:
+            existing.close()
+
+    tmp_file = db_file + ".tmp"
+    _remove_database(tmp_file)
+    target = SqliteRepository(tmp_file)
+    try:
+        target.load()
+        target.replace_all(records)
+    except BaseException:
+        target.close()
+        _remove_database(tmp_file)
+        raise
+    # 关闭时写回WAL, 改名后数据都在数据库文件中
+    target.close()
+    os.replace(tmp_file, db_file)
+    fsync_dir(os.path.dirname(db_file))
+    return len(records)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("用法: python sqlite_store.py <JSON数据文件> <SQLite数据库文件>")
+        print("示例: python sqlite_store.py rejection_data.json rejection_data.db")
+        return
+
+    json_file, db_file = sys.argv[1], sys.argv[2]
+    if not os.path.exists(json_file):
+        print(f"数据文件不存在: {json_file}")
+        return
+
+    try:
+        migrated = migrate_json_to_sqlite(json_file, db_file)
+        print(f"已迁移 {migrated} 条记录到 {db_file}")
+    except Exception as e:
+        print(f"迁移失败: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+启动计时
+记录启动过程中各阶段的耗时, 用于排查冷启动慢的问题.
+用 --startup-timing 参数或环境变量 REJECTION_STARTUP_TIMING=1 启动时启用,
+结果输出到终端 (有的话) 并追加到 startup_timing.log
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+TIMING_FLAG = "--startup-timing"
+TIMING_ENV = "REJECTION_STARTUP_TIMING"
+
+# 计时结果追加到此文件 (打包为窗口程序时没有终端)
+TIMING_LOG_FILE = "startup_timing.log"
+
+
+def timing_requested(argv=None):
+    """命令行或环境变量是否要求启动计时"""
+    argv = sys.argv[1:] if argv is None else argv
+    return TIMING_FLAG in argv or os.environ.get(TIMING_ENV, "") not in ("", "0")
+
+
+class StartupTimer:
+    """启动阶段计时器
+
+    phase() 记录一段操作的起止时间 (可以在后台线程中使用, 各阶段可以重叠),
+    mark() 记录一个时间点 (如窗口显示). 时间都相对于 started (进程开始导入模块时).
+    未启用时所有方法都不做任何事.
+    """
+
+    def __init__(self, started=None, enabled=None):
+        self.started = started if started is not None else time.perf_counter()
+        # 与 started 对应的系统时间, 用来推算PyInstaller解压所用的时间
+        self.started_wall = time.time() - (time.perf_counter() - self.started)
+        self.enabled = timing_requested() if enabled is None else enabled
+        self.phases = []      # [(名称, 开始, 结束)] perf_counter 时间; 时间点的开始=结束
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def add(self, name, start, end):
+        if self.enabled:
+            with self._lock:
+                self.phases.append((name, start, end))
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter())
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.add(name, now, now)
+
+    def format_report(self):
+        lines = [f"启动计时 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} (距开始的毫秒数, 耗时, 阶段)"]
+        unpacked = self._bundle_unpack_time()
+        if unpacked is not None:
+            lines.append(f"  {'':>8}  {unpacked * 1000:8.1f} ms  解压程序和启动解释器 (打包版)")
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        for name, start, end in phases:
+            offset = (start - self.started) * 1000
+            if end == start:
+                lines.append(f"  {offset:8.1f}  {'':>11}  {name}")
+            else:
+                lines.append(f"  {offset:8.1f}  {(end - start) * 1000:8.1f} ms  {name}")
+        return "\n".join(lines)
+
+    def _bundle_unpack_time(self):
+        """PyInstaller单文件版每次启动都解压到临时目录, 目录创建到开始导入模块之间的时间"""
+        bundle_dir = getattr(sys, "_MEIPASS", None)
+        if not getattr(sys, "frozen", False) or not bundle_dir:
+            return None
+        try:
+            return max(0.0, self.started_wall - os.path.getctime(bundle_dir))
+        except OSError:
+            return None
+
+    def report(self):
+        """输出计时结果 (只输出一次)"""
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+        text = self.format_report()
+        if sys.stderr is not None:
+            print(text, file=sys.stderr)
+        try:
+            with open(TIMING_LOG_FILE, 'a', encoding='utf-8') as f:
+                f.write(text + "\n\n")
+        except OSError as e:
+            if sys.stderr is not None:
+                print(f"写入启动计时失败: {e}", file=sys.stderr)
@@ -0,0 +1,115 @@
+"""
+统计窗口
+显示各维度的拒签计数, 数据来自增量维护的 RejectionStats, 打开和刷新都不扫描记录
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+
+# (维度, 标签页标题)
+TABS = (
+    ("reason", "按拒签原因"),
+    ("month", "按申请月份"),
+    ("prefix", "按呼号前缀"),
+    ("region", "按地区"),
+)
+
+# 检查统计是否变化的间隔 (毫秒)
+REFRESH_INTERVAL_MS = 1000
+
+# 图示条的最大长度 (字符数)
+BAR_LENGTH = 30
+
+
+class StatsDashboard:
+    """统计窗口
+
+    同一时间只保留一个窗口; 打开期间数据变化时自动刷新.
+    """
+
+    def __init__(self, root, stats):
+        self.root = root
+        self.stats = stats
+        self.window = None
+        self.trees = {}
+        self.total_label = None
+        self._version = None
+
+    def is_open(self):
+        return self.window is not None and self.window.winfo_exists()
+
+    def show(self):
+        if self.is_open():
+            self.window.lift()
+            return
+        self._create_window()
+        self.refresh()
+        self.window.after(REFRESH_INTERVAL_MS, self._poll)
+
+    def _create_window(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.title("拒签统计")
+        self.window.geometry("700x500")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.total_label = ttk.Label(main_frame, font=("Microsoft YaHei", 12, "bold"))
+        self.total_label.pack(anchor=tk.W, pady=(0, 5))
+
+        notebook = ttk.Notebook(main_frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
+
+        self.trees = {}
+        for name, title in TABS:
+            frame = ttk.Frame(notebook, padding="5")
+            notebook.add(frame, text=title)
+
+            tree = ttk.Treeview(frame, columns=("count", "percent", "bar"), show="tree headings")
+            tree.heading("#0", text="分组")
+            tree.heading("count", text="数量")
+            tree.heading("percent", text="占比")
+            tree.heading("bar", text="")
+            tree.column("#0", width=200, anchor=tk.W)
+            tree.column("count", width=70, anchor=tk.CENTER)
+            tree.column("percent", width=70, anchor=tk.CENTER)
+            tree.column("bar", width=300, anchor=tk.W)
+
+            scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            self.trees[name] = tree
+
+    def refresh(self):
+        """按当前计数重新填表 (代价只与分组数有关)"""
+        if not self.is_open():
+            return
+        self._version = self.stats.version
+        total = self.stats.total
+        self.total_label.configure(text=f"拒签记录共 {total} 条")
+
+        for name, tree in self.trees.items():
+            items = self.stats.snapshot(name)
+            peak = max((count for _, count in items), default=0)
+            tree.delete(*tree.get_children())
+            for bucket, count in items:
+                percent = f"{count * 100.0 / total:.1f}%" if total else ""
+                bar = "█" * max(1, round(count * BAR_LENGTH / peak)) if peak else ""
+                tree.insert("", tk.END, text=bucket, values=(count, percent, bar))
+
+    def _poll(self):
+        if not self.is_open():
+            return
+        if self.stats.version != self._version:
+            self.refresh()
+        self.window.after(REFRESH_INTERVAL_MS, self._poll)
+
+    def close(self):
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
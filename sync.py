@@ -0,0 +1,109 @@
+"""
+增量同步
+各站点分别保存数据, 只交换上次同步以来变化的记录、删除 (墓碑) 和它们引用的图片.
+
+增量文件是 exporter 格式的归档, 另外带 delta.json (来源站点和水位) 和
+tombstones.json. 导入端按记录ID以修改时间较新的一方为准 (见 plan_changes),
+同一个增量重复导入不会产生变化.
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime
+
+from exporter import DELTA_ENTRY, TOMBSTONES_ENTRY, export_archive
+from journal_store import atomic_write
+from repository import ID_FIELD, REV_FIELD
+
+
+SYNC_STATE_FILE = "sync_state.json"
+DELTA_VERSION = 1
+
+
+class SyncState:
+    """本站的同步状态
+
+    station_id  本站ID, 写入导出的增量, 用于识别增量来源
+    exported    {对方站点名称: {"rev": 已导出的水位, "time": 导出时间}}
+    received    {来源站点ID: {"rev": 已导入的水位, "time": 导入时间}}
+    """
+
+    def __init__(self, path=SYNC_STATE_FILE):
+        self.path = path
+        self.station_id = None
+        self.exported = {}
+        self.received = {}
+
+    def load(self):
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        self.station_id = data.get("station_id")
+        self.exported = data.get("exported", {})
+        self.received = data.get("received", {})
+        if not self.station_id:
+            self.station_id = uuid.uuid4().hex
+            self.save()
+        return self
+
+    def save(self):
+        data = {
+            "station_id": self.station_id,
+            "exported": self.exported,
+            "received": self.received,
+        }
+        atomic_write(self.path, json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def peers(self):
+        """导出过的对方站点名称"""
+        return sorted(self.exported)
+
+    def watermark(self, peer):
+        """上次导出给对方站点时的水位, 从未导出过时为0 (即全部记录)"""
+        return self.exported.get(peer, {}).get("rev", 0)
+
+    def mark_exported(self, peer, rev):
+        self.exported[peer] = {"rev": rev, "time": _now()}
+        self.save()
+
+    def mark_received(self, station_id, rev):
+        previous = self.received.get(station_id, {}).get("rev", 0)
+        self.received[station_id] = {"rev": max(previous, rev), "time": _now()}
+        self.save()
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def export_delta(store, export_path, since, station_id, task=None, resolve=None):
+    """导出水位since之后的增量, 返回 (记录数, 墓碑数, 图片数, 写入的字节数, 新水位)
+
+    新水位在收集变化之前读取, 期间并发写入的修改下次还会再导出一次,
+    由于导入是幂等的, 这不会造成问题.
+    """
+    watermark = store.max_rev()
+    records, tombstones = store.changes_since(since)
+    # 修改序号只在本站有意义, 不写入增量
+    records = [{key: value for key, value in record.items() if key != REV_FIELD} for record in records]
+    tombstones = [
+        {ID_FIELD: tombstone[ID_FIELD], "deleted": tombstone["deleted"]} for tombstone in tombstones
+    ]
+    meta = {
+        "version": DELTA_VERSION,
+        "station": station_id,
+        "since": since,
+        "watermark": watermark,
+        "created": _now(),
+        "record_count": len(records),
+        "tombstone_count": len(tombstones),
+    }
+    record_count, image_count, size = export_archive(
+        store, export_path, task, records=records,
+        extra_entries={TOMBSTONES_ENTRY: tombstones, DELTA_ENTRY: meta}, resolve=resolve,
+    )
+    return record_count, len(tombstones), image_count, size, watermark
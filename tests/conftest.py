@@ -0,0 +1,34 @@
+"""
+测试共用: 模块都在仓库根目录下, 直接导入; 临时目录中的 core 和测试图片
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def core(tmp_path, monkeypatch):
+    """临时目录中的 RejectionCore (JSON存储, 默认配置)"""
+    from config import load_config
+    from core import RejectionCore
+
+    monkeypatch.chdir(tmp_path)
+    core = RejectionCore(load_config(str(tmp_path / "config.json"))).open()
+    yield core
+    core.close()
+
+
+def make_image(path, color=(200, 40, 40), size=(64, 48)):
+    """写一张带图案的小图片, 返回路径"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", size, color)
+    ImageDraw.Draw(img).rectangle((size[0] // 4, size[1] // 4, size[0] // 2, size[1] // 2), fill=(0, 0, 0))
+    img.save(str(path))
+    return str(path)
@@ -0,0 +1,124 @@
+"""
+batch_ingest: 按文件名规则分组; 存入的图片在记录写入之前保持固定, 写入或放弃后解除
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+
+import pytest
+
+from batch_ingest import compile_pattern, finish_ingest, ingest_plan, scan_folder
+from conftest import make_image
+
+
+class Cancel(Exception):
+    pass
+
+
+class CancelAfter:
+    """处理完 n 张图片后取消"""
+
+    def __init__(self, n):
+        self.n = n
+        self.done = 0
+
+    def report(self, done, total, text=""):
+        self.done = done
+
+    def check_cancelled(self):
+        if self.done >= self.n:
+            raise Cancel()
+
+
+def make_folder(tmp_path):
+    folder = tmp_path / "in"
+    folder.mkdir()
+    make_image(folder / "BH1AA_license_1.jpg", (10, 200, 10))
+    make_image(folder / "BH1AA_operator_1.jpg", (10, 10, 200))
+    make_image(folder / "BH2BB_license_1.jpg", (200, 200, 10))
+    return str(folder)
+
+
+def test_existing_image_survives_release_until_saved(core, tmp_path):
+    folder = make_folder(tmp_path)
+    # 图片库中已有同样内容的图片, 被一条记录引用
+    existing = core.pipeline.ingest(os.path.join(folder, "BH1AA_license_1.jpg"))
+    core.add_record({"callsign": "OLD", "apply_time": "2025-01-01", "license_image": existing})
+
+    records = ingest_plan(core, scan_folder(folder), "2025-02-01")
+    assert existing in [record["license_image"] for record in records]
+
+    # 写入之前那条记录被删除: 图片仍被固定, 不能删除
+    old = core.store.get(0)
+    _, removed = core.delete_record(old["id"])
+    assert removed == []
+    assert os.path.exists(existing)
+
+    core.add_records(records)
+    finish_ingest(core, records, saved=True)
+    paths = [path for record in records for path in (record["license_image"], record["operator_image"]) if path]
+    assert not any(core.images.is_pinned(path) for path in paths)
+    assert all(os.path.exists(path) for path in paths)
+
+
+def test_discarded_batch_unpins_and_releases(core, tmp_path):
+    records = ingest_plan(core, scan_folder(make_folder(tmp_path)), "2025-02-01")
+    paths = [record["license_image"] for record in records]
+    finish_ingest(core, records, saved=False)
+    assert not any(os.path.exists(path) or core.images.is_pinned(path) for path in paths)
+
+
+def test_cancel_unpins_and_releases(core, tmp_path):
+    with pytest.raises(Cancel):
+        ingest_plan(core, scan_folder(make_folder(tmp_path)), "2025-02-01", task=CancelAfter(2), workers=1)
+    assert core.images._pins == {}
+    leftover = [name for _, _, names in os.walk(core.image_dir) for name in names]
+    assert leftover == []
+
+
+def touch(folder, *names):
+    for name in names:
+        path = os.path.join(folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+
+
+def test_scan_groups_by_callsign(tmp_path):
+    folder = str(tmp_path)
+    touch(
+        folder,
+        "BH1AA_license_20250101.jpg", "BH1AA_license_20250102.jpg", "bh1aa_Operator.PNG",
+        "BG2BB_screenshot_1.webp", "notes.txt", "photo.jpg", "BH3CC_passport_1.jpg",
+        os.path.join("sub", "BD4DD_license_1.jpg"),
+    )
+    plan = scan_folder(folder)
+
+    assert [group.callsign for group in plan.groups] == ["BG2BB", "BH1AA"]
+    bh1aa = plan.groups[1]
+    # 同类型多张时使用文件名排在最后的一张, 其余记为重复
+    assert os.path.basename(bh1aa.images["license_image"]) == "BH1AA_license_20250102.jpg"
+    assert [os.path.basename(path) for path in bh1aa.duplicates] == ["BH1AA_license_20250101.jpg"]
+    # 不区分大小写, "_*" 可以省略
+    assert os.path.basename(bh1aa.images["operator_image"]) == "bh1aa_Operator.PNG"
+    assert plan.image_count == 3
+    assert sorted(os.path.basename(path) for path in plan.unmatched) == ["BH3CC_passport_1.jpg", "photo.jpg"]
+
+    # 递归扫描时包括子文件夹
+    assert [group.callsign for group in scan_folder(folder, recursive=True).groups] == ["BD4DD", "BG2BB", "BH1AA"]
+
+
+def test_custom_pattern(tmp_path):
+    folder = str(tmp_path)
+    touch(folder, "license-BH1AA.jpg", "operator-BH1AA-2.jpg", "BH1AA_license_1.jpg")
+    plan = scan_folder(folder, "{kind}-{callsign}-*")
+    # 呼号不包括其后的分隔符
+    assert [group.callsign for group in plan.groups] == ["BH1AA"]
+    assert sorted(plan.groups[0].images) == ["license_image", "operator_image"]
+    assert [os.path.basename(path) for path in plan.unmatched] == ["BH1AA_license_1.jpg"]
+
+
+@pytest.mark.parametrize("pattern", ["{callsign}_*", "{kind}_*", "photo"])
+def test_pattern_requires_callsign_and_kind(pattern):
+    with pytest.raises(ValueError):
+        compile_pattern(pattern)
@@ -0,0 +1,136 @@
+"""
+export_archive: zip/tar 导出后能完整导入, 条目过多时写ZIP64结构, 失败或取消时不留下 .part 文件
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+import struct
+import zipfile
+
+import pytest
+
+import exporter
+from config import load_config
+from conftest import make_image
+from core import RejectionCore
+from exporter import PreparedEntry, ZipStreamWriter, export_archive
+
+
+class Cancel(Exception):
+    pass
+
+
+class CancelledTask:
+    """一开始就已取消的任务"""
+
+    cancelled = True
+
+    def report(self, done, total, text=""):
+        pass
+
+    def check_cancelled(self):
+        raise Cancel()
+
+
+def add_records(core, tmp_path):
+    license_image = core.images.ingest(make_image(tmp_path / "a.jpg", (200, 40, 40)))
+    operator_image = core.images.ingest(make_image(tmp_path / "b.png", (40, 40, 200)))
+    core.add_record({
+        "callsign": "BH1AA", "apply_time": "2025-01-01 10:00", "rejection_reason": "图片不清晰",
+        "license_image": license_image, "operator_image": operator_image,
+    })
+    core.add_record({"callsign": "BH2BB", "apply_time": "2025-01-02 10:00", "license_image": license_image})
+    core.add_record({"callsign": "BH3CC", "apply_time": "2025-01-03 10:00"})
+
+
+def image_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("ext", [".zip", ".tar"])
+def test_round_trip(core, tmp_path, monkeypatch, ext):
+    add_records(core, tmp_path)
+    export_path = str(tmp_path / f"export{ext}")
+    assert core.export_file(export_path) == 3
+    assert not os.path.exists(export_path + ".part")
+    exported = {record["callsign"]: record for record in core.store.iter_records()}
+
+    # 在另一个目录中的新实例里导入
+    other = tmp_path / "other"
+    other.mkdir()
+    monkeypatch.chdir(other)
+    fresh = RejectionCore(load_config(str(other / "config.json"))).open()
+    try:
+        job, added, _, _ = fresh.import_file(export_path, "replace")
+        assert added == 3
+        assert job.missing_images == 0
+        imported = {record["callsign"]: record for record in fresh.store.iter_records()}
+        assert imported.keys() == exported.keys()
+        for callsign, record in imported.items():
+            assert record.get("rejection_reason") == exported[callsign].get("rejection_reason")
+            for field in ("license_image", "operator_image"):
+                if exported[callsign].get(field):
+                    source = os.path.join(str(tmp_path), exported[callsign][field])
+                    assert image_bytes(record[field]) == image_bytes(source)
+                else:
+                    assert not record.get(field)
+    finally:
+        fresh.close()
+
+
+def test_zip_is_readable_by_zipfile(core, tmp_path):
+    add_records(core, tmp_path)
+    export_path = str(tmp_path / "export.zip")
+    core.export_file(export_path)
+    with zipfile.ZipFile(export_path) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+    assert names[0] == exporter.RECORDS_ENTRY
+    assert names[-1] == exporter.MANIFEST_ENTRY
+    assert len(names) == 4
+
+
+def test_many_entries_use_zip64(tmp_path):
+    path = str(tmp_path / "many.zip")
+    count = 0xFFFF + 2
+    with open(path, 'wb') as f:
+        writer = ZipStreamWriter(f)
+        for n in range(count):
+            data = str(n).encode()
+            writer.add(PreparedEntry(f"{n}.txt", [data], len(data), exporter.zlib.crc32(data), "", False))
+        writer.close()
+
+    with open(path, 'rb') as f:
+        f.seek(-22, os.SEEK_END)
+        eocd = f.read(22)
+    signature, _, _, entries, _, _, _, _ = struct.unpack("<IHHHHIIH", eocd)
+    assert (signature, entries) == (0x06054B50, 0xFFFF)
+    with zipfile.ZipFile(path) as archive:
+        assert len(archive.infolist()) == count
+        assert archive.read(f"{count - 1}.txt") == str(count - 1).encode()
+
+
+@pytest.mark.parametrize("ext", [".zip", ".tar"])
+def test_failure_leaves_no_part_file(core, tmp_path, monkeypatch, ext):
+    add_records(core, tmp_path)
+    export_path = str(tmp_path / f"export{ext}")
+
+    def fail(name, path, compress):
+        raise OSError("read failed")
+
+    monkeypatch.setattr(exporter, "prepare_file_entry", fail)
+    with pytest.raises(OSError):
+        export_archive(core.store, export_path)
+    assert not os.path.exists(export_path)
+    assert not os.path.exists(export_path + ".part")
+
+
+def test_cancel_leaves_no_part_file(core, tmp_path):
+    add_records(core, tmp_path)
+    export_path = str(tmp_path / "export.zip")
+    with pytest.raises(Cancel):
+        export_archive(core.store, export_path, CancelledTask())
+    assert not os.path.exists(export_path)
+    assert not os.path.exists(export_path + ".part")
@@ -0,0 +1,113 @@
+"""
+ImportJob: 导入期间图片保持固定, 替换时按写入时的记录释放图片, 更新时跳过没有变化的记录;
+归档中校验失败的图片不留在图片库中
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+from conftest import make_image
+from importer import ImportJob
+
+
+def write_import(folder, records):
+    """导入目录: data.json + images/"""
+    os.makedirs(folder / "images", exist_ok=True)
+    path = folder / "data.json"
+    path.write_text(json.dumps(records, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def record(callsign, image="", reason=""):
+    return {"callsign": callsign, "apply_time": "2025-01-01 10:00", "license_image": image, "rejection_reason": reason}
+
+
+def test_deduplicated_image_is_pinned_until_apply(core, tmp_path):
+    source = tmp_path / "src"
+    import_path = write_import(source, [record("NEW", "images/a.jpg")])
+    # 图片库中已有同样内容的图片 (导入按原样存入, 不经过格式转换)
+    existing = core.images.ingest(make_image(source / "images" / "a.jpg"))
+    core.add_record(record("OLD", existing))
+
+    job = ImportJob(core.store, core.images, import_path, "merge").prepare()
+    assert job.records[0]["license_image"] == existing
+    # 准备完成、写入之前, 原来引用这张图片的记录被删除
+    _, removed = core.delete_record(core.store.get(0)["id"])
+    assert removed == []
+    assert os.path.exists(existing)
+
+    job.apply()
+    assert core.store.get(0)["license_image"] == existing
+    assert os.path.exists(existing)
+    assert not core.images.is_pinned(existing)
+
+
+def test_discard_unpins_and_removes_new_images(core, tmp_path):
+    source = tmp_path / "src"
+    import_path = write_import(source, [record("NEW", "images/a.jpg")])
+    make_image(source / "images" / "a.jpg")
+
+    job = ImportJob(core.store, core.images, import_path, "merge").prepare()
+    path = job.records[0]["license_image"]
+    job.discard()
+    assert not core.images.is_pinned(path)
+    assert not os.path.exists(path)
+
+
+def test_replace_releases_images_of_records_added_during_import(core, tmp_path):
+    source = tmp_path / "src"
+    import_path = write_import(source, [record("NEW")])
+    job = ImportJob(core.store, core.images, import_path, "replace").prepare()
+
+    # 导入准备期间添加的记录和图片, 替换后不再被引用
+    late = core.pipeline.ingest(make_image(tmp_path / "late.jpg", (0, 90, 200)))
+    core.add_record(record("LATE", late))
+
+    _, _, removed = job.apply()
+    assert removed == [late]
+    assert not os.path.exists(late)
+    assert [item["callsign"] for item in core.store.iter_records()] == ["NEW"]
+
+
+def test_upsert_skips_unchanged_records(core, tmp_path):
+    core.add_records([record("SAME", reason="r"), record("EDIT", reason="old")])
+    before = {item["callsign"]: item for item in core.store.iter_records()}
+    import_path = write_import(tmp_path / "src", [record("SAME", reason="r"), record("EDIT", reason="new")])
+
+    job = ImportJob(core.store, core.images, import_path, "upsert", import_images=False).prepare()
+    added, updated, _ = job.apply()
+    assert (added, updated, job.skipped) == (0, 1, 1)
+    after = {item["callsign"]: item for item in core.store.iter_records()}
+    assert after["SAME"] == before["SAME"]
+    assert after["EDIT"]["rejection_reason"] == "new"
+    assert after["EDIT"]["rev"] > before["EDIT"]["rev"]
+    assert core.store.changes_since(max(item["rev"] for item in before.values()))[0] == [after["EDIT"]]
+
+
+def test_corrupted_archive_image_is_rejected(core, tmp_path):
+    image = core.images.ingest(make_image(tmp_path / "a.jpg"))
+    core.add_record(record("BH1AA", image))
+    export_path = str(tmp_path / "export.tar")
+    core.export_file(export_path)
+    core.delete_record(core.store.get(0)["id"])
+    assert not os.path.exists(image)
+
+    # 图片内容被改动, 清单中的SHA256不再匹配
+    damaged = str(tmp_path / "damaged.tar")
+    with tarfile.open(export_path) as src, tarfile.open(damaged, "w") as dst:
+        for member in src.getmembers():
+            data = src.extractfile(member).read()
+            if member.name.startswith("images/"):
+                data = data[:-1] + bytes([data[-1] ^ 0xFF])
+            dst.addfile(member, io.BytesIO(data))
+
+    with pytest.raises(ValueError):
+        ImportJob(core.store, core.images, damaged, "merge").prepare()
+    assert core.store.count() == 0
+    assert not os.path.exists(image)
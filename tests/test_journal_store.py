@@ -0,0 +1,158 @@
+"""
+JournalStore: 日志末尾的残行, 以及压缩 (安装快照) 过程中各个位置崩溃后重新加载
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import json
+import os
+
+import pytest
+
+import journal_store
+from journal_store import JournalStore, read_records
+
+
+class Crash(Exception):
+    """模拟在某一步之前进程退出"""
+
+
+def make(n):
+    return {"callsign": f"BH{n}", "apply_time": "2025-01-01 10:00", "rejection_reason": str(n)}
+
+
+def open_store(tmp_path):
+    store = JournalStore(str(tmp_path / "data.json"))
+    store.load()
+    return store
+
+
+def reasons(store):
+    return [record["rejection_reason"] for record in store.iter_records()]
+
+
+def journal_lines(store):
+    with open(store.journal_file, 'rb') as f:
+        return f.read().splitlines(keepends=True)
+
+
+def test_torn_last_line_is_dropped_and_truncated(tmp_path):
+    store = open_store(tmp_path)
+    store.extend([make(1), make(2)])
+    store.append(make(3))
+    store.close()
+    size = os.path.getsize(store.journal_file)
+    with open(store.journal_file, 'ab') as f:
+        f.write(b'{"op": "add", "record": {"callsign": "BH4"')
+
+    # 只读读取不修改日志
+    assert [record["rejection_reason"] for record in read_records(store.data_file)] == ["1", "2", "3"]
+    assert os.path.getsize(store.journal_file) > size
+
+    store = open_store(tmp_path)
+    assert reasons(store) == ["1", "2", "3"]
+    assert os.path.getsize(store.journal_file) == size
+
+    # 截掉残行后新的操作接在完整的行后面, 再次加载能读到
+    store.append(make(5))
+    store.close()
+    assert reasons(open_store(tmp_path)) == ["1", "2", "3", "5"]
+
+
+def test_line_without_newline_is_torn(tmp_path):
+    store = open_store(tmp_path)
+    store.append(make(1))
+    store.close()
+    line = json.dumps({"op": "add", "record": make(2), "seq": 99}).encode('utf-8')
+    with open(store.journal_file, 'ab') as f:
+        f.write(line)
+    assert reasons(open_store(tmp_path)) == ["1"]
+
+
+def test_journal_for_other_snapshot_is_ignored(tmp_path):
+    store = open_store(tmp_path)
+    store.append(make(1))
+    store.compact()
+    store.append(make(2))
+    store.close()
+    with open(store.data_file, 'wb') as f:
+        f.write(b"[]")
+    assert reasons(open_store(tmp_path)) == []
+
+
+@pytest.mark.parametrize("crash_at", ["snapshot", "journal", "tombstones"])
+def test_crash_during_compaction(tmp_path, monkeypatch, crash_at):
+    store = open_store(tmp_path)
+    store.extend([make(n) for n in range(5)])
+    store.delete(0)
+    store.update(0, {"rejection_reason": "x"})
+    store.compact()
+    store.append(make(5))
+    store.delete(1)
+    expected = reasons(store)
+
+    targets = {"snapshot": store.data_file, "journal": store.journal_file, "tombstones": store.tombstone_file}
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if dst == targets[crash_at]:
+            raise Crash(dst)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(journal_store.os, "replace", replace)
+    with pytest.raises(Crash):
+        store.compact()
+    monkeypatch.undo()
+
+    # 崩溃的进程不再写任何东西, 只从磁盘上的文件重新加载
+    reloaded = open_store(tmp_path)
+    assert reasons(reloaded) == expected
+    assert reloaded.tombstones.keys() == store.tombstones.keys()
+
+    # 之后的修改照常写入, 再次压缩和加载仍然一致
+    reloaded.append(make(6))
+    reloaded.compact()
+    reloaded.append(make(7))
+    reloaded.close()
+    assert reasons(open_store(tmp_path)) == expected + ["6", "7"]
+
+
+def test_checkpoint_appended_before_snapshot_rename(tmp_path, monkeypatch):
+    """快照改名之前崩溃: 旧日志末尾已有新快照的checkpoint, 但它与磁盘上的旧快照不匹配"""
+    store = open_store(tmp_path)
+    store.extend([make(1), make(2)])
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if dst == store.data_file:
+            raise Crash(dst)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(journal_store.os, "replace", replace)
+    with pytest.raises(Crash):
+        store.compact()
+    monkeypatch.undo()
+
+    checkpoints = [json.loads(line) for line in journal_lines(store) if b'"checkpoint"' in line]
+    assert len(checkpoints) == 2
+    assert reasons(open_store(tmp_path)) == ["1", "2"]
+
+
+def test_compaction_keeps_ops_written_meanwhile(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    store.extend([make(n) for n in range(3)])
+    real_encode = journal_store.encode_snapshot
+
+    def encode(records):
+        # 后台压缩序列化期间又有修改, 它们在取得基准之后追加到日志
+        store.append(make(9))
+        store.delete(0)
+        return real_encode(records)
+
+    monkeypatch.setattr(journal_store, "encode_snapshot", encode)
+    store._compact()
+    monkeypatch.undo()
+    expected = reasons(store)
+    assert expected == ["1", "2", "9"]
+    store.close()
+    assert reasons(open_store(tmp_path)) == expected
@@ -0,0 +1,119 @@
+"""
+repository.plan_changes: 增量同步的墓碑与按修改时间后写者胜 (LWW) 的合并
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+from journal_store import JournalStore
+from repository import plan_changes
+
+
+T1 = "2025-01-01T00:00:01.000000Z"
+T2 = "2025-01-01T00:00:02.000000Z"
+T3 = "2025-01-01T00:00:03.000000Z"
+
+
+def record(record_id, modified, reason=""):
+    return {
+        "id": record_id, "modified": modified, "rev": 1,
+        "callsign": record_id.upper(), "apply_time": "2025-01-01", "rejection_reason": reason,
+    }
+
+
+def tombstone(record_id, deleted):
+    return {"id": record_id, "deleted": deleted, "rev": 1}
+
+
+class FakeStore:
+    """plan_changes 只用到 get_by_id 和 get_tombstone"""
+
+    def __init__(self, records=(), tombstones=()):
+        self.records = {item["id"]: item for item in records}
+        self.tombstones = {item["id"]: item for item in tombstones}
+
+    def get_by_id(self, record_id):
+        return self.records.get(record_id)
+
+    def get_tombstone(self, record_id):
+        return self.tombstones.get(record_id)
+
+
+def test_new_record_is_added():
+    incoming = record("a", T1)
+    assert plan_changes(FakeStore(), [incoming], []) == ([incoming], [], [], [])
+
+
+def test_newer_remote_version_wins():
+    local = record("a", T1, "old")
+    remote = record("a", T2, "new")
+    assert plan_changes(FakeStore([local]), [remote], []) == ([], [(local, remote)], [], [])
+
+
+def test_older_or_same_remote_version_is_ignored():
+    local = record("a", T2)
+    for modified in (T1, T2):
+        assert plan_changes(FakeStore([local]), [record("a", modified, "x")], []) == ([], [], [], [])
+
+
+def test_latest_version_within_batch_is_used():
+    batch = [record("a", T2, "mid"), record("a", T3, "last"), record("a", T1, "first")]
+    adds, _, _, _ = plan_changes(FakeStore(), batch, [])
+    assert [item["rejection_reason"] for item in adds] == ["last"]
+
+
+def test_tombstone_deletes_older_local_record():
+    local = record("a", T1)
+    deletion = tombstone("a", T2)
+    assert plan_changes(FakeStore([local]), [], [deletion]) == ([], [], [(local, deletion)], [])
+
+
+def test_tombstone_wins_tie():
+    local = record("a", T2)
+    deletion = tombstone("a", T2)
+    assert plan_changes(FakeStore([local]), [], [deletion]) == ([], [], [(local, deletion)], [])
+
+
+def test_local_edit_after_deletion_survives():
+    local = record("a", T3)
+    assert plan_changes(FakeStore([local]), [], [tombstone("a", T2)]) == ([], [], [], [])
+
+
+def test_record_and_tombstone_in_same_batch():
+    # 增量内先删除后又重新加入: 记录较新, 保留记录
+    readded = record("a", T3)
+    assert plan_changes(FakeStore(), [readded], [tombstone("a", T2)]) == ([readded], [], [], [])
+    # 记录较旧 (或同时): 删除优先, 本地没有这条记录时只记下墓碑
+    deletion = tombstone("a", T2)
+    assert plan_changes(FakeStore(), [record("a", T2)], [deletion]) == ([], [], [], [deletion])
+
+
+def test_known_tombstone_blocks_older_record():
+    store = FakeStore(tombstones=[tombstone("a", T2)])
+    assert plan_changes(store, [record("a", T1)], []) == ([], [], [], [])
+    assert plan_changes(store, [record("a", T2)], []) == ([], [], [], [])
+    newer = record("a", T3)
+    assert plan_changes(store, [newer], []) == ([newer], [], [], [])
+
+
+def test_only_newer_tombstones_are_remembered():
+    store = FakeStore(tombstones=[tombstone("a", T2)])
+    assert plan_changes(store, [], [tombstone("a", T1)]) == ([], [], [], [])
+    newer = tombstone("a", T3)
+    assert plan_changes(store, [], [newer]) == ([], [], [], [newer])
+
+
+def test_apply_changes_twice_is_noop(tmp_path):
+    store = JournalStore(str(tmp_path / "data.json"))
+    store.load()
+    store.extend([record("a", T1, "a1"), record("b", T1, "b1"), record("c", T3, "c1")])
+    records = [record("a", T2, "a2"), record("d", T1, "d1")]
+    tombstones = [tombstone("b", T2), tombstone("c", T2), tombstone("e", T2)]
+
+    assert store.apply_changes(records, tombstones)[:3] == (1, 1, 1)
+    assert plan_changes(store, records, tombstones) == ([], [], [], [])
+    assert store.apply_changes(records, tombstones)[:3] == (0, 0, 0)
+    assert {item["id"]: item["rejection_reason"] for item in store.iter_records()} == {
+        "a": "a2", "c": "c1", "d": "d1",
+    }
+    assert set(store.tombstones) == {"b", "e"}
+    store.close()
@@ -0,0 +1,96 @@
+"""
+RecordList: 随机的插入、删除、替换之后, 按位置、按ID、切片和遍历都与普通列表一致
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import random
+
+import pytest
+
+import record_list
+from record_list import RecordList
+
+
+def make(n):
+    return {"id": f"r{n}", "n": n}
+
+
+def check(records, expected):
+    assert len(records) == len(expected)
+    assert list(records) == expected
+    for index, record in enumerate(expected):
+        assert records[index] is record
+        assert records.index_of_id(record["id"]) == index
+        assert records.by_id(record["id"]) is record
+    if expected:
+        assert records[-1] is expected[-1]
+    for start in (0, len(expected) // 3, len(expected) - 1):
+        assert records[start:start + 7] == expected[start:start + 7]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_operations_match_list(monkeypatch, seed):
+    # 整理的门槛调低, 测试中也会经过整理
+    monkeypatch.setattr(record_list, "MIN_HOLES_TO_COMPACT", 8)
+    rnd = random.Random(seed)
+    records = RecordList(make(n) for n in range(50))
+    expected = list(records)
+    next_id = 50
+    for _ in range(600):
+        op = rnd.random()
+        if op < 0.4 and expected:
+            index = rnd.randrange(-len(expected), len(expected))
+            removed = expected.pop(index)
+            del records[index]
+            assert not records.has_id(removed["id"])
+            assert records.index_of_id(removed["id"]) is None
+        elif op < 0.8:
+            record = make(next_id)
+            next_id += 1
+            records.append(record)
+            expected.append(record)
+        elif expected:
+            index = rnd.randrange(len(expected))
+            record = dict(expected[index], n=-1)
+            records[index] = record
+            expected[index] = record
+        if rnd.random() < 0.1:
+            check(records, expected)
+    check(records, expected)
+
+
+def test_delete_last_leaves_no_hole():
+    records = RecordList(make(n) for n in range(3))
+    del records[-1]
+    assert records._holes == 0
+    records.append(make(3))
+    assert [record["n"] for record in records] == [0, 1, 3]
+
+
+def test_duplicate_ids_rejected():
+    with pytest.raises(ValueError):
+        RecordList([make(1), make(1)])
+    records = RecordList([make(1), make(2)])
+    with pytest.raises(ValueError):
+        records.append(make(2))
+    with pytest.raises(ValueError):
+        records[0] = make(2)
+
+
+def test_replace_with_new_id_updates_index():
+    records = RecordList(make(n) for n in range(4))
+    del records[1]
+    records[1] = make(9)
+    assert records.index_of_id("r9") == 1
+    assert records.index_of_id("r2") is None
+    assert [record["n"] for record in records] == [0, 9, 3]
+
+
+def test_index_out_of_range():
+    records = RecordList(make(n) for n in range(3))
+    del records[0]
+    with pytest.raises(IndexError):
+        records[2]
+    with pytest.raises(IndexError):
+        del records[-3]
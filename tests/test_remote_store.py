@@ -0,0 +1,71 @@
+"""
+remote_store: 复用的连接断开后只重发不会重复执行的请求
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import http.client
+
+import pytest
+
+from remote_store import HttpClient, RemoteError
+
+
+class FakeResponse:
+    status = 200
+    headers = {}
+    will_close = False
+
+    def read(self):
+        return b"{}"
+
+
+class FakeConnection:
+    """fail 为 "send" 时发送失败, 为 "response" 时发送成功但等待响应时连接断开"""
+
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.requests = 0
+
+    def request(self, method, url, body=None, headers=None):
+        self.requests += 1
+        if self.fail == "send":
+            raise BrokenPipeError()
+
+    def getresponse(self):
+        if self.fail == "response":
+            raise http.client.RemoteDisconnected("closed")
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+def client_with(stale):
+    """第一次取得复用的 stale 连接, 之后是新连接"""
+    client = HttpClient("http://127.0.0.1:1")
+    fresh = FakeConnection()
+    connections = [(stale, True)]
+    client._acquire = lambda: connections.pop(0) if connections else (fresh, False)
+    return client, fresh
+
+
+@pytest.mark.parametrize("method", ["GET", "HEAD"])
+def test_idempotent_request_retried_after_disconnect(method):
+    client, fresh = client_with(FakeConnection("response"))
+    assert client.request(method, "/api/info")[0] == 200
+    assert fresh.requests == 1
+
+
+@pytest.mark.parametrize("method", ["POST", "PATCH", "DELETE"])
+def test_unsafe_request_not_resent_after_disconnect(method):
+    client, fresh = client_with(FakeConnection("response"))
+    with pytest.raises(RemoteError):
+        client.request(method, "/api/records", body=b"{}")
+    assert fresh.requests == 0
+
+
+def test_unsafe_request_retried_when_send_failed():
+    client, fresh = client_with(FakeConnection("send"))
+    assert client.request("POST", "/api/records", body=b"{}")[0] == 200
+    assert fresh.requests == 1
@@ -0,0 +1,86 @@
+"""
+SearchIndex: 随存储的修改增量更新后, 查询结果与逐条匹配一致 (按存储顺序)
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import random
+
+import pytest
+
+from journal_store import JournalStore
+from repository import ID_FIELD
+from search_index import SearchIndex, normalize_callsign, normalize_text
+
+
+REASONS = ["图片不清晰", "证书过期", "呼号与证书不符", "操作证图片不清晰", "", "Photo blurry", "重复申请"]
+PREFIXES = ["BH", "BG", "BA", "BD"]
+
+
+def make(rnd):
+    callsign = f"{rnd.choice(PREFIXES)}{rnd.randrange(10)}{rnd.choice('ABC')}"
+    return {"callsign": callsign, "apply_time": "2025-01-01 10:00", "rejection_reason": rnd.choice(REASONS)}
+
+
+def expected(store, query):
+    """逐条匹配: 每个词匹配呼号前缀或拒签原因中的子串"""
+    terms = query.split()
+    result = []
+    for record in store.iter_records():
+        callsign = normalize_callsign(record.get("callsign"))
+        reason = normalize_text(record.get("rejection_reason"))
+        if terms and all(
+            callsign.startswith(normalize_callsign(term)) or normalize_text(term).strip() in reason
+            for term in terms
+        ):
+            result.append(record[ID_FIELD])
+    return result
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_updates_match_scan(tmp_path, seed):
+    rnd = random.Random(seed)
+    store = JournalStore(str(tmp_path / "data.json"))
+    store.load()
+    store.extend(make(rnd) for _ in range(40))
+    index = SearchIndex()
+    # 失效条目很少时也整体重建, 测试中也会经过重建
+    index.REBUILD_RATIO = 0.001
+    index.attach(store)
+    queries = ["BH", "bh1", "图片", "不清晰", "证", "BG 证书", "ＢＨ", "photo", "PHOTO blur", "不存在", " "]
+
+    for step in range(200):
+        op = rnd.random()
+        count = store.count()
+        if op < 0.3 and count:
+            store.delete(rnd.randrange(count))
+        elif op < 0.6:
+            store.append(make(rnd))
+        elif op < 0.62:
+            store.replace_all([make(rnd) for _ in range(rnd.randrange(30))])
+        elif count:
+            record = make(rnd)
+            changes = {"callsign": record["callsign"], "rejection_reason": record["rejection_reason"]}
+            store.update(rnd.randrange(count), changes)
+        assert len(index) == store.count()
+        query = rnd.choice(queries)
+        assert index.search(query) == expected(store, query)
+
+    for query in queries:
+        assert index.search(query) == expected(store, query)
+    index.detach(store)
+    store.close()
+
+
+def test_fullwidth_and_case_are_normalized():
+    index = SearchIndex()
+    index.build([
+        {ID_FIELD: "a", "callsign": "bh1aa", "rejection_reason": "Ｐｈｏｔｏ 模糊"},
+        {ID_FIELD: "b", "callsign": "ＢＧ２ＢＢ", "rejection_reason": "证书过期"},
+    ])
+    assert index.search("BH1") == ["a"]
+    assert index.search("bg2") == ["b"]
+    assert index.search("photo") == ["a"]
+    assert index.search("证") == ["b"]
+    assert index.search("BH1 过期") == []
+    assert index.search("") == []
@@ -0,0 +1,82 @@
+"""
+server: 两个客户端同时修改同一条记录时, 基于旧版本的修改和删除返回409
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import threading
+
+import pytest
+
+import server
+from config import load_config
+from remote_store import ConflictError, RemoteRepository
+
+
+@pytest.fixture
+def url(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    record_server = server.create_server(load_config(str(tmp_path / "config.json")), "127.0.0.1", 0)
+    thread = threading.Thread(target=record_server.serve_forever, daemon=True)
+    thread.start()
+    yield record_server.url
+    record_server.shutdown()
+    thread.join()
+    record_server.server_close()
+    record_server.store.close()
+
+
+def connect(url):
+    store = RemoteRepository(url, timeout=5)
+    store.load()
+    return store
+
+
+def test_stale_update_and_delete_conflict(url):
+    first, second = connect(url), connect(url)
+    try:
+        first.extend([
+            {"callsign": "BH1AA", "apply_time": "2025-01-01 10:00"},
+            {"callsign": "BH2BB", "apply_time": "2025-01-01 10:00"},
+        ])
+        second.refresh()
+        stale = second.get(0)
+
+        first.update(0, {"rejection_reason": "first"})
+        with pytest.raises(ConflictError) as error:
+            second.update(0, {"rejection_reason": "second"})
+        assert error.value.status == 409
+        # 被拒绝后本地副本已更新为服务器上的最新内容, 再修改就能成功
+        current = second.get(0)
+        assert current["rejection_reason"] == "first"
+        assert current["rev"] > stale["rev"]
+        second.update(0, {"rejection_reason": "second"})
+
+        with pytest.raises(ConflictError):
+            first.delete(0)
+        assert first.get(0)["rejection_reason"] == "second"
+        first.delete(0)
+
+        # 已被删除的记录: 修改时本地副本中已经没有
+        second.refresh()
+        assert [record["callsign"] for record in second.iter_records()] == ["BH2BB"]
+        with pytest.raises(KeyError):
+            second.update_by_id(stale["id"], {"rejection_reason": "late"})
+    finally:
+        first.close()
+        second.close()
+
+
+def test_stale_batch_update_changes_nothing(url):
+    first, second = connect(url), connect(url)
+    try:
+        first.extend([{"callsign": f"BH{n}AA", "apply_time": "2025-01-01 10:00"} for n in range(3)])
+        second.refresh()
+        first.update(2, {"rejection_reason": "first"})
+
+        with pytest.raises(ConflictError):
+            second.update_many([(0, {"rejection_reason": "x"}), (2, {"rejection_reason": "x"})])
+        assert [record.get("rejection_reason") for record in second.iter_records()] == ["", "", "first"]
+    finally:
+        first.close()
+        second.close()
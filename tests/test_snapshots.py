@@ -0,0 +1,104 @@
+"""
+snapshots: 保留策略选出的快照, 清理后不再被引用的块和图片一并删除, 恢复后记录和图片与备份时一致
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import os
+
+from conftest import make_image
+from snapshots import retained_snapshots
+
+
+def manifest(snapshot_id, created):
+    return {"id": snapshot_id, "created": created}
+
+
+def test_keep_last_and_one_per_day():
+    manifests = [
+        manifest("a", "2025-03-01 09:00:00"),
+        manifest("b", "2025-03-01 18:00:00"),
+        manifest("c", "2025-03-02 09:00:00"),
+        manifest("d", "2025-03-03 09:00:00"),
+        manifest("e", "2025-03-03 12:00:00"),
+    ]
+    assert retained_snapshots(manifests, keep_last=2, daily=0, weekly=0, monthly=0) == {"d", "e"}
+    # 每天最新的一个, 没有快照的日子不计
+    assert retained_snapshots(manifests, keep_last=1, daily=3, weekly=0, monthly=0) == {"b", "c", "e"}
+    assert retained_snapshots(manifests, keep_last=1, daily=2, weekly=0, monthly=0) == {"c", "e"}
+    # 最新的快照总是保留
+    assert retained_snapshots(manifests, keep_last=0, daily=0, weekly=0, monthly=0) == {"e"}
+
+
+def test_weekly_and_monthly():
+    manifests = [
+        manifest("jan", "2025-01-15 09:00:00"),
+        manifest("feb-1", "2025-02-03 09:00:00"),   # 第6周
+        manifest("feb-2", "2025-02-05 09:00:00"),   # 第6周
+        manifest("feb-3", "2025-02-12 09:00:00"),   # 第7周
+        manifest("mar", "2025-03-01 09:00:00"),
+    ]
+    assert retained_snapshots(manifests, keep_last=1, daily=0, weekly=3, monthly=0) == {"mar", "feb-3", "feb-2"}
+    assert retained_snapshots(manifests, keep_last=1, daily=0, weekly=0, monthly=3) == {"mar", "feb-3", "jan"}
+
+
+def test_same_second_ordered_by_id():
+    manifests = [
+        manifest("20250301-090000-02", "2025-03-01 09:00:00"),
+        manifest("20250301-090000", "2025-03-01 09:00:00"),
+        manifest("20250228-090000", "2025-02-28 09:00:00"),
+    ]
+    assert retained_snapshots(manifests, keep_last=1, daily=0, weekly=0, monthly=0) == {"20250301-090000-02"}
+    assert retained_snapshots(manifests, keep_last=1, daily=2, weekly=0, monthly=0) == {
+        "20250301-090000-02", "20250228-090000",
+    }
+
+
+def files_under(root):
+    return {os.path.join(dir_path, name) for dir_path, _, names in os.walk(root) for name in names}
+
+
+def test_prune_collects_unreferenced_chunks_and_images(core, tmp_path):
+    old_image = core.images.ingest(make_image(tmp_path / "a.jpg", (200, 40, 40)))
+    core.add_record({"callsign": "BH1AA", "apply_time": "2025-01-01 10:00", "license_image": old_image})
+    first = core.snapshots.create(core.store, "first")
+    blob_dir = core.snapshots.blob_dir
+    first_blobs = files_under(blob_dir)
+    assert len(first_blobs) == 1
+
+    core.delete_record(core.store.get(0)["id"])
+    new_image = core.images.ingest(make_image(tmp_path / "b.jpg", (40, 40, 200)))
+    core.add_record({"callsign": "BH2BB", "apply_time": "2025-01-01 10:00", "license_image": new_image})
+    second = core.snapshots.create(core.store, "second")
+
+    assert core.snapshots.prune(keep_last=1, daily=0, weekly=0, monthly=0) == [first["id"]]
+    assert [item["id"] for item in core.snapshots.list()] == [second["id"]]
+    assert files_under(blob_dir).isdisjoint(first_blobs)
+    assert len(files_under(blob_dir)) == 1
+    assert [record["callsign"] for record in core.snapshots.load_records(second["id"])] == ["BH2BB"]
+
+
+def without_rev(record):
+    return {key: value for key, value in dict(record).items() if key != "rev"}
+
+
+def test_restore_round_trip(core, tmp_path):
+    image = core.images.ingest(make_image(tmp_path / "a.jpg"))
+    core.add_record({"callsign": "BH1AA", "apply_time": "2025-01-01 10:00", "license_image": image})
+    core.add_record({"callsign": "BH2BB", "apply_time": "2025-01-02 10:00", "rejection_reason": "证书过期"})
+    saved = list(core.store.iter_records())
+    with open(image, 'rb') as f:
+        content = f.read()
+    snapshot = core.create_snapshot()
+
+    core.delete_record(saved[0]["id"])
+    core.update_record(saved[1]["id"], {"rejection_reason": "改过"})
+    assert not os.path.exists(image)
+
+    before, count, missing = core.restore_snapshot(snapshot["id"])
+    assert (count, missing) == (2, 0)
+    assert before is not None
+    # rev 是存储写入时的修改序号, 恢复时重新分配
+    assert [without_rev(record) for record in core.store.iter_records()] == [without_rev(record) for record in saved]
+    with open(image, 'rb') as f:
+        assert f.read() == content
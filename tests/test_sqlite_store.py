@@ -0,0 +1,129 @@
+"""
+SqliteRepository: 按位置读取 (位置标记) 与普通列表一致; JSON迁移只读且原子
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import hashlib
+import os
+import random
+
+import pytest
+
+import sqlite_store
+from journal_store import JournalStore
+from sqlite_store import SqliteRepository, migrate_json_to_sqlite
+
+
+def make(name):
+    return {"callsign": name, "apply_time": "2025-01-01 10:00"}
+
+
+def ids(records):
+    return [record["id"] for record in records]
+
+
+@pytest.fixture
+def small_marks(monkeypatch):
+    # 标记间隔调小, 少量记录也会跨过多个标记
+    monkeypatch.setattr(sqlite_store, "MARK_STEP", 7)
+
+
+@pytest.mark.parametrize("readers", [0, 2])
+def test_positions_match_list(tmp_path, small_marks, readers):
+    store = SqliteRepository(str(tmp_path / "t.db"), readers=readers)
+    store.load()
+    store.extend(make(f"C{n}") for n in range(120))
+    model = list(store.iter_records())
+    rnd = random.Random(readers)
+    for step in range(300):
+        op = rnd.random()
+        if op < 0.3 and model:
+            index = rnd.randrange(len(model))
+            assert store.delete(index)["id"] == model.pop(index)["id"]
+        elif op < 0.4 and model:
+            record_id = rnd.choice(model)["id"]
+            store.delete_by_id(record_id)
+            model = [record for record in model if record["id"] != record_id]
+        elif op < 0.55:
+            store.append(make(f"N{step}"))
+            model = list(store.iter_records())
+        elif op < 0.57:
+            store.replace_all([make(f"R{n}") for n in range(rnd.randrange(40))])
+            model = list(store.iter_records())
+        elif len(model) > 3:
+            positions = rnd.sample(range(len(model)), 3)
+            store.update_many([(index, {"rejection_reason": str(step)}) for index in positions])
+            model = list(store.iter_records())
+
+        assert store.count() == len(model)
+        offset = rnd.randrange(len(model) + 3)
+        assert ids(store.page(offset, 15)) == ids(model[offset:offset + 15])
+        if model:
+            index = rnd.randrange(len(model))
+            assert store.get(index)["id"] == model[index]["id"]
+            assert store.index_of_id(model[index]["id"]) == index
+    assert store.index_of_id("missing") is None
+    store.close()
+
+
+def test_update_many_by_id(tmp_path):
+    store = SqliteRepository(str(tmp_path / "t.db"))
+    store.load()
+    store.extend(make(f"C{n}") for n in range(5))
+    first, last = store.get(0)["id"], store.get(-1)["id"]
+    store.update_many_by_id([(first, {"rejection_reason": "a"}), (last, {"rejection_reason": "b"})])
+    assert (store.get(0)["rejection_reason"], store.get(-1)["rejection_reason"]) == ("a", "b")
+    with pytest.raises(KeyError):
+        store.update_many_by_id([(first, {"rejection_reason": "c"}), ("missing", {})])
+    assert store.get(0)["rejection_reason"] == "a"
+    store.close()
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def json_data(tmp_path):
+    json_file = str(tmp_path / "data.json")
+    store = JournalStore(json_file)
+    store.load()
+    store.extend([make("A"), dict(make("B"), license_image="images\\b.jpg")])
+    store.compact()
+    store.append(make("C"))
+    store.close()
+    return json_file
+
+
+def test_migrate_reads_json_without_modifying_it(tmp_path):
+    json_file = json_data(tmp_path)
+    before = {path: file_hash(path) for path in (json_file, json_file + ".journal")}
+    db_file = str(tmp_path / "data.db")
+
+    assert migrate_json_to_sqlite(json_file, db_file) == 3
+    assert {path: file_hash(path) for path in before} == before
+
+    store = SqliteRepository(db_file)
+    store.load()
+    records = list(store.iter_records())
+    assert [record["callsign"] for record in records] == ["A", "B", "C"]
+    assert records[1]["license_image"] == "images/b.jpg"
+    store.close()
+
+    # 数据库中已有记录时拒绝再次迁移
+    with pytest.raises(ValueError):
+        migrate_json_to_sqlite(json_file, db_file)
+
+
+def test_failed_migration_leaves_no_database(tmp_path, monkeypatch):
+    json_file = json_data(tmp_path)
+    db_file = str(tmp_path / "data.db")
+
+    def fail(self, records):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(SqliteRepository, "replace_all", fail)
+    with pytest.raises(OSError):
+        migrate_json_to_sqlite(json_file, db_file)
+    assert [name for name in os.listdir(tmp_path) if name.startswith("data.db")] == []
@@ -0,0 +1,290 @@
+"""
+缩略图缓存
+按图片内容哈希和目标尺寸缓存缩略图: 内存LRU + 磁盘缓存 (总大小有上限, 超出时淘汰最久未用的)
+
+Copyright (c) 2025 BH2VLF. All rights reserved.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from blob_store import BlobStore
+from journal_store import atomic_write
+from perf_monitor import LOGGER_NAME
+
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# 路径 -> 内容哈希 的索引文件
+PATH_INDEX_FILE = "paths.json"
+
+# 索引有变化时至多每隔这么多秒写一次 (其余在 close() 时写入)
+PATH_INDEX_SAVE_SECONDS = 10
+
+# 计算文件哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """计算文件内容的SHA256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_thumbnail(path, size):
+    """解码原图并缩小到size以内
+
+    JPEG用draft()让解码器直接按1/2~1/8的比例输出DCT缩小后的像素,
+    其他格式由thumbnail()先用reduce()按整数倍缩小再重采样,
+    都不会把完整分辨率的像素解出来.
+    """
+    from PIL import Image
+
+    with Image.open(path) as img:
+        if img.format == "JPEG":
+            img.draft("L" if img.mode == "L" else "RGB", size)
+        img.thumbnail(size, reducing_gap=2.0)
+        img.load()
+        if img.mode in ("RGB", "RGBA", "L"):
+            return img.copy()
+        if img.mode in ("CMYK", "YCbCr", "I;16"):
+            return img.convert("RGB")
+        return img.convert("RGBA")
+
+
+class ThumbnailCache:
+    """缩略图缓存
+
+    磁盘上每个缩略图保存为 <缓存目录>/<哈希前两位>/<哈希>_<宽>x<高>.png|jpg,
+    文件修改时间即最近使用时间. 图片库中按内容哈希命名的图片直接使用文件名中的哈希;
+    旧版命名的图片, 路径到内容哈希的映射连同原图的大小和修改时间一起保存,
+    原图未变化时不必重新计算哈希, 缩略图被淘汰时映射一并删除.
+    """
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024, memory_items=64):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()
+        self._paths = {}
+        self._disk_bytes = None
+        self._index_dirty = False
+        self._index_saved_at = time.monotonic()
+        # 写索引文件 (在 _lock 外进行) 依次进行
+        self._index_lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_path_index()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def get(self, path, size, content_hash=None):
+        """取得path对应图片缩小到size以内的缩略图 (PIL Image)
+
+        content_hash 为图片的内容哈希 (已知时给出, 如path是按其他名称缓存的服务器图片).
+        """
+        if content_hash is None:
+            content_hash = self._content_hash(path)
+        key = (content_hash, tuple(size))
+
+        with self._lock:
+            img = self._memory.get(key)
+            if img is not None:
+                self._memory.move_to_end(key)
+                return img
+
+        img = None
+        thumb_file = self._find_thumb_file(content_hash, size)
+        if thumb_file is not None:
+            from PIL import Image
+
+            try:
+                with Image.open(thumb_file) as cached:
+                    cached.load()
+                    img = cached.copy()
+                os.utime(thumb_file)
+            except OSError:
+                img = None
+
+        if img is None:
+            img = make_thumbnail(path, size)
+            self._save_thumb(content_hash, size, img)
+
+        self._remember(key, img)
+        return img
+
+    def _content_hash(self, path):
+        if BlobStore.is_content_addressed(path):
+            return BlobStore.content_hash(path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            entry = self._paths.get(path)
+            if entry and entry[:2] == signature:
+                return entry[2]
+
+        content_hash = file_sha256(path)
+        with self._lock:
+            self._paths[path] = signature + [content_hash]
+            self._index_dirty = True
+        self._save_path_index()
+        return content_hash
+
+    def _remember(self, key, img):
+        with self._lock:
+            self._memory[key] = img
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # 磁盘缓存
+    # ------------------------------------------------------------------
+    def _thumb_base(self, content_hash, size):
+        return os.path.join(
+            self.cache_dir, content_hash[:2], f"{content_hash}_{size[0]}x{size[1]}"
+        )
+
+    def _find_thumb_file(self, content_hash, size):
+        base = self._thumb_base(content_hash, size)
+        for ext in (".jpg", ".png"):
+            if os.path.exists(base + ext):
+                return base + ext
+        return None
+
+    def _save_thumb(self, content_hash, size, img):
+        base = self._thumb_base(content_hash, size)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        if img.mode in ("RGB", "L"):
+            thumb_file, image_format, options = base + ".jpg", "JPEG", {"quality": 90}
+        else:
+            thumb_file, image_format, options = base + ".png", "PNG", {}
+        try:
+            # 先写临时文件再改名, 避免中途退出留下半个缩略图
+            img.save(thumb_file + ".tmp", image_format, **options)
+            os.replace(thumb_file + ".tmp", thumb_file)
+        except OSError as e:
+            logger.warning("save thumbnail failed: %s", e)
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(nbytes for _, nbytes, _ in self._scan_thumbs())
+            else:
+                self._disk_bytes += os.path.getsize(thumb_file)
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+        self._save_path_index()
+
+    def _scan_thumbs(self):
+        """列出磁盘上所有缩略图 (路径, 大小, 修改时间)"""
+        result = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir():
+                continue
+            for thumb in os.scandir(entry.path):
+                stat = thumb.stat()
+                result.append((thumb.path, stat.st_size, stat.st_mtime))
+        return result
+
+    def _evict(self):
+        """淘汰最久未用的缩略图, 直到总大小降到上限的80%以下; 调用方持有 _lock"""
+        thumbs = sorted(self._scan_thumbs(), key=lambda t: t[2])
+        total = sum(nbytes for _, nbytes, _ in thumbs)
+        target = self.max_bytes * 0.8
+        kept = []
+        for thumb_file, nbytes, _ in thumbs:
+            if total <= target:
+                kept.append(thumb_file)
+                continue
+            try:
+                os.remove(thumb_file)
+                total -= nbytes
+            except OSError:
+                kept.append(thumb_file)
+        self._disk_bytes = total
+
+        # 没有缩略图的原图不再需要保留哈希
+        hashes = {os.path.basename(thumb_file).split("_")[0] for thumb_file in kept}
+        paths = {path: entry for path, entry in self._paths.items() if entry[2] in hashes}
+        if len(paths) != len(self._paths):
+            self._paths = paths
+            self._index_dirty = True
+
+    # ------------------------------------------------------------------
+    # 失效
+    # ------------------------------------------------------------------
+    def invalidate(self, *paths):
+        """原图被删除或替换时调用, 删除对应的缩略图"""
+        with self._lock:
+            hashes = {self._paths.pop(path)[2] for path in paths if path in self._paths}
+            if hashes:
+                self._index_dirty = True
+            hashes.update(BlobStore.content_hash(path) for path in paths if BlobStore.is_content_addressed(path))
+            if not hashes:
+                return
+
+            # 其他路径仍引用同样内容时保留缩略图
+            hashes -= {entry[2] for entry in self._paths.values()}
+
+            for key in [key for key in self._memory if key[0] in hashes]:
+                del self._memory[key]
+
+            for content_hash in hashes:
+                shard_dir = os.path.join(self.cache_dir, content_hash[:2])
+                if not os.path.isdir(shard_dir):
+                    continue
+                for name in os.listdir(shard_dir):
+                    if name.startswith(content_hash):
+                        try:
+                            os.remove(os.path.join(shard_dir, name))
+                        except OSError:
+                            pass
+            self._disk_bytes = None
+        self._save_path_index()
+
+    # ------------------------------------------------------------------
+    # 路径索引
+    # ------------------------------------------------------------------
+    def _load_path_index(self):
+        index_file = os.path.join(self.cache_dir, PATH_INDEX_FILE)
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    self._paths = json.load(f)
+            except Exception as e:
+                logger.warning("read thumbnail index failed: %s", e)
+                self._paths = {}
+
+    def _save_path_index(self, force=False):
+        """索引有变化时写入; 距上次写入不到 PATH_INDEX_SAVE_SECONDS 时留到之后 (force 为True时立即写)"""
+        with self._index_lock:
+            with self._lock:
+                if not self._index_dirty:
+                    return
+                if not force and time.monotonic() - self._index_saved_at < PATH_INDEX_SAVE_SECONDS:
+                    return
+                data = json.dumps(self._paths, ensure_ascii=False).encode('utf-8')
+                self._index_dirty = False
+                self._index_saved_at = time.monotonic()
+            try:
+                atomic_write(os.path.join(self.cache_dir, PATH_INDEX_FILE), data)
+            except OSError as e:
+                logger.warning("save thumbnail index failed: %s", e)
+                with self._lock:
+                    self._index_dirty = True
+
+    def close(self):
+        """写入尚未保存的索引"""
+        self._save_path_index(force=True)